@@ -1,125 +1,251 @@
+import argparse
+import json
+import os
+import shutil
+import time
+
 import pandas as pd
 import numpy as np
 from catboost import CatBoostRegressor
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error, r2_score
 
-# 1. Load Data
-print("Loading data...")
-df = pd.read_csv('combined.tsv', sep='\t')
-
-# 2. Rename Columns
-column_mapping = {
-    'id': 'id',
-    'brand': 'Make',
-    'model': 'Model',
-    'price': 'Price',
-    'taxed': 'Taxed',
-    'year': 'Year',
-    'Անվահեծերը': 'Wheel_Size',
-    'Գույնը': 'Color',
-    'Դռների քանակը': 'Door_Count',
-    'Թափքը': 'Body_Type',
-    'Հեռահարությունը': 'Range_Km',
-    'Ձիաուժը': 'Horsepower',
-    'Ղեկը': 'Steering',
-    'Մարտկոցի տարողունակությունը կվտ': 'Battery_Capacity',
-    'Մխոցների քանակը': 'Cylinders',
-    'Մոդիֆիկացիան': 'Trim',
-    'Շարժիչը': 'Fuel_Type',
-    'Շարժիչի ծավալը': 'Engine_Volume',
-    'Սրահի գույնը': 'Interior_Color',
-    'Վազքը': 'Mileage',
-    'Վիճակը': 'Condition',
-    'Փոխանցման տուփը': 'Transmission',
-    'Քարշակը': 'Drive_Type',
-    'էլ․ շարժիչների քանակը': 'Electric_Motor_Count'
-}
-
-df = df.rename(columns=column_mapping)
-df = df.drop(columns=['id'])
-
-# --- DATA CLEANING (Robust Version) ---
-print("Cleaning data...")
-
-def clean_numeric(series, remove_chars=None):
-    s = series.astype(str)
-    if remove_chars:
-        for char in remove_chars:
-            s = s.str.replace(char, '', regex=False)
-    # Remove any non-numeric characters except dots
-    s = s.str.replace(r'[^\d.]+', '', regex=True)
-    return pd.to_numeric(s, errors='coerce')
-
-# Clean Numerics
-df['Horsepower'] = clean_numeric(df['Horsepower'], [' hp', 'hp'])
-df['Range_Km'] = clean_numeric(df['Range_Km'], [' կմ', ' km', ' '])
-df['Mileage'] = clean_numeric(df['Mileage'], [' կմ', ' km', ' '])
-df['Battery_Capacity'] = clean_numeric(df['Battery_Capacity'], ['kvt', ' kvt', 'kWh', ' '])
-df['Engine_Volume'] = clean_numeric(df['Engine_Volume'], ['L', ' l'])
-df['Wheel_Size'] = clean_numeric(df['Wheel_Size'], ['"', "'"])
-df['Door_Count'] = clean_numeric(df['Door_Count']) 
-df['Cylinders'] = clean_numeric(df['Cylinders'])
-
-# Feature Engineering
-df['Car_Age'] = 2025 - df['Year']
-df = df[df['Price'] > 2000]  # Filter junk prices
-df = df[df['Price'] < 80000]  # Filter junk prices
-df['Log_Price'] = np.log1p(df['Price'])
-
-# --- CATEGORICAL FIX (The Solultion) ---
+# --- CONFIGURATION ---
+DATA_PATH = 'combined.tsv'
+MODEL_PATH = "car_price_model2.cbm"
+PREV_MODEL_PATH = "car_price_model2.prev.cbm"
+# Remembers what the current model was trained on (row fingerprints, holdout ids, baseline error)
+STATE_PATH = "car_price_model2.state.json"
+
+# Warm-start settings (used by --incremental)
+WARM_ITERATIONS = 400       # extra trees boosted on top of the previous model
+REFRESH_SAMPLE = 5000       # unchanged rows mixed in with the new ones so old knowledge isn't overwritten
+DRIFT_THRESHOLD = 0.15      # relative MAE increase that forces a full retrain
+MAX_TREES = 8000            # once the ensemble grows past this, start over from scratch
+MIN_NEW_ROWS = 500          # smaller batches wait for the next run (too few rows to measure drift on)
 
 # 1. Define Categorical Columns
 cat_features = [
-    'Make', 'Model', 'Taxed', 'Color', 
-    'Body_Type', 'Steering', 'Trim', 'Fuel_Type', 
+    'Make', 'Model', 'Taxed', 'Color',
+    'Body_Type', 'Steering', 'Trim', 'Fuel_Type',
     'Interior_Color', 'Condition', 'Transmission', 'Drive_Type'
 ]
 
-# 2. STRICT Cleanup Loop
-for col in cat_features:
-    # Fill NaN with "Unknown" BEFORE converting to string
-    df[col] = df[col].fillna("Unknown")
-    # Force convert to string (to handle mixed types like 1.0 vs "1")
-    df[col] = df[col].astype(str)
-    # Clean up empty strings or "nan" strings if they survived
-    df.loc[df[col].isin(['nan', 'NaN', '']), col] = "Unknown"
-
-# Fill numeric NaNs with -1 (Standard for Trees)
 num_features = ['Horsepower', 'Range_Km', 'Mileage', 'Battery_Capacity', 'Engine_Volume', 'Wheel_Size', 'Car_Age', 'Door_Count', 'Cylinders']
-for col in num_features:
-    df[col] = df[col].fillna(-1)
 
-# --- TRAINING ---
 
-X = df.drop(columns=['Price', 'Log_Price'])
-y = df['Log_Price']
+def load_data(path=DATA_PATH):
+    """Loads the TSV written by combine.py and attaches a per-row fingerprint used to spot new/changed listings."""
+    print("Loading data...")
+    df = pd.read_csv(path, sep='\t')
+    df['id'] = df['id'].astype(str)
+    # Written by older combine.py versions; not a feature, and it would churn the fingerprints
+    df = df.drop(columns=['cluster_id'], errors='ignore')
+
+    # Fingerprint the raw values (before cleaning) so a price edit or a new tag counts as a change
+    df['_fingerprint'] = pd.util.hash_pandas_object(df, index=False).map('{:016x}'.format)
+    return df
+
+
+# --- DATA CLEANING ---
+
+def prepare(df):
+    """Cleans and feature-engineers the frame written by combine.py, whose columns are
+    already typed and named for training. Keeps 'id' and '_fingerprint'."""
+    print("Cleaning data...")
+
+    # Feature Engineering
+    df['Car_Age'] = 2025 - df['Year']
+    df = df[df['Price'] > 2000]  # Filter junk prices
+    df = df[df['Price'] < 80000]  # Filter junk prices
+    df['Log_Price'] = np.log1p(df['Price'])
+
+    # --- CATEGORICAL FIX (The Solultion) ---
 
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    # 2. STRICT Cleanup Loop
+    for col in cat_features:
+        # Fill NaN with "Unknown" BEFORE converting to string
+        df[col] = df[col].fillna("Unknown")
+        # Force convert to string (to handle mixed types like 1.0 vs "1")
+        df[col] = df[col].astype(str)
+        # Clean up empty strings or "nan" strings if they survived
+        df.loc[df[col].isin(['nan', 'NaN', '']), col] = "Unknown"
 
-print(f"Starting training on {len(X_train)} cars...")
+    # Fill numeric NaNs with -1 (Standard for Trees)
+    for col in num_features:
+        df[col] = df[col].fillna(-1)
 
-model = CatBoostRegressor(
-    depth=8,              # The "Smart" setting
-    learning_rate=0.08,   # slightly lower than 0.1 for safety
-    l2_leaf_reg=5,        # Good regularization
-    iterations=4000,      # Give it a bit more time to settle
-    loss_function='RMSE',
-    verbose=500
-)
+    return df
 
-model.fit(X_train, y_train, cat_features=cat_features)
 
-# Evaluate
-predictions_log = model.predict(X_test)
-predictions_real = np.expm1(predictions_log)
-y_test_real = np.expm1(y_test)
+def split_xy(df):
+    X = df.drop(columns=['id', '_fingerprint', 'Price', 'Log_Price'])
+    y = df['Log_Price']
+    return X, y
 
-mae = mean_absolute_error(y_test_real, predictions_real)
-r2 = r2_score(y_test_real, predictions_real)
 
+def evaluate(model, df):
+    """Returns (MAE in dollars, R2) of the model on a prepared frame."""
+    X, y = split_xy(df)
+    predictions_real = np.expm1(model.predict(X))
+    y_real = np.expm1(y)
+    return mean_absolute_error(y_real, predictions_real), r2_score(y_real, predictions_real)
+
+
+# --- STATE (what the current model has seen) ---
+
+def load_state():
+    if not os.path.exists(STATE_PATH) or not os.path.exists(MODEL_PATH):
+        return None
+    with open(STATE_PATH, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_state(df, holdout_ids, holdout_mae, version, mode, warm_mae=None):
+    # holdout_mae is always the error of the last full retrain; warm runs are judged
+    # against it and record their own error in warm_mae, so losses can't compound
+    state = {
+        'version': version,
+        'mode': mode,
+        'trained_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'rows': int(len(df)),
+        'holdout_mae': float(holdout_mae),
+        'warm_mae': None if warm_mae is None else float(warm_mae),
+        'holdout_ids': sorted(holdout_ids),
+        'fingerprints': dict(zip(df['id'], df['_fingerprint'])),
+    }
+    tmp_path = STATE_PATH + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, STATE_PATH)
+
+
+def save_model(model):
+    # Keep the previous version around so a bad refresh can be rolled back by hand
+    if os.path.exists(MODEL_PATH):
+        shutil.copyfile(MODEL_PATH, PREV_MODEL_PATH)
+    model.save_model(MODEL_PATH)
+
+
+# --- TRAINING ---
 
-model.save_model("car_price_model2.cbm")
-print(f"\n--- SUCCESS ---")
-print(f"Mean Absolute Error: ${mae:.2f}")
-print(f"R2 Score: {r2:.2f}")
\ No newline at end of file
+def train_full(df, version=1):
+    X, y = split_xy(df)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    print(f"Starting training on {len(X_train)} cars...")
+
+    model = CatBoostRegressor(
+        depth=8,              # The "Smart" setting
+        learning_rate=0.08,   # slightly lower than 0.1 for safety
+        l2_leaf_reg=5,        # Good regularization
+        iterations=4000,      # Give it a bit more time to settle
+        loss_function='RMSE',
+        verbose=500
+    )
+
+    model.fit(X_train, y_train, cat_features=cat_features)
+
+    # Evaluate
+    holdout = df.loc[X_test.index]
+    mae, r2 = evaluate(model, holdout)
+
+    save_model(model)
+    save_state(df, holdout['id'].tolist(), mae, version, 'full')
+    print(f"\n--- SUCCESS (full retrain, v{version}) ---")
+    print(f"Mean Absolute Error: ${mae:.2f}")
+    print(f"R2 Score: {r2:.2f}")
+    return model
+
+
+def train_incremental(df):
+    """
+    Continues boosting the current model on the rows that are new or changed since
+    it was trained, plus a refreshed sample of unchanged rows. Falls back to a full
+    retrain when the previous model has drifted too far on the new data.
+    """
+    state = load_state()
+    if state is None:
+        print("[*] No previous model/state found. Running full retrain.")
+        return train_full(df)
+
+    version = state['version'] + 1
+    seen = state['fingerprints']
+    changed_mask = df['id'].map(seen).ne(df['_fingerprint'])
+    changed = df[changed_mask]
+    unchanged = df[~changed_mask]
+    print(f"[*] {len(changed)} new/changed rows since v{state['version']} ({len(unchanged)} unchanged).")
+
+    if len(changed) < MIN_NEW_ROWS:
+        print(f"[*] Fewer than {MIN_NEW_ROWS} new/changed rows. Waiting for more before retraining.")
+        return None
+
+    prev_model = CatBoostRegressor()
+    prev_model.load_model(MODEL_PATH)
+
+    if prev_model.tree_count_ + WARM_ITERATIONS > MAX_TREES:
+        print(f"[*] Ensemble would exceed {MAX_TREES} trees. Running full retrain.")
+        return train_full(df, version)
+
+    # 1. Drift check: the new rows are unseen by the previous model, so its error on them
+    #    compared to its original holdout error tells us how far the market has moved.
+    baseline_mae = state['holdout_mae']
+    new_mae, _ = evaluate(prev_model, changed)
+    drift = (new_mae - baseline_mae) / baseline_mae if baseline_mae else 0.0
+    print(f"[*] Previous model MAE on new rows: ${new_mae:.2f} (baseline ${baseline_mae:.2f}, drift {drift:+.1%})")
+
+    if drift > DRIFT_THRESHOLD:
+        print(f"[!] Drift above {DRIFT_THRESHOLD:.0%}. Running full retrain.")
+        return train_full(df, version)
+
+    # 2. Warm start on new rows + a refreshed sample of old ones (holdout rows stay out)
+    holdout_ids = set(state['holdout_ids'])
+    pool = unchanged[~unchanged['id'].isin(holdout_ids)]
+    sample = pool.sample(n=min(REFRESH_SAMPLE, len(pool)), random_state=version)
+    train_df = pd.concat([changed[~changed['id'].isin(holdout_ids)], sample])
+    X_train, y_train = split_xy(train_df)
+
+    print(f"Continuing training on {len(X_train)} cars ({WARM_ITERATIONS} iterations on top of {prev_model.tree_count_} trees)...")
+
+    model = CatBoostRegressor(
+        depth=8,
+        learning_rate=0.08,
+        l2_leaf_reg=5,
+        iterations=WARM_ITERATIONS,
+        loss_function='RMSE',
+        verbose=100
+    )
+    model.fit(X_train, y_train, cat_features=cat_features, init_model=prev_model)
+
+    # 3. Validate against the same holdout the last full retrain was measured on
+    holdout = df[df['id'].isin(holdout_ids)]
+    mae, r2 = evaluate(model, holdout)
+    if baseline_mae and (mae - baseline_mae) / baseline_mae > DRIFT_THRESHOLD:
+        print(f"[!] Warm-started model regressed on holdout (${mae:.2f}). Running full retrain.")
+        return train_full(df, version)
+
+    save_model(model)
+    save_state(df, holdout_ids, baseline_mae, version, 'incremental', warm_mae=mae)
+    print(f"\n--- SUCCESS (incremental, v{version}) ---")
+    print(f"Mean Absolute Error: ${mae:.2f} (full-retrain baseline ${baseline_mae:.2f})")
+    print(f"R2 Score: {r2:.2f}")
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the car price model.")
+    parser.add_argument('--incremental', action='store_true',
+                        help="warm-start from the current model using only new/changed rows")
+    args = parser.parse_args()
+
+    df = prepare(load_data())
+
+    if args.incremental:
+        train_incremental(df)
+    else:
+        state = load_state()
+        train_full(df, state['version'] + 1 if state else 1)
+
+
+if __name__ == "__main__":
+    main()
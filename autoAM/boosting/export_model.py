@@ -0,0 +1,52 @@
+import argparse
+import json
+import os
+
+from catboost import CatBoostRegressor, Pool
+
+import cat_alg
+
+# --- CONFIGURATION ---
+EXPORT_PATH = "car_price_model2_export.py"
+
+
+def export(model_path=cat_alg.MODEL_PATH, export_path=EXPORT_PATH, data_path=cat_alg.DATA_PATH):
+    """
+    Exports the trained model as a standalone Python module for ../web/fast_predict.py.
+
+    CatBoost models don't store the hash function for categorical values, so the export
+    needs the training Pool to precompute the {category value -> hash} table.
+    """
+    model = CatBoostRegressor()
+    model.load_model(model_path)
+
+    df = cat_alg.prepare(cat_alg.load_data(data_path))
+    X, y = cat_alg.split_xy(df)
+    X = X[model.feature_names_]
+
+    print(f"Exporting {model.tree_count_} trees to {export_path}...")
+    model.save_model(export_path, format="python", pool=Pool(X, y, cat_features=cat_alg.cat_features))
+
+    # Sidecar with what the generated module doesn't know: feature names and which are categorical
+    meta = {
+        'feature_names': model.feature_names_,
+        'cat_feature_indices': [int(i) for i in model.get_cat_feature_indices()],
+        'tree_count': int(model.tree_count_),
+    }
+    with open(os.path.splitext(export_path)[0] + ".json", 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=1)
+
+    print(f"[*] Done. Copy {export_path} and its .json next to web/app.py to enable the fast path.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the price model for catboost-free inference.")
+    parser.add_argument('--model', default=cat_alg.MODEL_PATH)
+    parser.add_argument('--out', default=EXPORT_PATH)
+    parser.add_argument('--data', default=cat_alg.DATA_PATH)
+    args = parser.parse_args()
+    export(args.model, args.out, args.data)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,72 +1,84 @@
+import os
 import sqlite3
+import sys
 import pandas as pd
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from common import history
+
 # ---------------------------------------------------------
-# 1. SETUP DATABASE CONNECTION
+# 1. SETUP
 # ---------------------------------------------------------
-db_filename = 'database2.db' # Replace with your DB file path
-conn = sqlite3.connect(db_filename)
+db_filename = history.HISTORY_DB # market.db, filled by the scrapers through common/listings.py
+output_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'boosting', 'combined.tsv')
+
+# vehicles column -> training feature name, in the order the model expects
+TRAINING_COLUMNS = [
+    ('source_id', 'id'),
+    ('make', 'Make'),
+    ('model', 'Model'),
+    ('price_usd', 'Price'),
+    ('taxed', 'Taxed'),
+    ('year', 'Year'),
+    ('wheel_size', 'Wheel_Size'),
+    ('color', 'Color'),
+    ('door_count', 'Door_Count'),
+    ('body_type', 'Body_Type'),
+    ('range_km', 'Range_Km'),
+    ('horsepower', 'Horsepower'),
+    ('steering', 'Steering'),
+    ('battery_kwh', 'Battery_Capacity'),
+    ('cylinders', 'Cylinders'),
+    ('trim', 'Trim'),
+    ('fuel', 'Fuel_Type'),
+    ('engine_volume', 'Engine_Volume'),
+    ('interior_color', 'Interior_Color'),
+    ('mileage_km', 'Mileage'),
+    ('condition', 'Condition'),
+    ('transmission', 'Transmission'),
+    ('drive_type', 'Drive_Type'),
+    ('electric_motors', 'Electric_Motor_Count'),
+]
 
-try:
-    print(f"Connected to {db_filename}...")
 
-    # ---------------------------------------------------------
-    # 2. EXTRACT DATA
-    # ---------------------------------------------------------
-    # read_sql_query works natively with sqlite3 connections
-    df_cars = pd.read_sql_query("SELECT * FROM cars", conn)
-    df_tags = pd.read_sql_query("SELECT * FROM tags", conn)
+def combine(db_filename=db_filename, verbose=True, output=None):
+    """Selects the auto.am rows of the canonical vehicles table under their training names.
+    Only auto.am carries the detail features the model needs, so list.am listings (and with
+    them cross-site duplicates, see common/dedup.py) never reach the training frame.
+    With `output`, the frame is also written there as a TSV (what cat_alg.py trains on)."""
+    conn = sqlite3.connect(db_filename)
 
-    # ---------------------------------------------------------
-    # 3. TRANSFORM (Pivot Tags)
-    # ---------------------------------------------------------
-    print("Pivoting tags...")
-    
-    # Turn rows into columns
-    df_tags_pivoted = df_tags.pivot_table(
-        index='car_id', 
-        columns='attribute', 
-        values='value', 
-        aggfunc='first' # Handle duplicates if any exist
-    ).reset_index()
+    try:
+        if verbose:
+            print(f"Connected to {db_filename}...")
 
-    # ---------------------------------------------------------
-    # 4. MERGE (Join Tables)
-    # ---------------------------------------------------------
-    print("Merging tables...")
-    
-    df_unified = pd.merge(
-        df_cars, 
-        df_tags_pivoted, 
-        left_on='id', 
-        right_on='car_id', 
-        how='left'
-    )
+        # ---------------------------------------------------------
+        # 2. EXTRACT DATA (already typed and translated at ingest)
+        # ---------------------------------------------------------
+        columns = ', '.join(f"v.{column} AS {name}" for column, name in TRAINING_COLUMNS)
+        query = f"SELECT {columns} FROM vehicles v WHERE v.source = 'autoam' ORDER BY v.vehicle_id"
+        df_unified = pd.read_sql_query(query, conn)
 
-    # Clean up duplicate id column from the merge
-    if 'car_id' in df_unified.columns:
-        df_unified.drop(columns=['car_id'], inplace=True)
+        # ---------------------------------------------------------
+        # 3. LOAD (TSV for training / the web app)
+        # ---------------------------------------------------------
+        if output:
+            if verbose:
+                print(f"Saving to '{output}'...")
+            df_unified.to_csv(output, sep='\t', index=False)
 
-    # ---------------------------------------------------------
-    # 5. LOAD (Create New Table)
-    # ---------------------------------------------------------
-    new_table_name = "unified_cars"
-    print(f"Saving to new table '{new_table_name}'...")
+        if verbose:
+            print("Success! Data unified.")
+            print(df_unified.head())
+        return df_unified
 
-    # Pandas to_sql natively supports sqlite3 connection objects
-    df_unified.to_sql(
-        new_table_name, 
-        conn, 
-        if_exists='replace', 
-        index=False
-    )
+    except Exception as e:
+        print(f"Error: {e}")
 
-    print("Success! Data unified.")
-    print(df_unified.head())
+    finally:
+        # Always close the connection
+        conn.close()
 
-except Exception as e:
-    print(f"Error: {e}")
 
-finally:
-    # Always close the connection
-    conn.close()
\ No newline at end of file
+if __name__ == "__main__":
+    combine(output=output_path)
@@ -4,34 +4,41 @@ import threading
 from bs4 import BeautifulSoup
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import time
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from common import listings, migrations
+from common.concurrency import AIMDController
+from common.telemetry import ScrapeTelemetry
 
 # --- Configuration ---
 DB_NAME = 'database.db'
+BASE_URL = os.getenv('AUTOAM_BASE_URL', 'https://auto.am')
+
+# Concurrency adapts between 1 and MAX_WORKERS, starting at INITIAL_WORKERS (see common/concurrency.py)
 MAX_WORKERS = 30 
+INITIAL_WORKERS = 4
+# Attempts per car when the site throttles us (429/419/5xx/Cloudflare)
+MAX_RETRIES = 5
+
+# Cars whose detail rows are ingested into market.db together (see flush_ingest)
+INGEST_BATCH_SIZE = 200
 
 # Global lock for database writing
 db_lock = threading.Lock()
 
+# Throughput / latency / status-code counters (see common/telemetry.py)
+telemetry = ScrapeTelemetry('autoam-listings')
+controller = AIMDController(initial=INITIAL_WORKERS, max_limit=MAX_WORKERS,
+                            on_change=lambda limit: telemetry.set_gauge('concurrency_limit', limit))
+
 def init_db():
-    """Creates the tags table if it doesn't exist."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    
-    # Create the tags table
-    # We use a composite unique constraint (car_id, attribute) to prevent duplicates
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS tags (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            car_id TEXT,
-            attribute TEXT,
-            value TEXT,
-            FOREIGN KEY(car_id) REFERENCES cars(id),
-            UNIQUE(car_id, attribute)
-        )
-    ''')
-    conn.commit()
+    """Creates / migrates the cars and tags tables (schema in common/migrations.py)."""
+    conn = sqlite3.connect(DB_NAME, timeout=30)
+    migrations.migrate(conn, migrations.AUTOAM)
     conn.close()
-    print(f"[*] Database table 'tags' checked/initialized.")
+    print(f"[*] Database tables 'cars' / 'tags' checked/initialized.")
 
 def get_headers():
     return {
@@ -63,12 +70,61 @@ def get_pending_ids():
     print(f"[*] Found {len(all_cars)} total cars. {len(processed_cars)} already done. {len(pending)} pending.")
     return pending
 
+def parse_details(html, car_id):
+    """Extracts the attribute/value rows of an offer page. Returns None if the page has no details table."""
+    soup = BeautifulSoup(html, 'html.parser')
+    
+    # Find the specific table with class "pad-top-6 ad-det"
+    table = soup.find('table', class_='pad-top-6 ad-det')
+    
+    if not table:
+        # Some pages might not have the table or are different format
+        return None 
+
+    tags_found = []
+    tbody = table.find('tbody')
+    if tbody:
+        rows = tbody.find_all('tr')
+        for row in rows:
+            cols = row.find_all('td')
+            if len(cols) == 2:
+                # 1. Get Attribute Name (First Column)
+                attr_name = cols[0].get_text(strip=True)
+                
+                # 2. Get Value (Second Column) - CLEANUP REQUIRED
+                val_td = cols[1]
+                
+                # Remove the <span style="display: none;"> tags containing dirty JSON
+                for hidden in val_td.find_all(style=lambda s: s and 'none' in s):
+                    hidden.decompose()
+                    
+                val_text = val_td.get_text(strip=True)
+                
+                tags_found.append({
+                    'car_id': car_id,
+                    'attribute': attr_name,
+                    'value': val_text
+                })
+                
+    return tags_found
+
 def scrape_details(car_id):
     """Scrapes the details table for a specific car ID."""
-    url = f"https://auto.am/offer/{car_id}"
+    url = f"{BASE_URL}/offer/{car_id}"
     
     try:
-        response = requests.get(url, headers=get_headers(), timeout=10)
+        for attempt in range(MAX_RETRIES):
+            # Waits while the controller is at its limit or paused by a Retry-After
+            with controller.slot() as slot, telemetry.timer('request'):
+                response = requests.get(url, headers=get_headers(), timeout=10)
+                slot.done(response.status_code, response.headers, response.text)
+            telemetry.record_status(response.status_code)
+            if not slot.throttled:
+                break
+            telemetry.inc('retries')
+        else:
+            print(f"[!] Throttled on {car_id} after {MAX_RETRIES} attempts (Status {response.status_code})")
+            return []
         
         if response.status_code == 404:
             print(f"[!] Car {car_id} not found (404). Skipping.")
@@ -78,49 +134,18 @@ def scrape_details(car_id):
             print(f"[!] Failed {car_id}: Status {response.status_code}")
             return [] # Return empty list to retry later or ignore
 
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Find the specific table with class "pad-top-6 ad-det"
-        table = soup.find('table', class_='pad-top-6 ad-det')
-        
-        if not table:
-            # Some pages might not have the table or are different format
-            return None 
-
-        tags_found = []
-        tbody = table.find('tbody')
-        if tbody:
-            rows = tbody.find_all('tr')
-            for row in rows:
-                cols = row.find_all('td')
-                if len(cols) == 2:
-                    # 1. Get Attribute Name (First Column)
-                    attr_name = cols[0].get_text(strip=True)
-                    
-                    # 2. Get Value (Second Column) - CLEANUP REQUIRED
-                    val_td = cols[1]
-                    
-                    # Remove the <span style="display: none;"> tags containing dirty JSON
-                    for hidden in val_td.find_all(style=lambda s: s and 'none' in s):
-                        hidden.decompose()
-                        
-                    val_text = val_td.get_text(strip=True)
-                    
-                    tags_found.append({
-                        'car_id': car_id,
-                        'attribute': attr_name,
-                        'value': val_text
-                    })
-                    
-        return tags_found
+        with telemetry.timer('parse'):
+            return parse_details(response.text, car_id)
 
     except Exception as e:
+        telemetry.record_status('error')
         print(f"[!] Error on ID {car_id}: {e}")
         return []
 
-def save_tags(tags, car_id_if_empty=None):
-    """Saves a list of tags to the DB."""
-    with db_lock:
+def save_tags(tags, pending, car_id_if_empty=None):
+    """Saves a list of tags to the DB and queues the car's detail columns in `pending`
+    for flush_ingest()."""
+    with db_lock, telemetry.timer('db'):
         conn = sqlite3.connect(DB_NAME)
         cursor = conn.cursor()
         
@@ -131,6 +156,10 @@ def save_tags(tags, car_id_if_empty=None):
                     VALUES (:car_id, :attribute, :value)
                 ''', tags)
                 conn.commit()
+                telemetry.inc('tags_saved', len(tags))
+                # Translated into the car's detail columns in the vehicles table (common/listings.py)
+                pending.append(listings.from_autoam_tags(
+                    tags[0]['car_id'], [(tag['attribute'], tag['value']) for tag in tags]))
             except sqlite3.Error as e:
                 print(f"    DB Error saving tags: {e}")
         elif car_id_if_empty:
@@ -141,6 +170,21 @@ def save_tags(tags, car_id_if_empty=None):
 
         conn.close()
 
+def flush_ingest(market_conn, pending):
+    """Ingests the queued detail rows in one go: one rollup update and one data version bump
+    per batch instead of per car. A failure is counted and printed; the tags stay in the
+    DB for the next backfill (python common/listings.py)."""
+    if not pending:
+        return
+    with telemetry.timer('ingest'):
+        try:
+            listings.ingest(market_conn, pending)
+        except Exception as e:
+            market_conn.rollback()
+            telemetry.inc('ingest_errors')
+            print(f"    Ingest Error ({len(pending)} cars kept in {DB_NAME}): {e}")
+    pending.clear()
+
 def main():
     init_db()
     
@@ -150,11 +194,15 @@ def main():
         print("[*] No pending cars to scrape.")
         return
 
-    print(f"[*] Starting detail scrape with {MAX_WORKERS} threads...")
+    print(f"[*] Starting detail scrape with up to {MAX_WORKERS} threads (adaptive, starting at {INITIAL_WORKERS})...")
+    telemetry.set_gauge('concurrency_limit', INITIAL_WORKERS)
     
     processed_count = 0
+    # One market.db connection for the run, used only from this thread
+    market_conn = listings.connect()
+    pending = []
     
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+    with telemetry, ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
         # Submit tasks
         future_to_id = {executor.submit(scrape_details, car_id): car_id for car_id in ids_to_scrape}
         
@@ -165,17 +213,30 @@ def main():
                 
                 if result is not None:
                     # Save results
-                    save_tags(result, car_id_if_empty=car_id)
+                    save_tags(result, pending, car_id_if_empty=car_id)
+                    if len(pending) >= INGEST_BATCH_SIZE:
+                        flush_ingest(market_conn, pending)
                     processed_count += 1
+                    telemetry.inc('cars_processed')
                     if processed_count % 50 == 0:
-                        print(f"[*] Processed {processed_count} cars...")
+                        print(f"[*] Processed {processed_count} cars... (concurrency {controller.stats()['limit']})")
                 else:
                     # Result is None implies 404 or missing table
                     print(f"[-] No data for car {car_id}")
+                    telemetry.inc('cars_without_details')
                     
             except Exception as exc:
                 print(f"[!] ID {car_id} generated exception: {exc}")
 
+        flush_ingest(market_conn, pending)
+
+    # Planner statistics for the freshly loaded tags / vehicles (common/migrations.py)
+    conn = sqlite3.connect(DB_NAME, timeout=30)
+    migrations.optimize(conn)
+    conn.close()
+    migrations.optimize(market_conn)
+    market_conn.close()
+
     print("[*] Detail scraping complete.")
 
 if __name__ == "__main__":
@@ -6,14 +6,28 @@ from bs4 import BeautifulSoup
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import time
 import os
+import sys
 from dotenv import load_dotenv
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from common import dedup, history, listings, migrations, rollups
+from common.concurrency import AIMDController
+from common.telemetry import ScrapeTelemetry
+
 # --- Configuration ---
 DB_NAME = 'database.db'
+BASE_URL = os.getenv('AUTOAM_BASE_URL', 'https://auto.am')
 
 # The site limits results to 10,000 cars. 
 MAX_PAGES_PER_RANGE = 200
-MAX_WORKERS = 1
+# Counters that make a crawl incomplete: unseen cars are then not marked removed
+INCOMPLETE_COUNTERS = ('failed_pages', 'failed_batches', 'capped_ranges')
+
+# Concurrency adapts between 1 and MAX_WORKERS, starting at INITIAL_WORKERS (see common/concurrency.py)
+MAX_WORKERS = 8
+INITIAL_WORKERS = 1
+# Attempts per page when the site throttles us (429/419/5xx/Cloudflare)
+MAX_RETRIES = 5
 
 # Define your price ranges here (min, max)
 # Overlap slightly (e.g. 20000) to ensure no cars are missed on the boundary
@@ -28,24 +42,15 @@ db_lock = threading.Lock()
 # Global flag to signal threads to stop current range early if needed
 stop_current_range = False
 
+# Throughput / latency / status-code counters (see common/telemetry.py)
+telemetry = ScrapeTelemetry('autoam-pages')
+controller = AIMDController(initial=INITIAL_WORKERS, max_limit=MAX_WORKERS,
+                            on_change=lambda limit: telemetry.set_gauge('concurrency_limit', limit))
+
 def init_db():
-    """Initializes the SQLite database."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS cars (
-            id TEXT PRIMARY KEY,
-            brand TEXT,
-            model TEXT,
-            price REAL,
-            currency TEXT,
-            taxed BOOL,
-            year INT,
-            original_price_text TEXT,
-            scraped_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    conn.commit()
+    """Initializes / migrates the SQLite database (schema in common/migrations.py)."""
+    conn = sqlite3.connect(DB_NAME, timeout=30)
+    migrations.migrate(conn, migrations.AUTOAM)
     conn.close()
     print(f"[*] Database '{DB_NAME}' initialized.")
 
@@ -71,13 +76,73 @@ def get_headers():
         'Cookie': str(os.getenv('USER_SESSION_COOKIE'))
     }
 
+def parse_search_page(html):
+    """Extracts the car cards from a search results page."""
+    soup = BeautifulSoup(html, 'html.parser')
+    car_cards = soup.find_all('div', class_='card')
+    
+    if not car_cards:
+        # If a page returns 0 cars, we might have reached the end of this range
+        # We don't stop immediately because async threads might be out of order,
+        # but getting empty results is a strong hint.
+        return []
+
+    extracted_data = []
+    for card in car_cards:
+        link_tag = card.find('a', class_='click-for-gtag')
+        
+        if link_tag:
+            car_id = link_tag.get('data-id')
+            brand = link_tag.get('data-brand')
+            model = link_tag.get('data-model')
+            price_raw = link_tag.get('data-price')
+            
+            taxed = False
+            
+            tax_div = card.find('div', class_='card-loc')
+            tax_text = tax_div.find('span', class_='green-text')
+            if tax_text:
+                taxed = True
+            
+            year = card.find('span', class_='grey-text').text
+
+            # Currency extraction
+            currency = "?"
+            original_price_text = ""
+            
+            price_div = card.find('div', class_='price')
+            if not price_div:
+                price_div = card.find('div', class_='ad-mob-price')
+            
+            if price_div:
+                span = price_div.find('span')
+                if span:
+                    text = span.get_text(strip=True)
+                    original_price_text = text
+                    parts = text.split(' ')
+                    if len(parts) > 0:
+                        currency = parts[0]
+
+            extracted_data.append({
+                'id': car_id,
+                'brand': brand,
+                'model': model,
+                'price': price_raw,
+                'currency': currency,
+                'taxed': taxed,
+                'year': year,
+                'original_price_text': original_price_text,
+            })
+    
+    return extracted_data
+
 def scrape_page(page_num, min_price, max_price):
     """Scrapes a single page for a specific price range."""
     global stop_current_range
     if stop_current_range:
         return []
 
-    url = 'https://auto.am/search'
+    url = f'{BASE_URL}/search'
     
     # Dynamic payload with price range
     search_params = {
@@ -94,83 +159,46 @@ def scrape_page(page_num, min_price, max_price):
     data = {'search': json.dumps(search_params)}
 
     try:
-        response = requests.post(url, headers=get_headers(), data=data, timeout=15)
+        for attempt in range(MAX_RETRIES):
+            # Waits while the controller is at its limit or paused by a Retry-After
+            with controller.slot() as slot, telemetry.timer('request'):
+                response = requests.post(url, headers=get_headers(), data=data, timeout=15)
+                slot.done(response.status_code, response.headers, response.text)
+            telemetry.record_status(response.status_code)
+            if not slot.throttled or stop_current_range:
+                break
+            telemetry.inc('retries')
         
+        if slot.throttled:
+            print(f"[!] Page {page_num} throttled after {attempt + 1} attempts (Status {response.status_code})")
+            telemetry.inc('failed_pages')
+            return []
+
         if response.status_code != 200:
             # 419 usually means CSRF token expired
             print(f"[!] Error Page {page_num}: Status {response.status_code}")
+            telemetry.inc('failed_pages')
             return []
 
-        soup = BeautifulSoup(response.text, 'html.parser')
-        car_cards = soup.find_all('div', class_='card')
-        
-        if not car_cards:
-            # If a page returns 0 cars, we might have reached the end of this range
-            # We don't stop immediately because async threads might be out of order,
-            # but getting empty results is a strong hint.
-            return []
-
-        extracted_data = []
-        for card in car_cards:
-            link_tag = card.find('a', class_='click-for-gtag')
-            
-            if link_tag:
-                car_id = link_tag.get('data-id')
-                brand = link_tag.get('data-brand')
-                model = link_tag.get('data-model')
-                price_raw = link_tag.get('data-price')
-                
-                taxed = False
-                
-                tax_div = card.find('div', class_='card-loc')
-                tax_text = tax_div.find('span', class_='green-text')
-                if tax_text:
-                    taxed = True
-                
-                year = card.find('span', class_='grey-text').text
-                
-                
-                print(year)
-                # Currency extraction
-                currency = "?"
-                original_price_text = ""
-                
-                price_div = card.find('div', class_='price')
-                if not price_div:
-                    price_div = card.find('div', class_='ad-mob-price')
-                
-                if price_div:
-                    span = price_div.find('span')
-                    if span:
-                        text = span.get_text(strip=True)
-                        original_price_text = text
-                        parts = text.split(' ')
-                        if len(parts) > 0:
-                            currency = parts[0]
-
-                extracted_data.append({
-                    'id': car_id,
-                    'brand': brand,
-                    'model': model,
-                    'price': price_raw,
-                    'currency': currency,
-                    'taxed': taxed,
-                    'year': year,
-                    'original_price_text': original_price_text,
-                })
-        
-        return extracted_data
+        with telemetry.timer('parse'):
+            cars = parse_search_page(response.text)
+        telemetry.inc('pages')
+        if not cars:
+            telemetry.inc('empty_pages')
+        return cars
 
     except Exception as e:
+        telemetry.record_status('error')
+        telemetry.inc('failed_pages')
         print(f"[!] Exception on page {page_num}: {e}")
         return []
 
-def save_batch(cars):
-    """Saves a batch of cars to the DB."""
+def save_batch(cars, market_conn):
+    """Saves a batch of cars to the DB and ingests it into market.db through `market_conn`."""
     if not cars:
         return
 
-    with db_lock:
+    with db_lock, telemetry.timer('db'):
         conn = sqlite3.connect(DB_NAME)
         cursor = conn.cursor()
         count = 0
@@ -185,11 +213,15 @@ def save_batch(cars):
                 pass 
         conn.commit()
         conn.close()
-        # Optional: Print progress
-        # print(f"   Saved {count} cars.")
+        telemetry.inc('cars_saved', count)
 
-def run_price_range(min_p, max_p):
-    """Orchestrates scraping for a specific price bracket."""
+    # Canonical vehicles table, price history and rollups (common/listings.py)
+    with telemetry.timer('ingest'):
+        listings.ingest(market_conn, [listings.from_autoam_car(car) for car in cars])
+
+def run_price_range(min_p, max_p, market_conn):
+    """Orchestrates scraping for a specific price bracket. Batches are saved from this
+    thread, so the one market.db connection is never shared across threads."""
     global stop_current_range
     stop_current_range = False
     
@@ -210,7 +242,7 @@ def run_price_range(min_p, max_p):
             try:
                 cars = future.result()
                 if cars:
-                    save_batch(cars)
+                    save_batch(cars, market_conn)
                     total_cars_in_range += len(cars)
                     print(f"    Page {page}: {len(cars)} cars (Total in range: {total_cars_in_range})")
                     empty_page_streak = 0 
@@ -220,18 +252,49 @@ def run_price_range(min_p, max_p):
                     # so this is just a loose indicator.
                     empty_page_streak += 1
             except Exception as exc:
+                # Cars scraped but not saved / ingested: the crawl did not see them
+                telemetry.inc('failed_batches')
                 print(f"    Page {page} generated an exception: {exc}")
+                continue
+            if page == MAX_PAGES_PER_RANGE and cars:
+                # Still cars on the last page the site serves: the range holds more than we can list
+                telemetry.inc('capped_ranges')
+                print(f"[!] Range ${min_p}-${max_p} hit the {MAX_PAGES_PER_RANGE}-page cap, split it in PRICE_RANGES")
 
     print(f"[<<<] Finished Range ${min_p}-${max_p}. Total cars: {total_cars_in_range}")
 
 def main():
     init_db()
+    started_day = history.today()
+    # One market.db connection for the whole run (vehicles, price history, rollups)
+    market_conn = listings.connect()
     
-    # Iterate through the defined price ranges sequentially
-    for min_price, max_price in PRICE_RANGES:
-        run_price_range(min_price, max_price)
-        # Small delay between ranges
-        time.sleep(2)
+    with telemetry:
+        # Iterate through the defined price ranges sequentially
+        for min_price, max_price in PRICE_RANGES:
+            run_price_range(min_price, max_price, market_conn)
+            # Small delay between ranges
+            time.sleep(2)
+
+    # Match the new cars against list.am, so the market stats count each car once (common/dedup.py)
+    dedup.run(market_conn)
+
+    # Planner statistics for the freshly loaded cars / vehicles (common/migrations.py)
+    conn = sqlite3.connect(DB_NAME, timeout=30)
+    migrations.optimize(conn)
+    conn.close()
+    migrations.optimize(market_conn)
+
+    # Listings not seen in this crawl have been sold or taken down
+    counters = telemetry.snapshot()['counters']
+    incomplete = {name: counters[name] for name in INCOMPLETE_COUNTERS if counters.get(name)}
+    if not incomplete:
+        removed = history.finish_crawl(market_conn, 'autoam', started_day)
+        rollups.drop_removed(market_conn, 'autoam')
+        print(f"[*] Price history: {removed} cars marked removed.")
+    else:
+        print(f"[!] Crawl incomplete {incomplete}, not marking unseen cars as removed.")
+    market_conn.close()
 
     print("\n[*] All ranges complete. Check database.db")
 
@@ -1,49 +1,28 @@
+import math
 import streamlit as st
-import pandas as pd
-import numpy as np
-from catboost import CatBoostRegressor
+
+import snapshot
 
 # --- CONFIGURATION ---
-MODEL_PATH = "car_price_model2.cbm"
-DATA_PATH = "combined.tsv"  # We need this to get the lists of Make/Models
+# Paths live in snapshot.py: a warm-start snapshot (python snapshot.py) is loaded when present,
+# otherwise the export / .cbm model and combined.tsv as before. pandas, numpy and catboost are
+# only imported on those fallback paths.
 
 st.set_page_config(page_title="Armenia Car Price AI", layout="centered")
 
 # --- LOAD RESOURCES ---
 @st.cache_resource
 def load_model():
-    model = CatBoostRegressor()
-    model.load_model(MODEL_PATH)
-    return model
+    return snapshot.load_model()
 
 @st.cache_data
-def load_data():
-    # Load data just to get unique values for dropdowns
-    df = pd.read_csv(DATA_PATH, sep='\t')
-    
-    # Rename columns to match training (Minimal cleanup for dropdowns)
-    column_mapping = {
-        'brand': 'Make', 'model': 'Model', 'taxed': 'Taxed',
-        'year': 'Year', 'Անվահեծերը': 'Wheel_Size', 'Գույնը': 'Color',
-        'Դռների քանակը': 'Door_Count', 'Թափքը': 'Body_Type',
-        'Հեռահարությունը': 'Range_Km', 'Ձիաուժը': 'Horsepower',
-        'Ղեկը': 'Steering', 'Մարտկոցի տարողունակությունը կվտ': 'Battery_Capacity',
-        'Մխոցների քանակը': 'Cylinders', 'Մոդիֆիկացիան': 'Trim',
-        'Շարժիչը': 'Fuel_Type', 'Շարժիչի ծավալը': 'Engine_Volume',
-        'Սրահի գույնը': 'Interior_Color', 'Վազքը': 'Mileage',
-        'Վիճակը': 'Condition', 'Փոխանցման տուփը': 'Transmission',
-        'Քարշակը': 'Drive_Type', 'էլ․ շարժիչների քանակը': 'Electric_Motor_Count'
-    }
-    df = df.rename(columns=column_mapping)
-    
-    # Basic cleaning to make dropdowns look nice
-    df['Make'] = df['Make'].astype(str)
-    df['Model'] = df['Model'].astype(str)
-    return df
+def load_vocab():
+    # Dropdown values (combine.py already uses the training column names)
+    return snapshot.load_vocab()
 
 try:
     model = load_model()
-    df = load_data()
+    vocab = load_vocab()
     st.success("✅ Model & Data Loaded Successfully")
 except Exception as e:
     st.error(f"Error loading resources: {e}")
@@ -53,15 +32,15 @@ except Exception as e:
 st.sidebar.header("🚗 Car Details")
 
 # cascading dropdowns
-unique_makes = sorted(df['Make'].unique())
+unique_makes = vocab['Make']
 selected_make = st.sidebar.selectbox("Make (Brand)", unique_makes)
 
-unique_models = sorted(df[df['Make'] == selected_make]['Model'].unique())
+unique_models = vocab['Model'].get(selected_make, [])
 selected_model = st.sidebar.selectbox("Model", unique_models)
 
 year = st.sidebar.number_input("Year", min_value=1990, max_value=2026, value=2020)
 mileage = st.sidebar.number_input("Mileage (km)", min_value=0, value=50000, step=1000)
-condition = st.sidebar.selectbox("Condition", sorted(df['Condition'].astype(str).unique()))
+condition = st.sidebar.selectbox("Condition", vocab['Condition'])
 
 # --- MAIN PAGE: Technical Specs ---
 st.title("🤖 Car Price Predictor")
@@ -70,9 +49,9 @@ st.markdown("### Technical Specifications")
 col1, col2, col3 = st.columns(3)
 
 with col1:
-    fuel_type = st.selectbox("Fuel Type", sorted(df['Fuel_Type'].astype(str).unique()))
-    transmission = st.selectbox("Transmission", sorted(df['Transmission'].astype(str).unique()))
-    drive_type = st.selectbox("Drive Type", sorted(df['Drive_Type'].astype(str).unique()))
+    fuel_type = st.selectbox("Fuel Type", vocab['Fuel_Type'])
+    transmission = st.selectbox("Transmission", vocab['Transmission'])
+    drive_type = st.selectbox("Drive Type", vocab['Drive_Type'])
 
 with col2:
     engine_vol = st.number_input("Engine Volume (L)", 0.0, 8.0, 2.0)
@@ -80,8 +59,8 @@ with col2:
     cylinders = st.selectbox("Cylinders", [4, 6, 8, 12, 'Unknown'])
 
 with col3:
-    body_type = st.selectbox("Body Type", sorted(df['Body_Type'].astype(str).unique()))
-    color = st.selectbox("Color", sorted(df['Color'].astype(str).unique()))
+    body_type = st.selectbox("Body Type", vocab['Body_Type'])
+    color = st.selectbox("Color", vocab['Color'])
     steering = st.selectbox("Steering", ["Left", "Right"])
 
 # Advanced / Less Common Features in Expander
@@ -90,7 +69,7 @@ with st.expander("Show Advanced Options (Trim, Wheels, EV Info)"):
     with c1:
         is_taxed = st.radio("Customs Cleared? (Taxed)", ["Yes", "No"])
         trim = st.text_input("Trim / Modification", "Base")
-        interior = st.selectbox("Interior Color", sorted(df['Interior_Color'].astype(str).unique()))
+        interior = st.selectbox("Interior Color", vocab['Interior_Color'])
     with c2:
         battery = st.number_input("Battery (kWh) - EVs only", 0, 150, 0)
         range_km = st.number_input("Range (km) - EVs only", 0, 1000, 0)
@@ -128,9 +107,6 @@ if st.button("💰 Predict Price"):
         'Car_Age': [2025 - year] 
     }
     
-    # Convert to DataFrame
-    input_df = pd.DataFrame(input_data)
-    
     # 2. Force Column Order
     # To be 100% safe, we force the columns to be in the exact order the model expects.
     # This prevents "Left" from sliding into a numeric slot ever again.
@@ -142,18 +118,23 @@ if st.button("💰 Predict Price"):
         'Transmission', 'Drive_Type', 'Electric_Motor_Count', 'Car_Age'
     ]
     
-    # Reorder the dataframe to match training
-    input_df = input_df[expected_order]
-    
     # 3. Predict
+    input_df = None
     try:
-        log_pred = model.predict(input_df)
-        price_pred = np.expm1(log_pred)
+        if hasattr(model, 'predict_one'):  # FastPredictor: no DataFrame needed
+            log_pred = model.predict_one({k: v[0] for k, v in input_data.items()})
+        else:
+            import pandas as pd
+            # Reorder the dataframe to match training
+            input_df = pd.DataFrame(input_data)[expected_order]
+            log_pred = model.predict(input_df)[0]
+        price_pred = math.expm1(log_pred)
         
-        st.success(f"## Estimated Price: ${price_pred[0]:,.0f}")
+        st.success(f"## Estimated Price: ${price_pred:,.0f}")
         st.info("💡 Note: This prediction assumes the car is in typical market condition.")
         
     except Exception as e:
         st.error(f"Prediction Failed: {e}")
-        st.write("Debug Info - Input Data Types:")
-        st.write(input_df.dtypes)
\ No newline at end of file
+        if input_df is not None:
+            st.write("Debug Info - Input Data Types:")
+            st.write(input_df.dtypes)
\ No newline at end of file
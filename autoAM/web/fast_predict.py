@@ -0,0 +1,488 @@
+"""
+Dependency-light inference for the car price model.
+
+Runs the model exported by ../boosting/export_model.py (CatBoost's Python export,
+which already carries the {category value -> hash} table) without catboost or
+pandas. Predictions are vectorized over a whole chunk of rows: each float feature is
+binarized with one np.searchsorted, each categorical column is hashed once per
+distinct value, the CTR projection hashes are folded for every row and projection at
+once in uint64 NumPy arithmetic, and the trees are evaluated with one gather.
+
+Serving loads a snapshot (the default, see snapshot.py): .npy arrays memory-mapped
+on load plus a small JSON, with every CTR bin precomputed. Building a predictor from
+the export module instead imports the generated code, which takes seconds for a real
+model (catboost's own load_model takes milliseconds), so that is only for building
+the snapshot, or a fallback when none was built:
+
+    predictor = FastPredictor.load_snapshot('snapshot/model')    # serving
+    log_price = predictor.predict_one({'Make': 'Toyota', 'Model': 'Camry', ...})
+    log_prices = predictor.predict(np.array([...], dtype=object))  # rows in feature order
+
+    FastPredictor(EXPORT_PATH).save_snapshot('snapshot/model')   # once per export
+
+This is the single-row engine: one prediction takes well under a millisecond against a
+few milliseconds for CatBoost's DataFrame path, and the app runs without catboost or
+pandas installed. It is not the faster batch engine. CatBoost's own predict scores
+thousands of rows several times faster (see benchmarks/bench_inference.py), so batch
+scoring goes through snapshot.load_batch_model(), which only falls back to this class
+when catboost is missing.
+"""
+import importlib.util
+import json
+import math
+import os
+from bisect import bisect_left
+
+import numpy as np
+
+EXPORT_PATH = "car_price_model2_export.py"
+
+# What the exported hash_uint64 returns for a category value it never saw in training
+_UNKNOWN_HASH = 0x7fFFffFF
+
+# CatBoost's projection hash: h = MAGIC * (h + MAGIC * x) mod 2**64 (see calc_hash in the export)
+_MAGIC_MULT = np.uint64(0x4906ba494954cb65)
+_MAGIC_MULT_SQ = np.uint64(0x4906ba494954cb65 ** 2 % 2 ** 64)
+
+# Up to this many rows, CTR bins come from one lookup over all projections at once
+# (_ctr_bins_merged); bigger chunks search each projection's small table, which stays in cache
+_MERGED_LOOKUP_ROWS = 32
+
+# Binarized feature values never exceed 255, so this border pads shorter trees with a no-op split
+_PAD_BORDER = 256
+
+# Bumped when the snapshot layout changes; older snapshots are refused rather than misread
+SNAPSHOT_FORMAT = 2
+
+# Arrays written to / memory-mapped from a snapshot directory
+_SNAPSHOT_ARRAYS = ('_split_feature', '_split_border', '_split_xor', '_leaf_offsets', '_leaf_values')
+_SNAPSHOT_CTR_ARRAYS = ('_proj_inputs', '_proj_mask', '_test_index', '_test_equal', '_test_value')
+
+
+def load_export(export_path=EXPORT_PATH):
+    """Imports the generated model module and its sidecar metadata (feature names / types)."""
+    spec = importlib.util.spec_from_file_location("_car_price_export", export_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    meta_path = os.path.splitext(export_path)[0] + ".json"
+    with open(meta_path, encoding='utf-8') as f:
+        meta = json.load(f)
+    return module, meta
+
+
+class FastPredictor:
+    def __init__(self, export_path=EXPORT_PATH):
+        module, meta = load_export(export_path)
+        self.feature_names = meta['feature_names']
+        cat_idx = set(meta['cat_feature_indices'])
+        self.cat_features = [n for i, n in enumerate(self.feature_names) if i in cat_idx]
+        self.float_features = [n for i, n in enumerate(self.feature_names) if i not in cat_idx]
+        self._float_pos = [i for i in range(len(self.feature_names)) if i not in cat_idx]
+        self._cat_pos = [i for i in range(len(self.feature_names)) if i in cat_idx]
+
+        # The exporter writes non-ASCII keys as UTF-8 bytes read back as latin-1 (Armenian colors,
+        # fuel types, ...), so repair them once here instead of missing every lookup at predict time
+        self._cat_hashes = {_repair_key(k): v for k, v in module.cat_features_hashes.items()}
+
+        m = module.catboost_model
+        self._binary_feature_count = m.binary_feature_count
+        self._float_borders = [(m.float_features_index[i], borders)
+                               for i, borders in enumerate(m.float_feature_borders) if borders]
+
+        packed = {m.cat_features_index[i]: i for i in range(m.cat_feature_count)}
+        self._one_hot = [(packed[cat_index], m.one_hot_hash_values[i])
+                         for i, cat_index in enumerate(m.one_hot_cat_feature_index) if m.one_hot_hash_values[i]]
+
+        self._init_ctrs(m)
+        self._init_trees(m)
+
+    # --- setup ---
+
+    def _init_ctrs(self, m):
+        """
+        Flattens the CTR projections into index arrays so every projection hash can be
+        folded at once, and keeps what each CTR needs for its projection hash -> bin table.
+        """
+        self._ctrs = []         # (projection, default bin); a projection's CTRs are consecutive
+        self._ctr_sources = []  # (hash viewer, ctr, learn ctr, borders), for _ctr_lookup()
+        self._ctr_groups = []
+        if not (hasattr(m, 'model_ctrs') and m.model_ctrs.used_model_ctrs_count > 0):
+            return
+
+        compressed = m.model_ctrs.compressed_model_ctrs
+        learn_ctrs = m.model_ctrs.ctr_data.learn_ctrs
+
+        # Each projection input is either a categorical hash or a 0/1 test on a binary feature.
+        # Inputs are read from one source vector: [cat hashes..., bin tests...]
+        bin_tests = {}
+        inputs = []
+        for c in compressed:
+            row = list(c.projection.transposed_cat_feature_indexes)
+            for b in c.projection.binarized_indexes:
+                test = (b.bin_index, bool(b.check_value_equal), b.value)
+                row.append(m.cat_feature_count + bin_tests.setdefault(test, len(bin_tests)))
+            inputs.append(row)
+
+        width = max(len(r) for r in inputs)
+        self._proj_inputs = np.zeros((len(inputs), width), dtype=np.int64)
+        self._proj_mask = np.zeros((len(inputs), width), dtype=bool)
+        for p, row in enumerate(inputs):
+            self._proj_inputs[p, :len(row)] = row
+            self._proj_mask[p, :len(row)] = True
+
+        tests = sorted(bin_tests, key=bin_tests.get)
+        self._test_index = np.array([t[0] for t in tests], dtype=np.int64)
+        self._test_equal = np.array([t[1] for t in tests], dtype=bool)
+        self._test_value = np.array([t[2] for t in tests], dtype=np.int64)
+
+        k = 0
+        for p, c in enumerate(compressed):
+            for ctr in c.model_ctrs:
+                learn_ctr = learn_ctrs[ctr.base_hash]
+                borders = m.ctr_feature_borders[k]
+                default = bisect_left(borders, ctr.calc(0, 0))
+                self._ctrs.append((p, default))
+                self._ctr_sources.append((learn_ctr.index_hash_viewer, ctr, learn_ctr, borders))
+                k += 1
+        # Built on first use, so loading stays cheap
+        self._ctr_groups = None
+
+    def _ctr_lookup(self):
+        """
+        One table per projection, shared by its CTRs:
+        (projection, first CTR, end CTR, sorted projection hashes, bins), where bins is
+        (CTRs, hashes + 1) and its last column holds each CTR's default bin.
+        """
+        if self._ctr_groups is None:
+            groups = []
+            start = 0
+            while start < len(self._ctrs):
+                p = self._ctrs[start][0]
+                end = start
+                while end < len(self._ctrs) and self._ctrs[end][0] == p:
+                    end += 1
+                tables = []
+                for k in range(start, end):
+                    viewer, ctr, learn_ctr, borders = self._ctr_sources[k]
+                    tables.append({h: bisect_left(borders, _ctr_value(ctr, learn_ctr, bucket))
+                                   for h, bucket in viewer.items()})
+                keys = np.array(sorted(set().union(*tables)), dtype=np.uint64)
+                bins = np.empty((end - start, len(keys) + 1), dtype=np.uint16)
+                for row, (table, k) in enumerate(zip(tables, range(start, end))):
+                    bins[row, :-1] = [table.get(h, self._ctrs[k][1]) for h in keys.tolist()]
+                    bins[row, -1] = self._ctrs[k][1]
+                groups.append((p, start, end, keys, bins))
+                start = end
+            self._ctr_groups = groups
+        return self._ctr_groups
+
+    def _init_trees(self, m):
+        # Flatten the (non-uniform depth) trees into padded (tree, depth) arrays
+        depths = np.asarray(m.tree_depth, dtype=np.int64)
+        tree_count, max_depth = len(depths), int(depths.max()) if len(depths) else 0
+        self._split_feature = np.zeros((tree_count, max_depth), dtype=np.int64)
+        self._split_border = np.full((tree_count, max_depth), _PAD_BORDER, dtype=np.int64)
+        self._split_xor = np.zeros((tree_count, max_depth), dtype=np.int64)
+        pos = 0
+        for t, d in enumerate(depths):
+            self._split_feature[t, :d] = m.tree_split_feature_index[pos:pos + d]
+            self._split_border[t, :d] = m.tree_split_border[pos:pos + d]
+            self._split_xor[t, :d] = m.tree_split_xor_mask[pos:pos + d]
+            pos += d
+
+        self._leaf_offsets = np.concatenate(([0], np.cumsum(1 << depths)[:-1])).astype(np.int64)
+        self._leaf_values = np.asarray(m.leaf_values, dtype=np.float64)[:, 0]
+        self._scale = m.scale
+        self._bias = m.biases[0]
+
+    # --- binarization (whole chunk) ---
+
+    def _binarize(self, floats, hashes):
+        """
+        floats: (n_float, n) float array, hashes: (n_cat, n) int64 array of category
+        hashes -> (n_binary_features, n) uint16 array. Features are rows (feature-major),
+        so every gather below copies contiguous runs of n values. Bins never exceed
+        CatBoost's 65535 borders, so uint16 keeps the tree gathers small.
+        """
+        n = floats.shape[1] if floats.ndim == 2 else hashes.shape[1]
+        width = len(self._float_borders) + len(self._one_hot) + len(self._ctrs)
+        binary = np.zeros((max(self._binary_feature_count, width), n), dtype=np.uint16)
+
+        row = 0
+        for idx, borders in self._float_borders:
+            values = floats[idx]
+            # Same bin as bisect_left; NaN compares False against every border, i.e. the lowest bin
+            binary[row] = np.where(np.isnan(values), 0, np.searchsorted(borders, values, side='left'))
+            row += 1
+
+        for packed_index, values in self._one_hot:
+            matches = hashes[packed_index] == np.asarray(values, dtype=np.int64)[:, None]
+            binary[row] = np.where(matches.any(axis=0), matches.argmax(axis=0) + 1, 0)
+            row += 1
+
+        if self._ctrs:
+            binary[row:row + len(self._ctrs)] = self._ctr_bins(binary, hashes)
+        return binary
+
+    def _ctr_bins(self, binary, hashes):
+        """(n_ctrs, n) bins; projection hashes are folded for every row and projection at once."""
+        tested = binary[self._test_index]
+        value = self._test_value[:, None]
+        bits = np.where(self._test_equal[:, None], tested == value, tested >= value)
+        source = np.concatenate((hashes, bits.astype(np.int64))).astype(np.uint64)
+
+        # Column 0 starts every projection's hash (from 0); later columns fold into the
+        # projections that have that many inputs
+        # (M * (h + M * x) == M * h + M^2 * x mod 2**64)
+        proj_hash = source[self._proj_inputs[:, 0]]
+        proj_hash *= _MAGIC_MULT_SQ
+        for col in range(1, self._proj_inputs.shape[1]):
+            rows = np.flatnonzero(self._proj_mask[:, col])
+            folded = proj_hash[rows]
+            folded *= _MAGIC_MULT
+            folded += _MAGIC_MULT_SQ * source[self._proj_inputs[rows, col]]
+            proj_hash[rows] = folded
+
+        if binary.shape[1] <= _MERGED_LOOKUP_ROWS:
+            return self._ctr_bins_merged(proj_hash)
+        bins = np.empty((len(self._ctrs), binary.shape[1]), dtype=binary.dtype)
+        for p, start, end, keys, table in self._ctr_lookup():
+            h = proj_hash[p]
+            if len(keys):
+                pos = np.minimum(np.searchsorted(keys, h), len(keys) - 1)
+                # Hashes the training data never had take the default column
+                pos[keys[pos] != h] = len(keys)
+            else:
+                pos = np.zeros(len(h), dtype=np.int64)
+            bins[start:end] = table[:, pos]
+        return bins
+
+    def _ctr_bins_merged(self, proj_hash):
+        """_ctr_bins() for a few rows: one search over every projection's hashes at once."""
+        proj, mix, keys, key_group, key_pos, default, row_group, row_base, table = self._ctr_merged()
+        tagged = proj_hash[proj] ^ mix[:, None]                               # (groups, n)
+        j = np.minimum(np.searchsorted(keys, tagged), len(keys) - 1)
+        hit = (keys[j] == tagged) & (key_group[j] == np.arange(len(proj))[:, None])
+        pos = np.where(hit, key_pos[j], default[:, None])
+        return table[row_base[:, None] + pos[row_group]]
+
+    def _ctr_merged(self):
+        """
+        The per-projection tables of _ctr_lookup() as one sorted array. Each group's hashes
+        are XORed with its own constant (tagged), so all groups share one searchsorted; a
+        hit also has to come from the right group, which keeps the lookup exact.
+        """
+        if getattr(self, '_ctr_merged_cache', None) is None:
+            groups = self._ctr_lookup()
+            seed = 0
+            while True:
+                mix = np.array([_splitmix64(seed + g) for g in range(len(groups))], dtype=np.uint64)
+                tagged = np.concatenate([g[3] ^ mix[i] for i, g in enumerate(groups)])
+                if len(np.unique(tagged)) == len(tagged):
+                    break
+                seed += len(groups)  # two groups' tagged hashes collide: try other constants
+            order = np.argsort(tagged)
+            key_group = np.concatenate([np.full(len(g[3]), i, dtype=np.int64) for i, g in enumerate(groups)])
+            key_pos = np.concatenate([np.arange(len(g[3]), dtype=np.int64) for g in groups])
+            row_group, row_base, offset = [], [], 0
+            for i, (p, start, end, keys, table) in enumerate(groups):
+                for row in range(end - start):
+                    row_group.append(i)
+                    row_base.append(offset + row * table.shape[1])
+                offset += table.size
+            self._ctr_merged_cache = (
+                np.array([g[0] for g in groups], dtype=np.int64), mix, tagged[order],
+                key_group[order], key_pos[order], np.array([len(g[3]) for g in groups], dtype=np.int64),
+                np.array(row_group, dtype=np.int64), np.array(row_base, dtype=np.int64),
+                np.concatenate([g[4].ravel() for g in groups]))
+        return self._ctr_merged_cache
+
+    def _split_rows(self, rows):
+        """
+        Accepts dicts keyed by feature name or sequences / a 2D array in feature order.
+        Returns the (n_float, n) float matrix and the (n_cat, n) category hashes.
+        """
+        if len(rows) and isinstance(rows[0], dict):
+            values = [[row[name] for name in self.feature_names] for row in rows]
+        else:
+            values = rows
+        values = np.asarray(values, dtype=object).reshape(len(rows), len(self.feature_names))
+
+        floats = np.empty((len(self._float_pos), len(rows)), dtype=np.float64)
+        for j, i in enumerate(self._float_pos):
+            try:
+                floats[j] = values[:, i].astype(np.float64)
+            except (TypeError, ValueError):
+                floats[j] = [_to_float(v) for v in values[:, i]]
+
+        hashes = np.empty((len(self._cat_pos), len(rows)), dtype=np.int64)
+        for j, i in enumerate(self._cat_pos):
+            # One dict lookup per distinct value of the column
+            lookup = {}
+            column = values[:, i].tolist()
+            for v in column:
+                if v not in lookup:
+                    lookup[v] = self._cat_hashes.get(_to_cat(v), _UNKNOWN_HASH)
+            hashes[j] = [lookup[v] for v in column]
+        return floats, hashes
+
+    # --- tree evaluation ---
+
+    def _apply(self, binary):
+        """binary: (n_binary_features, n) uint16 array -> raw model values."""
+        feature, xor, border = self._splits()
+        leaf_index = np.zeros((len(feature), binary.shape[1]), dtype=np.int64)   # (trees, n)
+        # One depth level at a time, so no (trees, depth, n) array is materialized
+        for d in range(feature.shape[1]):
+            bits = (binary[feature[:, d]] ^ xor[:, d, None]) >= border[:, d, None]
+            leaf_index |= bits.astype(np.int64) << d
+        leaf_index += self._leaf_offsets[:, None]
+        return self._leaf_values[leaf_index].sum(axis=0) * self._scale + self._bias
+
+    def _splits(self):
+        """Split arrays in the binary features' dtype, so comparisons don't upcast every gather."""
+        if getattr(self, '_splits_cache', None) is None:
+            self._splits_cache = (np.asarray(self._split_feature, dtype=np.int64),
+                                  np.asarray(self._split_xor, dtype=np.uint16),
+                                  np.asarray(self._split_border, dtype=np.uint16))
+        return self._splits_cache
+
+    def predict_one(self, row):
+        """Raw (log-price) prediction for one dict or feature-ordered sequence."""
+        return float(self.predict([row])[0])
+
+    def predict(self, rows, chunk_size=1024):
+        """Raw (log-price) predictions for a list of dicts or a 2D array in feature order.
+
+        Correct for any number of rows, but slower than CatBoostRegressor.predict on big
+        batches; prefer snapshot.load_batch_model() for those.
+        """
+        if isinstance(rows, np.ndarray) and rows.ndim == 1:
+            rows = [rows]
+        out = []
+        for start in range(0, len(rows), chunk_size):
+            out.append(self._apply(self._binarize(*self._split_rows(rows[start:start + chunk_size]))))
+        return np.concatenate(out) if out else np.empty(0)
+
+    def predict_price(self, row):
+        """Dollar price for one row (the model is trained on log1p(price))."""
+        return math.expm1(self.predict_one(row))
+
+    # --- warm-start snapshot ---
+
+    def save_snapshot(self, path):
+        """Writes everything predict() needs to `path` (a directory), CTR bins included."""
+        os.makedirs(path, exist_ok=True)
+        arrays = _SNAPSHOT_ARRAYS + (_SNAPSHOT_CTR_ARRAYS if self._ctrs else ())
+        for name in arrays:
+            np.save(os.path.join(path, f"{name.lstrip('_')}.npy"), np.asarray(getattr(self, name)))
+
+        # The per-projection CTR tables, flattened: group g owns ctr_keys[key_offsets[g]:key_offsets[g + 1]]
+        # and ctr_bins[bin_offsets[g]:bin_offsets[g + 1]] (its (CTRs, hashes + 1) bins, row-major)
+        groups = self._ctr_lookup()
+        key_offsets = np.cumsum([0] + [len(g[3]) for g in groups])
+        bin_offsets = np.cumsum([0] + [g[4].size for g in groups])
+        np.save(os.path.join(path, 'ctr_keys.npy'),
+                np.concatenate([g[3] for g in groups]) if groups else np.empty(0, dtype=np.uint64))
+        np.save(os.path.join(path, 'ctr_bins.npy'),
+                np.concatenate([g[4].ravel() for g in groups]) if groups else np.empty(0, dtype=np.uint16))
+        np.save(os.path.join(path, 'ctr_key_offsets.npy'), key_offsets.astype(np.int64))
+        np.save(os.path.join(path, 'ctr_bin_offsets.npy'), bin_offsets.astype(np.int64))
+
+        meta = {
+            'format': SNAPSHOT_FORMAT,
+            'feature_names': self.feature_names,
+            'cat_positions': self._cat_pos,
+            'cat_hashes': self._cat_hashes,
+            'binary_feature_count': self._binary_feature_count,
+            'float_borders': self._float_borders,
+            'one_hot': self._one_hot,
+            'ctrs': self._ctrs,  # (projection, default bin)
+            'ctr_groups': [g[:3] for g in groups],  # (projection, first CTR, end CTR)
+            'scale': self._scale,
+            'bias': self._bias,
+            'arrays': list(arrays),
+        }
+        with open(os.path.join(path, 'model.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+    @classmethod
+    def load_snapshot(cls, path):
+        """A predictor from save_snapshot(), without importing the export (arrays are mmapped)."""
+        with open(os.path.join(path, 'model.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('format') != SNAPSHOT_FORMAT:
+            raise ValueError(f"{path} is an older snapshot format: rebuild it with `python snapshot.py`")
+        self = cls.__new__(cls)
+        self.feature_names = meta['feature_names']
+        cat_pos = set(meta['cat_positions'])
+        self.cat_features = [n for i, n in enumerate(self.feature_names) if i in cat_pos]
+        self.float_features = [n for i, n in enumerate(self.feature_names) if i not in cat_pos]
+        self._float_pos = [i for i in range(len(self.feature_names)) if i not in cat_pos]
+        self._cat_pos = [i for i in range(len(self.feature_names)) if i in cat_pos]
+        self._cat_hashes = meta['cat_hashes']
+        self._binary_feature_count = meta['binary_feature_count']
+        self._float_borders = [tuple(fb) for fb in meta['float_borders']]
+        self._one_hot = [tuple(oh) for oh in meta['one_hot']]
+        self._scale, self._bias = meta['scale'], meta['bias']
+        for name in meta['arrays']:
+            setattr(self, name, np.load(os.path.join(path, f"{name.lstrip('_')}.npy"), mmap_mode='r'))
+
+        keys = np.load(os.path.join(path, 'ctr_keys.npy'), mmap_mode='r')
+        bins = np.load(os.path.join(path, 'ctr_bins.npy'), mmap_mode='r')
+        key_offsets = np.load(os.path.join(path, 'ctr_key_offsets.npy')).tolist()
+        bin_offsets = np.load(os.path.join(path, 'ctr_bin_offsets.npy')).tolist()
+        self._ctrs = [tuple(c) for c in meta['ctrs']]
+        self._ctr_groups = [
+            (p, start, end, keys[key_offsets[g]:key_offsets[g + 1]],
+             bins[bin_offsets[g]:bin_offsets[g + 1]].reshape(end - start, -1))
+            for g, (p, start, end) in enumerate(meta['ctr_groups'])]
+        return self
+
+
+def _ctr_value(ctr, learn_ctr, bucket):
+    """Same formulas as calc_ctrs in the exported module, for one CTR and a known bucket."""
+    ctr_type = ctr.base_ctr_type
+    if ctr_type in ("BinarizedTargetMeanValue", "FloatTargetMeanValue"):
+        history = learn_ctr.ctr_mean_history[bucket]
+        return ctr.calc(history.sum, history.count)
+    if ctr_type in ("Counter", "FeatureFreq"):
+        return ctr.calc(learn_ctr.ctr_total[bucket], learn_ctr.counter_denominator)
+
+    history = learn_ctr.ctr_total
+    classes = learn_ctr.target_classes_count
+    counts = history[bucket * classes:(bucket + 1) * classes]
+    if ctr_type == "Buckets":
+        return ctr.calc(counts[ctr.target_border_idx], sum(counts))
+    if classes > 2:
+        good = sum(counts[ctr.target_border_idx + 1:])
+        return ctr.calc(good, sum(counts[:ctr.target_border_idx + 1]) + good)
+    return ctr.calc(counts[1], counts[0] + counts[1])
+
+
+def _splitmix64(x):
+    x = (x + 0x9e3779b97f4a7c15) % 2 ** 64
+    x = ((x ^ (x >> 30)) * 0xbf58476d1ce4e5b9) % 2 ** 64
+    x = ((x ^ (x >> 27)) * 0x94d049bb133111eb) % 2 ** 64
+    return x ^ (x >> 31)
+
+
+def _repair_key(key):
+    try:
+        return key.encode('latin-1').decode('utf-8')
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return key
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return -1.0
+
+
+def _to_cat(value):
+    if value is None or (isinstance(value, float) and value != value):
+        return "Unknown"
+    return str(value)
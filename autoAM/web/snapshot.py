@@ -0,0 +1,107 @@
+"""
+Warm-start snapshot for the price app (app.py).
+
+A cold worker used to import pandas and catboost, read combined.tsv for the dropdowns
+and load the model before rendering anything. The snapshot directory holds what the
+app actually needs, in files that load in milliseconds:
+
+    snapshot/vocab.json     dropdown values (models per make, colors, conditions, ...)
+    snapshot/model/         FastPredictor.save_snapshot(): .npy arrays, memory-mapped
+
+    python snapshot.py      # after export_model.py; run next to the export and combined.tsv
+
+The load_* functions fall back to the old sources (TSV, export module, .cbm) when the
+snapshot is missing, importing pandas / catboost only then. The snapshot model is the
+single-row engine the app uses; load_batch_model() returns catboost's model for batches.
+"""
+import argparse
+import json
+import os
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SNAPSHOT_DIR = os.path.join(HERE, "snapshot")
+MODEL_PATH = "car_price_model2.cbm"
+EXPORT_PATH = "car_price_model2_export.py"  # Optional, from ../boosting/export_model.py
+DATA_PATH = "combined.tsv"  # We need this to get the lists of Make/Models
+
+# Columns offered as dropdowns besides Make / Model
+VOCAB_COLUMNS = ('Condition', 'Fuel_Type', 'Transmission', 'Drive_Type', 'Body_Type', 'Color', 'Interior_Color')
+
+
+def build_vocab(data_path=DATA_PATH):
+    """{'Make': [...], 'Model': {make: [...]}, column: [...]} from the training TSV."""
+    import pandas as pd
+
+    df = pd.read_csv(data_path, sep='\t')
+    # Basic cleaning to make dropdowns look nice (str() rather than astype(str), which keeps NaN)
+    df['Make'] = df['Make'].map(str)
+    df['Model'] = df['Model'].map(str)
+    vocab = {
+        'Make': sorted(df['Make'].unique()),
+        'Model': {make: sorted(group.unique()) for make, group in df.groupby('Make')['Model']},
+    }
+    for column in VOCAB_COLUMNS:
+        vocab[column] = sorted(df[column].map(str).unique())
+    return vocab
+
+
+def load_vocab(snapshot_dir=SNAPSHOT_DIR, data_path=DATA_PATH):
+    path = os.path.join(snapshot_dir, 'vocab.json')
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    return build_vocab(data_path)
+
+
+def load_model(snapshot_dir=SNAPSHOT_DIR, export_path=EXPORT_PATH, model_path=MODEL_PATH):
+    """Snapshot, else the exported catboost-free engine, else the catboost model."""
+    from fast_predict import FastPredictor
+
+    if os.path.exists(os.path.join(snapshot_dir, 'model', 'model.json')):
+        return FastPredictor.load_snapshot(os.path.join(snapshot_dir, 'model'))
+    # Prefer the exported catboost-free engine when it has been deployed next to the app
+    if os.path.exists(export_path):
+        return FastPredictor(export_path)
+
+    from catboost import CatBoostRegressor
+    model = CatBoostRegressor()
+    model.load_model(model_path)
+    return model
+
+
+def load_batch_model(model_path=MODEL_PATH, snapshot_dir=SNAPSHOT_DIR, export_path=EXPORT_PATH):
+    """
+    Model for scoring many rows at once. CatBoost's own predict is several times faster
+    than the FastPredictor on batches, so the .cbm model is used whenever catboost is
+    installed; the catboost-free engine is only the fallback.
+    """
+    try:
+        from catboost import CatBoostRegressor
+    except ImportError:
+        return load_model(snapshot_dir, export_path, model_path)
+    model = CatBoostRegressor()
+    model.load_model(model_path)
+    return model
+
+
+def build(snapshot_dir=SNAPSHOT_DIR, export_path=EXPORT_PATH, data_path=DATA_PATH):
+    from fast_predict import FastPredictor
+
+    os.makedirs(snapshot_dir, exist_ok=True)
+    with open(os.path.join(snapshot_dir, 'vocab.json'), 'w', encoding='utf-8') as f:
+        json.dump(build_vocab(data_path), f, ensure_ascii=False)
+    FastPredictor(export_path).save_snapshot(os.path.join(snapshot_dir, 'model'))
+    print(f"[*] Snapshot written to {snapshot_dir}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the warm-start snapshot for the price app.")
+    parser.add_argument('--out', default=SNAPSHOT_DIR)
+    parser.add_argument('--export', default=EXPORT_PATH)
+    parser.add_argument('--data', default=DATA_PATH)
+    args = parser.parse_args()
+    build(args.out, args.export, args.data)
+
+
+if __name__ == '__main__':
+    main()
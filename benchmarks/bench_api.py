@@ -0,0 +1,78 @@
+"""
+listAM Flask API latency (/api/vehicles, /api/filter-options) against synthetic
+list.am stores of increasing size, ingested into market.db's vehicles table.
+p50_ms / max_ms are with the response cache off; cached_p50_ms is a repeat request
+answered from the in-process cache.
+"""
+import os
+import statistics
+import sys
+import time
+
+from fixtures import ROOT, cache_path, make_items_db, make_market_db
+
+sys.path.insert(0, os.path.join(ROOT, 'listAM'))
+
+DEFAULT_SIZES = (25_000, 250_000, 2_500_000)
+
+SCENARIOS = {
+    'vehicles_page1': '/api/vehicles?page=1',
+    'vehicles_page200': '/api/vehicles?page=200',
+    'vehicles_make': '/api/vehicles?make=Toyota',
+    'vehicles_make_model': '/api/vehicles?make=Kia&model=Sorento',
+    'vehicles_price_band': '/api/vehicles?min_price_usd=10000&max_price_usd=15000',
+    'vehicles_fuel_km': '/api/vehicles?fuel=Hybrid&min_km=50000&max_km=100000',
+    'vehicles_narrow': '/api/vehicles?make=Lexus&fuel=Electric&min_price_usd=70000',
+    'filter_options': '/api/filter-options',
+}
+
+
+def _import_app_offline():
+    # The app fetches live exchange rates in its warm-up; keep the benchmark off the network
+    os.environ['LISTAM_LIVE_RATES'] = '0'
+    import app
+    return app
+
+
+def _sample(client, url, n):
+    samples = []
+    for _ in range(n):
+        start = time.perf_counter()
+        response = client.get(url)
+        samples.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, (url, response.status_code)
+    return samples
+
+
+def run(sizes=DEFAULT_SIZES, repeat=5):
+    app_module = _import_app_offline()
+    client = app_module.app.test_client()
+    maxsize = app_module.cache.maxsize
+    results = {}
+
+    for size in sizes:
+        items_db = make_items_db(cache_path(f'items_{size}.db'), size)
+        app_module.DB_NAME = make_market_db(cache_path(f'market_items_{size}.db'), listam_db=items_db)
+        client.get('/api/ready')  # starts the warm-up on the first size; don't measure next to it
+        app_module.WARM.wait(60)
+        app_module.cache.clear()
+        per_size = {}
+        # Big tables make every call a full scan; a few samples are enough there
+        n = repeat if size <= 250_000 else max(1, repeat // 2)
+        for name, url in SCENARIOS.items():
+            app_module.cache.maxsize = 0  # every request runs the query
+            client.get(url)  # warm the page cache so the first sample isn't an outlier
+            samples = _sample(client, url, n)
+            app_module.cache.maxsize = maxsize
+            client.get(url)
+            cached = _sample(client, url, repeat)
+            per_size[name] = {'p50_ms': statistics.median(samples), 'max_ms': max(samples),
+                              'cached_p50_ms': statistics.median(cached)}
+        results[str(size)] = per_size
+        print(f"    api: {size} rows done")
+    return results
+
+
+if __name__ == '__main__':
+    import json
+    print(json.dumps(run(), indent=2))
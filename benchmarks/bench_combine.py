@@ -0,0 +1,38 @@
+"""
+combine.py: time and peak Python memory to select the training frame from market.db
+(synthetic auto.am stores ingested into the vehicles table).
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+from fixtures import ROOT, cache_path, make_autoam_db, make_market_db
+
+sys.path.insert(0, os.path.join(ROOT, 'autoAM', 'scrapping'))
+
+DEFAULT_SIZES = (10_000, 100_000)
+
+
+def run(sizes=DEFAULT_SIZES):
+    import combine
+
+    results = {}
+    for size in sizes:
+        source = make_autoam_db(cache_path(f'autoam_{size}.db'), size)
+        market = make_market_db(cache_path(f'market_autoam_{size}.db'), autoam_db=source)
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        df = combine.combine(market, verbose=False)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        results[str(size)] = {'seconds': elapsed, 'peak_mb': peak / 2 ** 20, 'rows': len(df), 'columns': df.shape[1]}
+    return results
+
+
+if __name__ == '__main__':
+    import json
+    print(json.dumps(run(), indent=2))
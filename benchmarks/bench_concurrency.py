@@ -0,0 +1,75 @@
+"""
+Adaptive concurrency of the auto.am details scraper against the throttled stub site.
+
+Runs the real scrap_listings.scrape_details (pointed at benchmarks/stub_site.py) for a
+fixed time and reports where the AIMD limit settles, the achieved rate and how many
+requests were throttled, next to the stub's configured capacity.
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fixtures import ROOT
+from stub_site import StubSite
+
+sys.path.insert(0, os.path.join(ROOT, 'autoAM', 'scrapping'))
+
+# name -> stub settings
+SCENARIOS = {
+    'rate_limited': {'rate': 40, 'max_concurrency': 64, 'base_latency': 0.02, 'latency_per_request': 0.0},
+    'concurrency_limited': {'rate': 1000, 'max_concurrency': 6, 'base_latency': 0.05, 'latency_per_request': 0.0},
+    'latency_bound': {'rate': 1000, 'max_concurrency': 64, 'base_latency': 0.02, 'latency_per_request': 0.01},
+}
+
+
+def _run_scenario(settings, seconds):
+    import scrap_listings
+    from common.concurrency import AIMDController
+
+    scrap_listings.controller = controller = AIMDController(
+        initial=scrap_listings.INITIAL_WORKERS, max_limit=scrap_listings.MAX_WORKERS)
+    limits = []
+
+    with StubSite(retry_after=1, **settings) as site:
+        scrap_listings.BASE_URL = site.url
+        deadline = time.monotonic() + seconds
+        done = 0
+
+        def worker():
+            nonlocal done
+            while time.monotonic() < deadline:
+                if scrap_listings.scrape_details('3100000'):
+                    done += 1
+
+        with ThreadPoolExecutor(max_workers=scrap_listings.MAX_WORKERS) as executor:
+            for _ in range(scrap_listings.MAX_WORKERS):
+                executor.submit(worker)
+            while time.monotonic() < deadline:
+                limits.append(controller.stats()['limit'])
+                time.sleep(0.1)
+        stub = site.stats()
+
+    settled = limits[len(limits) // 2:] or [0]
+    return {
+        'pages_per_s': round(done / seconds, 1),
+        'settled_limit': round(sum(settled) / len(settled), 1),
+        'final_limit': limits[-1] if limits else 0,
+        'throttled_share': round(stub['throttled'] / max(stub['requests'], 1), 4),
+        'stub_peak_in_flight': stub['peak_in_flight'],
+        'stub_rate': settings['rate'],
+        'stub_max_concurrency': settings['max_concurrency'],
+    }
+
+
+def run(seconds=10.0):
+    # Keep the scraper's own logging out of the benchmark output
+    with contextlib.redirect_stdout(io.StringIO()):
+        return {name: _run_scenario(settings, seconds) for name, settings in SCENARIOS.items()}
+
+
+if __name__ == '__main__':
+    import json
+    print(json.dumps(run(), indent=2))
@@ -0,0 +1,185 @@
+"""
+Price model inference: CatBoostRegressor.predict vs the exported FastPredictor.
+
+Measures cold start (model load), single-row latency (the Streamlit path: build a
+DataFrame, reorder to the expected columns, predict) and batch throughput, and
+checks that both engines agree. The FastPredictor is served the way the app serves
+it, from a memory-mapped snapshot; building it from the export (what the snapshot
+is made from) is reported as fast.export_load_s. 'regressions' lists the numbers
+where the FastPredictor is still behind CatBoost; batch throughput is one of them,
+which is why snapshot.load_batch_model() scores batches with CatBoost ('batch_engine').
+
+    python benchmarks/bench_inference.py --model autoAM/web/car_price_model2.cbm \\
+        --export autoAM/web/car_price_model2_export.py
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(ROOT, 'autoAM', 'boosting'))
+sys.path.insert(0, os.path.join(ROOT, 'autoAM', 'web'))
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_MODEL = os.path.join(ROOT, 'autoAM', 'web', 'car_price_model2.cbm')
+DEFAULT_EXPORT = os.path.join(ROOT, 'autoAM', 'web', 'car_price_model2_export.py')
+DEFAULT_DATA = os.path.join(ROOT, 'autoAM', 'web', 'combined.tsv')
+
+
+def _timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def _latency_summary(samples):
+    ms = sorted(s * 1000 for s in samples)
+    return {
+        'p50_ms': statistics.median(ms),
+        'p95_ms': ms[int(len(ms) * 0.95) - 1] if len(ms) > 1 else ms[0],
+        'mean_ms': statistics.fmean(ms),
+    }
+
+
+def build_synthetic_model(size=5000, iterations=500):
+    """
+    Trains a small model on a synthetic auto.am store (fixtures -> combine -> cat_alg)
+    and exports it, so the benchmark runs without the real data or model.
+    Returns (model_path, export_path, data_path); reused across runs.
+    """
+    from fixtures import cache_path, make_autoam_db, make_market_db
+
+    model_path = cache_path(f'synthetic_model_{size}_{iterations}.cbm')
+    export_path = cache_path(f'synthetic_model_{size}_{iterations}_export.py')
+    data_path = cache_path(f'synthetic_combined_{size}.tsv')
+    if os.path.exists(model_path) and os.path.exists(export_path):
+        return model_path, export_path, data_path
+
+    sys.path.insert(0, os.path.join(ROOT, 'autoAM', 'scrapping'))
+    import cat_alg
+    import combine
+    import export_model
+    from catboost import CatBoostRegressor
+
+    db = make_autoam_db(cache_path(f'autoam_{size}.db'), size)
+    market = make_market_db(cache_path(f'market_autoam_{size}.db'), autoam_db=db)
+    combine.combine(market, verbose=False, output=data_path)
+
+    df = cat_alg.prepare(cat_alg.load_data(data_path))
+    X, y = cat_alg.split_xy(df)
+    model = CatBoostRegressor(depth=8, iterations=iterations, verbose=0, allow_writing_files=False)
+    model.fit(X, y, cat_features=cat_alg.cat_features)
+    model.save_model(model_path)
+    export_model.export(model_path, export_path, data_path)
+    return model_path, export_path, data_path
+
+
+def load_rows(data_path, n):
+    """Feature frame in training order, built the same way cat_alg.py builds it."""
+    import cat_alg
+    df = cat_alg.prepare(cat_alg.load_data(data_path))
+    X, _ = cat_alg.split_xy(df)
+    return X.sample(n=min(n, len(X)), random_state=0, replace=len(X) < n)
+
+
+def run(model_path=DEFAULT_MODEL, export_path=DEFAULT_EXPORT, data_path=DEFAULT_DATA,
+        rows=None, single_repeat=300, batch_size=5000):
+    results = {}
+    X = rows if rows is not None else load_rows(data_path, batch_size)
+    records = X.to_dict('records')
+    expected_order = list(X.columns)
+
+    # --- CatBoost ---
+    start = time.perf_counter()
+    from catboost import CatBoostRegressor
+    model = CatBoostRegressor()
+    model.load_model(model_path)
+    cb_load = time.perf_counter() - start
+
+    def cb_single(i=[0]):
+        row = records[i[0] % len(records)]
+        i[0] += 1
+        input_df = pd.DataFrame({k: [v] for k, v in row.items()})[expected_order]
+        model.predict(input_df)
+
+    cb_single_samples = _timed(cb_single, single_repeat)
+    cb_batch = _timed(lambda: model.predict(X), 3)
+    results['catboost'] = {
+        'load_s': cb_load,
+        'single': _latency_summary(cb_single_samples),
+        'batch_rows_per_s': len(X) / min(cb_batch),
+    }
+
+    # --- Exported engine, served from its snapshot ---
+    start = time.perf_counter()
+    from fast_predict import FastPredictor
+    exported = FastPredictor(export_path)
+    export_load = time.perf_counter() - start
+
+    snapshot_dir = tempfile.mkdtemp(prefix='fast_predict_')
+    exported.save_snapshot(snapshot_dir)
+    start = time.perf_counter()
+    fast = FastPredictor.load_snapshot(snapshot_dir)
+    fast_load = time.perf_counter() - start
+
+    def fast_single(i=[0]):
+        fast.predict_one(records[i[0] % len(records)])
+        i[0] += 1
+
+    fast_single_samples = _timed(fast_single, single_repeat)
+    X_array = X.to_numpy(dtype=object)
+    fast_batch = _timed(lambda: fast.predict(X_array), 3)
+    results['fast'] = {
+        'load_s': fast_load,
+        'export_load_s': export_load,
+        'single': _latency_summary(fast_single_samples),
+        'batch_rows_per_s': len(X) / min(fast_batch),
+    }
+
+    expected = model.predict(X)
+    results['max_abs_diff'] = float(max(np.abs(expected - fast.predict(X_array)).max(),
+                                        np.abs(expected - exported.predict(X_array)).max()))
+    results['rows'] = len(X)
+    import snapshot
+    results['batch_engine'] = type(snapshot.load_batch_model(model_path, snapshot_dir, export_path)).__name__
+    del fast
+    shutil.rmtree(snapshot_dir, ignore_errors=True)
+
+    cb, fp = results['catboost'], results['fast']
+    results['regressions'] = {}
+    if fp['export_load_s'] > cb['load_s']:
+        results['regressions']['export_load_vs_catboost'] = fp['export_load_s'] / cb['load_s']
+    if fp['load_s'] > cb['load_s']:
+        results['regressions']['snapshot_load_vs_catboost'] = fp['load_s'] / cb['load_s']
+    if fp['batch_rows_per_s'] < cb['batch_rows_per_s']:
+        results['regressions']['batch_throughput_vs_catboost'] = fp['batch_rows_per_s'] / cb['batch_rows_per_s']
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--model', default=DEFAULT_MODEL)
+    parser.add_argument('--export', default=DEFAULT_EXPORT)
+    parser.add_argument('--data', default=DEFAULT_DATA)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--synthetic', action='store_true', help="train and export a model on synthetic data")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        args.model, args.export, args.data = build_synthetic_model()
+    results = run(args.model, args.export, args.data, batch_size=args.batch_size)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""
+HTML parse throughput of the auto.am and list.am scrapers on saved pages (no network),
+and field parsing throughput of common/parsing.py on synthetic list.am rows.
+"""
+import os
+import sys
+import time
+
+from fixtures import ROOT, load_page
+
+sys.path.insert(0, os.path.join(ROOT, 'autoAM', 'scrapping'))
+sys.path.insert(0, os.path.join(ROOT, 'listAM'))
+
+
+def _throughput(fn, html, min_seconds=1.0):
+    count, rows = 0, 0
+    start = time.perf_counter()
+    while True:
+        result = fn(html)
+        rows += len(result or [])
+        count += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            break
+    return {'pages_per_s': count / elapsed, 'rows_per_s': rows / elapsed, 'ms_per_page': elapsed / count * 1000}
+
+
+def run(min_seconds=1.0):
+    import check_parsing
+    import listing_page
+    import scrap_listings
+    import scrap_pages
+    import synthdata
+
+    return {
+        'scrape_details': _throughput(lambda h: scrap_listings.parse_details(h, '3100000'),
+                                      load_page('autoam_offer.html'), min_seconds),
+        'scrape_page': _throughput(scrap_pages.parse_search_page, load_page('autoam_search.html'), min_seconds),
+        'listam_page': _throughput(listing_page.parse_listing_page, load_page('listam_category.html'), min_seconds),
+        'listam_fields': check_parsing.throughput([row[2:] for row in synthdata.listam_rows(20_000)], min_seconds),
+    }
+
+
+if __name__ == '__main__':
+    import json
+    print(json.dumps(run(), indent=2))
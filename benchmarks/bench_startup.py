@@ -0,0 +1,100 @@
+"""
+Cold start of the two web apps, each measured in a fresh interpreter.
+
+- listam: importing listAM/app.py, the first /api/vehicles response, and the time until
+  /api/ready reports warm (against the 25k-row synthetic market.db)
+- web: loading the price app's model and dropdown vocabularies from the warm-start
+  snapshot vs the old path (export module / combined.tsv through pandas)
+
+Each `*_s` is the median over --repeat processes. Startups slower than BUDGET_S are
+flagged (and make the script exit with status 1 when run directly).
+
+    python benchmarks/bench_startup.py
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from fixtures import ROOT, cache_path, make_items_db, make_market_db
+
+# Boot latency budgets, seconds
+BUDGET_S = {
+    'listam.ready_s': 1.5,
+    'web.snapshot.total_s': 0.5,
+}
+
+LISTAM_PROBE = '''
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter() - start
+client = app.app.test_client()
+client.get('/api/vehicles')
+first = time.perf_counter() - start
+while client.get('/api/ready').status_code != 200:
+    time.sleep(0.005)
+print(json.dumps({'import_s': imported, 'first_response_s': first, 'ready_s': time.perf_counter() - start}))
+'''
+
+WEB_PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import snapshot
+model = snapshot.load_model(sys.argv[1], sys.argv[2])
+loaded = time.perf_counter() - start
+vocab = snapshot.load_vocab(sys.argv[1], sys.argv[3])
+print(json.dumps({'model_s': loaded, 'total_s': time.perf_counter() - start}))
+'''
+
+
+def _probe(code, cwd, args=(), env=None, repeat=5):
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-c', code, *args], cwd=cwd, env={**os.environ, **(env or {})},
+                             capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(out.strip().splitlines()[-1]))
+    return {key: statistics.median(r[key] for r in runs) for key in runs[0]}
+
+
+def run(repeat=5, size=25_000):
+    import bench_inference
+
+    results = {}
+    items_db = make_items_db(cache_path(f'items_{size}.db'), size)
+    market_db = make_market_db(cache_path(f'market_items_{size}.db'), listam_db=items_db)
+    results['listam'] = _probe(LISTAM_PROBE, os.path.join(ROOT, 'listAM'),
+                               env={'MARKET_DB': market_db, 'LISTAM_LIVE_RATES': '0'}, repeat=repeat)
+
+    web_dir = os.path.join(ROOT, 'autoAM', 'web')
+    _, export_path, data_path = bench_inference.build_synthetic_model()
+    snapshot_dir = cache_path('web_snapshot')
+    sys.path.insert(0, web_dir)
+    import snapshot
+    snapshot.build(snapshot_dir, export_path, data_path)
+    missing = cache_path('no_snapshot')
+    results['web'] = {
+        'legacy': _probe(WEB_PROBE, web_dir, (missing, export_path, data_path), repeat=repeat),
+        'snapshot': _probe(WEB_PROBE, web_dir, (snapshot_dir, export_path, data_path), repeat=repeat),
+    }
+
+    flat = {f"{app}.{key}": value for app, values in results.items() for key, value in _flatten(values)}
+    results['over_budget'] = {path: flat[path] for path, budget in BUDGET_S.items() if flat[path] > budget}
+    return results
+
+
+def _flatten(d, prefix=''):
+    for key, value in d.items():
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{prefix}{key}.")
+        else:
+            yield f"{prefix}{key}", value
+
+
+if __name__ == '__main__':
+    results = run()
+    print(json.dumps(results, indent=2))
+    if results['over_budget']:
+        print(f"[!] Over the startup budget: {', '.join(results['over_budget'])}")
+        sys.exit(1)
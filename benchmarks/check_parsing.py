@@ -0,0 +1,242 @@
+"""
+Consistency checks and throughput for common/parsing.py.
+
+- synthetic rows (synthdata.py): every field must come back as generated
+- the scraped list.am rows (listAM/database.db, when present): invariants that hold
+  for every real listing (title re-renders from year/make/model, title year equals the
+  details year, known fuel and currency, ...)
+- parse_listam_batch() must agree with parse_listam() row for row
+- randomized properties: no parser raises on arbitrary strings or on mutated real
+  rows, the batch parser equals the single-string parsers on them, and numbers
+  formatted the way the sites print them (km, miles, prices with thousands
+  separators) parse back to exactly the number
+
+Violations are printed with a few examples and make the script exit with status 1.
+
+    python benchmarks/check_parsing.py
+    python benchmarks/check_parsing.py --rows 200000 --db path/to/items.db --cases 100000 --seed 7
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sqlite3
+import sys
+import time
+from datetime import date
+
+import synthdata
+from fixtures import ROOT
+
+sys.path.insert(0, ROOT)
+from common import listings, parsing  # noqa: E402
+
+LISTAM_DB = os.path.join(ROOT, 'listAM', 'database.db')
+EXAMPLES = 3
+
+# Characters the random strings are drawn from: ASCII plus what the list.am strings contain
+ALPHABET = [chr(c) for c in range(32, 127)] + list('֏€₽\t\n\xa0') + ['km', 'miles', 'y.', 'L', 'N/A', 'USD', 'AMD']
+
+
+class Report:
+    def __init__(self, name):
+        self.name = name
+        self.checked = 0
+        self.failures = {}
+
+    def check(self, rule, ok, row):
+        if not ok:
+            self.failures.setdefault(rule, []).append(row)
+
+    def print(self):
+        status = "ok" if not self.failures else f"{sum(map(len, self.failures.values()))} violations"
+        print(f"[{self.name}] {self.checked} rows: {status}")
+        for rule, rows in self.failures.items():
+            print(f"    {rule}: {len(rows)}")
+            for row in rows[:EXAMPLES]:
+                print(f"        {row}")
+
+
+def check_synthetic(n, seed=0):
+    """Round trip: generated fields -> display strings -> parsed fields."""
+    report = Report('synthetic')
+    models = {make: set(names) for make, names in synthdata.MAKES.items()}
+    for row in synthdata.listam_rows(n, seed):
+        _, _, p_text, l_text, at_text = row
+        fields = parsing.parse_listam(p_text, l_text, at_text)
+        report.checked += 1
+        year, make, model = re.match(r'(\d{4}) (.*), ', l_text).group(1), fields['make'], fields['model']
+        report.check('make', make in models, row)
+        report.check('model', model in models.get(make, ()), row)
+        report.check('year', fields['year'] == int(year), row)
+        report.check('engine', fields['engine'] == l_text.split(', ')[1], row)
+        location, _, mileage, fuel = at_text.split(', ')
+        report.check('location', fields['location'] == location, row)
+        km = float(mileage.split()[0].replace(',', ''))
+        km = km * parsing.KM_PER_MILE if mileage.endswith('miles') else km
+        report.check('mileage', fields['mileage_km'] == int(km), row)
+        report.check('fuel', fields['fuel'] == ('LPG' if 'LPG' in fuel else fuel), row)
+        if p_text == 'N/A':
+            report.check('price', fields['price'] is None, row)
+            continue
+        symbol = p_text[0] if p_text[0] in '$€' else p_text[-1]
+        report.check('currency', fields['currency'] == parsing.CURRENCY_SYMBOLS[symbol], row)
+        report.check('price', fields['price'] == float(re.sub(r'\D', '', p_text)), row)
+    return report
+
+
+def check_scraped(db_path):
+    """Invariants over the real list.am rows."""
+    report = Report(os.path.relpath(db_path, ROOT))
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("SELECT p_text, l_text, at_text FROM items").fetchall()
+    conn.close()
+    this_year = date.today().year
+    for row, fields in zip(rows, parsing.parse_listam_batch(rows)):
+        p_text, l_text, at_text = row
+        report.checked += 1
+        title = ' '.join(str(v) for v in (fields['year'], fields['make'], fields['model']) if v)
+        report.check('title re-renders from year/make/model', title == l_text.split(',')[0].strip(), row)
+        report.check('year in range', fields['year'] and 1900 <= fields['year'] <= this_year + 1, row)
+        report.check('title year == details year', parsing.parse_details(at_text)[1] in (None, fields['year']), row)
+        report.check('engine volume iff displacement',
+                     (fields['engine_volume'] is not None) == bool(re.search(r'\d\s*L\b', l_text)), row)
+        report.check('price parsed', (fields['price'] is None) == ('N/A' in (p_text or 'N/A')), row)
+        report.check('known currency', fields['price'] is None or fields['currency'] in parsing.USD_RATES, row)
+        report.check('mileage parsed', fields['mileage_km'] is not None and fields['mileage_km'] >= 0, row)
+        report.check('known fuel', fields['fuel'] in listings.FUELS and fields['fuel'] != 'Other', row)
+        report.check('location', bool(fields['location']), row)
+    return report, rows
+
+
+def check_batch(rows):
+    report = Report('batch == single')
+    for row, fields in zip(rows, parsing.parse_listam_batch(rows)):
+        report.checked += 1
+        report.check('batch result differs', fields == parsing.parse_listam(*row), row)
+    return report
+
+
+def _random_text(rng, max_len=40):
+    if rng.random() < 0.05:
+        return rng.choice([None, ''])
+    return ''.join(rng.choice(ALPHABET) for _ in range(rng.randint(1, max_len)))
+
+
+def _mutate(rng, text):
+    """One to three random edits: delete, insert, duplicate a slice, swap neighbours, truncate."""
+    text = text or ''
+    for _ in range(rng.randint(1, 3)):
+        i = rng.randint(0, len(text))
+        edit = rng.randrange(5)
+        if edit == 0:
+            text = text[:i] + text[i + 1:]
+        elif edit == 1:
+            text = text[:i] + rng.choice(ALPHABET) + text[i:]
+        elif edit == 2:
+            text = text[:i] + text[i:i + rng.randint(1, 6)] * 2 + text[i + 6:]
+        elif edit == 3 and i + 1 < len(text):
+            text = text[:i] + text[i + 1] + text[i] + text[i + 2:]
+        else:
+            text = text[:i]
+    return text
+
+
+def _single(p_text, l_text, at_text):
+    """parse_listam() put together from the single-string parsers."""
+    year, make, model, engine = parsing.parse_title(l_text)
+    price, currency = parsing.parse_price(p_text)
+    location, listed_year, mileage, fuel = parsing.parse_details(at_text)
+    return {'year': year or listed_year, 'make': make, 'model': model, 'engine': engine,
+            'engine_volume': parsing.engine_volume(engine), 'price': price, 'currency': currency,
+            'price_usd': parsing.to_usd(price, currency),
+            'mileage_km': int(mileage) if mileage is not None else None, 'fuel': fuel, 'location': location}
+
+
+def check_properties(rows, n, seed=0):
+    """Randomized: arbitrary and mutated rows, then round trips of formatted numbers."""
+    rng = random.Random(seed)
+    report = Report(f'properties (seed {seed})')
+    cases = []
+    for i in range(n):
+        if i % 2 and rows:
+            cases.append(tuple(_mutate(rng, text) if rng.random() < 0.6 else text for text in rng.choice(rows)))
+        else:
+            cases.append((_random_text(rng), _random_text(rng), _random_text(rng)))
+
+    singles = []
+    for case in cases:
+        report.checked += 1
+        try:
+            singles.append(_single(*case))
+            parsing.to_number(case[0])
+            parsing.parse_mileage(case[2])
+        except Exception as e:
+            singles.append(None)
+            report.check(f'raises {type(e).__name__}', False, (case, str(e)))
+    try:
+        batch = parsing.parse_listam_batch(cases)
+    except Exception as e:
+        batch = [None] * len(cases)
+        report.check(f'batch raises {type(e).__name__}', False, str(e))
+    for case, single, fields in zip(cases, singles, batch):
+        if single is not None:
+            report.check('batch != single-string parsers', fields == single, case)
+
+    for _ in range(n):
+        report.checked += 1
+        km = rng.choice([rng.randint(0, 999), rng.randint(1000, 2_000_000)])
+        for text in (f"{km:,} km", f"{km} km", f"Yerevan, 2015 y., {km:,} km, Gasoline"):
+            parsed = parsing.parse_details(text)[2] if text.startswith('Yerevan') else parsing.parse_mileage(text)
+            report.check('km round trip', parsed == km, (text, parsed))
+        parsed = parsing.parse_mileage(f"{km:,} miles")
+        report.check('miles round trip', parsed == km * parsing.KM_PER_MILE, (km, parsed))
+
+        amount = rng.choice([rng.randint(1, 999), rng.randint(1000, 999_999_999)])
+        grouped = f"{amount:,}"
+        for text, currency in ((f"${grouped}", 'USD'), (f"€{grouped}", 'EUR'), (f"{grouped} ֏", 'AMD'),
+                               (f"{grouped.replace(',', ' ')} ֏", 'AMD'), (f"{grouped} ₽", 'RUB'),
+                               (f"{grouped} AMD", 'AMD'), (grouped, 'USD')):
+            parsed = parsing.parse_price(text)
+            report.check('price with separators round trip', parsed == (float(amount), currency), (text, parsed))
+        report.check('to_number with separators', parsing.to_number(grouped) == amount, grouped)
+    return report
+
+
+def throughput(rows, min_seconds=1.0):
+    results = {}
+    for name, fn in (('single', lambda: [parsing.parse_listam(*row) for row in rows]),
+                     ('batch', lambda: parsing.parse_listam_batch(rows))):
+        count = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < min_seconds:
+            fn()
+            count += len(rows)
+        results[f"{name}_rows_per_s"] = round(count / (time.perf_counter() - start))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check common/parsing.py against synthetic and scraped rows.")
+    parser.add_argument('--rows', type=int, default=50_000, help="synthetic rows to round-trip")
+    parser.add_argument('--db', default=LISTAM_DB, help="list.am items database with real rows")
+    parser.add_argument('--cases', type=int, default=20_000, help="random cases per property")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the random cases (printed with the report)")
+    args = parser.parse_args()
+
+    reports = [check_synthetic(args.rows)]
+    rows = [row[2:] for row in synthdata.listam_rows(args.rows, seed=1)]
+    if os.path.exists(args.db):
+        scraped, rows = check_scraped(args.db)
+        reports.append(scraped)
+    reports.append(check_batch(rows))
+    reports.append(check_properties(rows, args.cases, args.seed))
+    for report in reports:
+        report.print()
+    print(json.dumps(throughput(rows), indent=2))
+    sys.exit(1 if any(r.failures for r in reports) else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Seeded fixtures for the benchmarks: saved HTML pages and cached SQLite stores built
+with synthdata.py. Nothing here touches the network.
+"""
+import os
+import random
+import sys
+
+import synthdata
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.abspath(os.path.join(HERE, '..'))
+PAGES_DIR = os.path.join(HERE, 'pages')
+CACHE_DIR = os.path.join(HERE, '.cache')
+
+
+def make_items_db(path, n, seed=0):
+    """Creates (or reuses) a listAM-shaped database with n synthetic items."""
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        synthdata.generate_listam(path, n, seed)
+    return path
+
+
+def make_autoam_db(path, n_cars, seed=0):
+    """Creates (or reuses) an auto.am-shaped database with n_cars cars and their EAV tags."""
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        synthdata.generate_autoam(path, n_cars, seed)
+    return path
+
+
+def make_market_db(path, listam_db=None, autoam_db=None):
+    """Creates (or reuses) a market.db with the given scraper stores ingested into
+    the canonical vehicles table (common/listings.py)."""
+    if not os.path.exists(path):
+        sys.path.insert(0, ROOT)
+        from common import listings
+        conn = listings.connect(path)
+        listings.sync(conn, listam_db, autoam_db, verbose=False)
+        conn.close()
+    return path
+
+
+def cache_path(name):
+    return os.path.join(CACHE_DIR, name)
+
+
+# ---------------------------------------------------------
+# Saved pages
+# ---------------------------------------------------------
+
+def autoam_offer_html(seed=0):
+    rng = random.Random(seed)
+    rows = []
+    for attr, values in synthdata.TAG_VALUES.items():
+        rows.append(f'<tr><td>{attr}</td><td>{rng.choice(values)}'
+                    f'<span style="display: none;">{{"id": {rng.randint(1, 999)}, "dirty": true}}</span></td></tr>')
+    rows.append(f'<tr><td>Վազքը</td><td>{rng.randrange(0, 300000, 500)} կմ</td></tr>')
+    filler = '\n'.join(f'<div class="col s12"><p>Lorem ipsum {i}</p></div>' for i in range(150))
+    return (
+        '<html><head><title>auto.am</title></head><body>'
+        f'<div class="container">{filler}'
+        '<table class="pad-top-6 ad-det"><tbody>' + ''.join(rows) + '</tbody></table>'
+        '</div></body></html>'
+    )
+
+
+def autoam_search_html(seed=0, cards=20):
+    rng = random.Random(seed)
+    out = []
+    for i in range(cards):
+        make, model, year = synthdata.pick_car(rng)
+        price = rng.randrange(2000, 60000, 100)
+        taxed = '<span class="green-text">Մաքսազերծված</span>' if rng.random() < 0.8 else ''
+        out.append(
+            '<div class="card horizontal">'
+            f'<a class="click-for-gtag" href="/offer/{3100000 + i}" data-id="{3100000 + i}" '
+            f'data-brand="{make}" data-model="{model}" data-price="{price}"><img src="/img/{i}.jpg"></a>'
+            f'<div class="card-content"><span class="grey-text">{year}</span>'
+            f'<div class="price"><span>$ {price:,}</span></div>'
+            f'<div class="card-loc">Երևան {taxed}</div></div></div>'
+        )
+    return '<html><body><div class="row">' + ''.join(out) + '</div></body></html>'
+
+
+def listam_category_html(seed=0, items=60):
+    links = []
+    for item_id, img, p_text, l_text, at_text in synthdata.listam_rows(items, seed):
+        links.append(
+            f'<a href="/en/item/{item_id}?s=1"><img data-original="{img[6:]}" src="/img/blank.gif">'
+            f'<div class="p">{p_text}</div><div class="l">{l_text}</div><div class="at">{at_text}</div></a>'
+        )
+    nav = ''.join(f'<a href="/en/category/23/{i}">{i}</a>' for i in range(1, 11))
+    return ('<html><head><title>Cars - list.am</title></head><body>'
+            f'<div class="dl">{nav}</div><div class="gl">' + ''.join(links) + '</div></body></html>')
+
+
+PAGES = {
+    'autoam_offer.html': autoam_offer_html,
+    'autoam_search.html': autoam_search_html,
+    'listam_category.html': listam_category_html,
+}
+
+
+def load_page(name):
+    with open(os.path.join(PAGES_DIR, name), encoding='utf-8') as f:
+        return f.read()
+
+
+def write_pages():
+    """(Re)generates the saved pages under benchmarks/pages/."""
+    os.makedirs(PAGES_DIR, exist_ok=True)
+    for name, builder in PAGES.items():
+        with open(os.path.join(PAGES_DIR, name), 'w', encoding='utf-8') as f:
+            f.write(builder())
+
+
+if __name__ == '__main__':
+    write_pages()
+    print(f"[*] Pages written to {PAGES_DIR}")
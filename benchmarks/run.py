@@ -0,0 +1,141 @@
+"""
+Offline benchmark suite. Runs the selected benchmarks against synthetic fixtures and
+writes one JSON file per run so results can be compared across commits.
+
+    python benchmarks/run.py                          # everything, default sizes
+    python benchmarks/run.py --suites parse,api --api-sizes 25000
+    python benchmarks/run.py --compare benchmarks/results/<old>.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+import fixtures  # noqa: E402
+
+RESULTS_DIR = os.path.join(HERE, 'results')
+SUITES = ['parse', 'api', 'combine', 'inference', 'concurrency', 'startup']
+
+# Regression threshold used by --compare
+TOLERANCE = 0.10
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=fixtures.ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run_suite(name, args):
+    if name == 'parse':
+        import bench_parse
+        return bench_parse.run()
+    if name == 'api':
+        import bench_api
+        return bench_api.run(sizes=args.api_sizes)
+    if name == 'combine':
+        import bench_combine
+        return bench_combine.run(sizes=args.combine_sizes)
+    if name == 'inference':
+        import bench_inference
+        model, export, data = bench_inference.build_synthetic_model()
+        return bench_inference.run(model, export, data)
+    if name == 'concurrency':
+        import bench_concurrency
+        return bench_concurrency.run(seconds=args.concurrency_seconds)
+    if name == 'startup':
+        import bench_startup
+        return bench_startup.run()
+    raise ValueError(f"unknown suite {name}")
+
+
+# ---------------------------------------------------------
+# Comparison
+# ---------------------------------------------------------
+
+def flatten(d, prefix=''):
+    for key, value in d.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            yield from flatten(value, path)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield path, value
+
+
+def lower_is_better(path):
+    leaf = path.rsplit('.', 1)[-1]
+    return leaf.endswith('_ms') or leaf.endswith('_s') or leaf in ('seconds', 'peak_mb', 'throttled_share')
+
+
+def compare(old, new):
+    """Prints metric ratios and returns the paths that got worse by more than TOLERANCE."""
+    old_metrics = dict(flatten(old['results']))
+    regressions = []
+    print(f"\n{'metric':<60} {old['commit']:>10} {new['commit']:>10}  change")
+    for path, value in flatten(new['results']):
+        if path not in old_metrics or not old_metrics[path]:
+            continue
+        before = old_metrics[path]
+        change = (value - before) / before
+        worse = change > TOLERANCE if lower_is_better(path) else change < -TOLERANCE
+        leaf = path.rsplit('.', 1)[-1]
+        if leaf in ('rows', 'columns', 'max_abs_diff') or leaf.startswith('stub_'):
+            worse = False
+        flag = '  <-- REGRESSION' if worse else ''
+        print(f"{path:<60} {before:>10.3f} {value:>10.3f}  {change:+.1%}{flag}")
+        if worse:
+            regressions.append(path)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the offline benchmark suite.")
+    parser.add_argument('--suites', default=','.join(SUITES), help=f"comma separated subset of {SUITES}")
+    parser.add_argument('--api-sizes', type=lambda s: [int(x) for x in s.split(',')],
+                        default=[25_000, 250_000, 2_500_000])
+    parser.add_argument('--combine-sizes', type=lambda s: [int(x) for x in s.split(',')],
+                        default=[10_000, 100_000])
+    parser.add_argument('--concurrency-seconds', type=float, default=10.0,
+                        help="how long each stub-site scenario runs")
+    parser.add_argument('--out', help="output JSON path (default: benchmarks/results/<time>_<commit>.json)")
+    parser.add_argument('--compare', help="previous results JSON to compare against")
+    args = parser.parse_args()
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': {},
+    }
+
+    for name in args.suites.split(','):
+        print(f"[*] Running {name}...")
+        start = time.perf_counter()
+        report['results'][name] = run_suite(name, args)
+        print(f"[*] {name} done in {time.perf_counter() - start:.1f}s")
+
+    out = args.out or os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}_{report['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"[*] Results written to {out}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare(json.load(f), report)
+        if regressions:
+            print(f"\n[!] {len(regressions)} metric(s) regressed by more than {TOLERANCE:.0%}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
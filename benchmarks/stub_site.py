@@ -0,0 +1,164 @@
+"""
+Local stand-in for auto.am with configurable throttling, for exercising the scrapers'
+adaptive concurrency without touching the real site.
+
+    GET  /offer/<id>   saved offer page
+    POST /search       saved search results page
+
+The site allows `rate` requests/s (token bucket) and `max_concurrency` requests at
+once; anything above that gets `throttle_status` (429 by default) with a Retry-After
+header. Latency grows with the number of requests in flight, and `challenge_every`
+serves a Cloudflare-style interstitial every N-th request.
+
+    python benchmarks/stub_site.py --rate 20 --max-concurrency 8 --port 8099
+    AUTOAM_BASE_URL=http://127.0.0.1:8099 python autoAM/scrapping/scrap_listings.py
+"""
+import argparse
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from fixtures import load_page
+
+CHALLENGE_PAGE = "<html><head><title>Just a moment...</title></head><body>Checking your browser</body></html>"
+
+
+class StubSite:
+    def __init__(self, rate=20.0, max_concurrency=8, base_latency=0.02, latency_per_request=0.01,
+                 throttle_status=429, retry_after=1, challenge_every=0, port=0):
+        self.rate = rate
+        self.max_concurrency = max_concurrency
+        self.base_latency = base_latency
+        self.latency_per_request = latency_per_request
+        self.throttle_status = throttle_status
+        self.retry_after = retry_after
+        self.challenge_every = challenge_every
+
+        self.pages = {'offer': load_page('autoam_offer.html'), 'search': load_page('autoam_search.html')}
+        self.lock = threading.Lock()
+        self.tokens = float(max(rate, 1))
+        self.refilled = time.monotonic()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.served = 0
+        self.throttled = 0
+        self.challenged = 0
+        self.requests = 0
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), _handler(self))
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.url = f"http://127.0.0.1:{self.port}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def admit(self):
+        """Returns 'ok', 'throttle' or 'challenge' for a new request and reserves a slot if ok."""
+        with self.lock:
+            self.requests += 1
+            now = time.monotonic()
+            self.tokens = min(float(max(self.rate, 1)), self.tokens + (now - self.refilled) * self.rate)
+            self.refilled = now
+
+            if self.challenge_every and self.requests % self.challenge_every == 0:
+                self.challenged += 1
+                return 'challenge'
+            if self.tokens < 1 or self.in_flight >= self.max_concurrency:
+                self.throttled += 1
+                return 'throttle'
+            self.tokens -= 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            return 'ok'
+
+    def finish(self):
+        with self.lock:
+            self.in_flight -= 1
+            self.served += 1
+
+    def stats(self):
+        with self.lock:
+            return {'requests': self.requests, 'served': self.served, 'throttled': self.throttled,
+                    'challenged': self.challenged, 'peak_in_flight': self.peak_in_flight}
+
+
+def _handler(site):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _respond(self, page):
+            if self.command == 'POST':
+                self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+            decision = site.admit()
+            if decision == 'challenge':
+                return self._send(403, CHALLENGE_PAGE, {'cf-mitigated': 'challenge'})
+            if decision == 'throttle':
+                return self._send(site.throttle_status, "Too Many Requests", {'Retry-After': str(site.retry_after)})
+            try:
+                time.sleep(site.base_latency + site.latency_per_request * site.in_flight)
+                self._send(200, site.pages[page])
+            finally:
+                site.finish()
+
+        def _send(self, status, body, headers=None):
+            data = body.encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.startswith('/offer/'):
+                return self._respond('offer')
+            self._send(404, "Not Found")
+
+        def do_POST(self):
+            if self.path.startswith('/search'):
+                return self._respond('search')
+            self._send(404, "Not Found")
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a throttled auto.am stand-in.")
+    parser.add_argument('--rate', type=float, default=20.0, help="allowed requests per second")
+    parser.add_argument('--max-concurrency', type=int, default=8)
+    parser.add_argument('--base-latency', type=float, default=0.02)
+    parser.add_argument('--latency-per-request', type=float, default=0.01)
+    parser.add_argument('--throttle-status', type=int, default=429)
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--challenge-every', type=int, default=0)
+    parser.add_argument('--port', type=int, default=8099)
+    args = parser.parse_args()
+
+    site = StubSite(args.rate, args.max_concurrency, args.base_latency, args.latency_per_request,
+                    args.throttle_status, args.retry_after, args.challenge_every, args.port)
+    print(f"[*] Stub site on {site.url} (rate {args.rate}/s, max concurrency {args.max_concurrency})")
+    try:
+        site.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,285 @@
+"""
+Synthetic data generator for load-testing the listAM and auto.am stores.
+
+Produces seeded, realistic rows in the formats the scrapers actually store:
+listAM 'items' (p_text / l_text / at_text display strings with mixed ֏/$/€/₽
+prices, km and miles) and auto.am 'cars' plus Armenian-attribute 'tags'. The
+value mixes follow the real snapshots (e.g. ~90% of list.am prices in $, ~20% of
+mileages in miles, EV fields only on electric cars).
+
+    python benchmarks/synthdata.py listam /tmp/items_2m.db --rows 2500000
+    python benchmarks/synthdata.py autoam /tmp/autoam_500k.db --rows 500000 --seed 7
+"""
+import argparse
+import os
+import random
+import sqlite3
+import time
+
+BATCH_SIZE = 50_000
+
+# Make -> models. Multi-word makes/models on purpose: the parsers have to cope with them.
+MAKES = {
+    'Toyota': ['Camry', 'Corolla', 'RAV4', 'Land Cruiser Prado', 'Prius', 'Highlander'],
+    'Nissan': ['Rogue', 'Altima', 'Fuga', 'X-Trail', 'Sentra', 'Leaf'],
+    'Kia': ['Forte', 'Sorento', 'Optima', 'K5', 'Rio', 'Niro'],
+    'Hyundai': ['Elantra', 'Sonata', 'Tucson', 'Santa Fe', 'Ioniq 5'],
+    'Mercedes-Benz': ['E-Class', 'C-Class', 'GLE', 'S-Class', 'EQE'],
+    'BMW': ['X5', '3 Series', '5 Series', 'X3', 'i4'],
+    'Volkswagen': ['Passat', 'Jetta', 'Golf', 'ID.4'],
+    'Chevrolet': ['Malibu', 'Equinox', 'Cruze', 'Volt hatchback', 'Bolt'],
+    'Lexus': ['RX', 'ES', 'GX', 'LX'],
+    'Ford': ['Fusion', 'Escape', 'Mustang', 'Transit'],
+    'Land Rover': ['Range Rover', 'Range Rover Sport', 'Discovery'],
+    'VAZ (Lada)': ['2107', '2110', 'Niva', 'Priora'],
+    'Tesla': ['Model 3', 'Model Y', 'Model S'],
+    'Honda': ['Accord', 'Civic', 'CR-V', 'Odyssey'],
+    'Mazda': ['6', '3', 'CX-5'],
+    'Jeep': ['Grand Cherokee', 'Compass', 'Wrangler'],
+    'BYD': ['Song Plus', 'Han', 'Seal'],
+}
+# Rough popularity weights (same order as MAKES)
+MAKE_WEIGHTS = [14, 14, 11, 10, 18, 12, 6, 8, 5, 7, 4, 6, 5, 5, 4, 5, 2]
+ELECTRIC_MODELS = {'Leaf', 'Ioniq 5', 'EQE', 'i4', 'ID.4', 'Bolt', 'Model 3', 'Model Y', 'Model S', 'Seal', 'Han'}
+
+LOCATIONS = ['Kentron', 'Malatia-Sebastia', 'Nor Nork', 'Shengavit', 'Ajapnyak', 'Erebuni', 'Arabkir',
+             'Gyumri', 'Avan', 'Echmiadzin', 'Vanadzor', 'Abovyan', 'Davtashen', 'Kanaker-Zeytun',
+             'Armavir', 'Artashat', 'Hrazdan', 'Ashtarak', 'Masis', 'Sevan', 'Dilijan', 'Nork-Marash']
+LISTAM_FUELS = [('Gasoline', 80), ('Hybrid', 5), ('Diesel', 3), ('Factory installed LPG/CNG', 1)]
+
+# (symbol, share of listings, AMD per unit) — list.am shows prices in the seller's currency
+LISTAM_CURRENCIES = [('$', 90.0, 405.0), ('֏', 9.0, 1.0), ('€', 0.1, 435.0), ('₽', 0.05, 4.4)]
+
+# auto.am detail attributes (Armenian names as scraped)
+TAG_VALUES = {
+    'Գույնը': ['Սև', 'Սպիտակ', 'Մոխրագույն', 'Արծաթագույն', 'Կապույտ', 'Կարմիր', 'Այլ գույն', 'Կանաչ'],
+    'Թափքը': ['Սեդան', 'Ամենագնաց', 'Հետչբեք', 'Ունիվերսալ', 'Կուպե', 'Պիկապ', 'Մինիվեն /  Միկրոավտոբուս'],
+    'Ղեկը': ['Ձախ'] * 12 + ['Աջ', 'Փոխված աջից ձախ'],
+    'Շարժիչը': ['Բենզին'] * 8 + ['Հիբրիդ', 'Գազ', 'Բենզին և գազ', 'Դիզել'],
+    'Սրահի գույնը': ['Սև', 'Բեժ', 'Մոխրագույն', 'Սպիտակ', 'Կարմիր', 'Շագանակագույն'],
+    'Վիճակը': ['Գերազանց', 'Գերազանց', 'Լավ', 'Նորմալ', 'Նոր', 'Վթարված'],
+    'Փոխանցման տուփը': ['Ավտոմատ'] * 6 + ['Մեխանիկական', 'Վարիատոր', 'Կիսաավտոմատ'],
+    'Քարշակը': ['Առջևի', 'Ետևի', 'Լիաքարշակ 4x4'],
+    'Մոդիֆիկացիան': ['SE', 'S', 'SV', 'SEL', 'Full', 'PRO', 'LE', 'Base', 'Limited'],
+}
+# Attributes most sellers leave empty, with the share that fills them in
+OPTIONAL_TAGS = {'Քարշակը': 0.25, 'Մոդիֆիկացիան': 0.3, 'Սրահի գույնը': 0.25}
+
+
+# ---------------------------------------------------------
+# Shared helpers
+# ---------------------------------------------------------
+
+def pick_car(rng):
+    make = rng.choices(list(MAKES), weights=MAKE_WEIGHTS)[0]
+    model = rng.choice(MAKES[make])
+    year = min(2026, max(1985, int(rng.gauss(2015, 6))))
+    return make, model, year
+
+
+def _usd_price(rng, year):
+    # Rough depreciation curve with noise, so prices correlate with age like the real data
+    return max(500, round(48000 * 0.9 ** (2025 - year) * rng.lognormvariate(0, 0.35), -2))
+
+
+def fast_load_connection(path):
+    """Connection tuned for one-shot bulk loading. Not crash safe; only for throwaway stores."""
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA locking_mode = EXCLUSIVE")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA cache_size = -262144")  # 256 MB
+    return conn
+
+
+def _bulk_insert(conn, sql, rows):
+    batch = []
+    count = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            conn.executemany(sql, batch)
+            count += len(batch)
+            batch.clear()
+    if batch:
+        conn.executemany(sql, batch)
+        count += len(batch)
+    return count
+
+
+# ---------------------------------------------------------
+# listAM
+# ---------------------------------------------------------
+
+def listam_rows(n, seed=0, start_id=20000000):
+    """Yields (id, image_src, p_text, l_text, at_text) tuples."""
+    rng = random.Random(seed)
+    currencies, shares = [c[:1] + c[2:] for c in LISTAM_CURRENCIES], [c[1] for c in LISTAM_CURRENCIES]
+    fuels, fuel_weights = [f[0] for f in LISTAM_FUELS], [f[1] for f in LISTAM_FUELS]
+
+    for i in range(n):
+        make, model, year = pick_car(rng)
+        electric = model in ELECTRIC_MODELS
+
+        # p_text
+        if rng.random() < 0.0002:
+            p_text = "N/A"
+        else:
+            (symbol, amd_per_unit), = rng.choices(currencies, weights=shares)
+            amount = round(_usd_price(rng, year) * 405.0 / amd_per_unit, -2 if symbol != '֏' else -4)
+            p_text = f"{symbol}{amount:,.0f}" if symbol in ('$', '€') else f"{amount:,.0f} {symbol}"
+
+        # l_text: "<year> <make> <model>, <engine>[, all wheel drive][, gas|hybrid|diesel][, <color>]"
+        spec = ['electric'] if electric else [f"{rng.choice(['1.4', '1.5', '1.6', '1.8', '2.0', '2.4', '2.5', '3.0', '3.5', '4.6'])}L"]
+        if rng.random() < 0.25:
+            spec.append('all wheel drive')
+        if not electric and rng.random() < 0.45:
+            spec.append(rng.choice(['gas', 'gas', 'gas', 'hybrid', 'diesel']))
+        if rng.random() < 0.03:
+            spec.append(rng.choice(['white', 'black', 'silver']))
+        l_text = f"{year} {make} {model}, {', '.join(spec)}"
+
+        # at_text: "<location>, <year> y., <n> km|miles, <fuel>"
+        km = max(0, int(rng.gauss(12000, 5000) * max(1, 2025 - year)))
+        if rng.random() < 0.21:
+            mileage = f"{round(km / 1.60934, -2):,.0f} miles"
+        else:
+            mileage = f"{round(km, -3):,} km"
+        fuel = 'Electric' if electric else rng.choices(fuels, weights=fuel_weights)[0]
+        at_text = f"{rng.choice(LOCATIONS)}, {year} y., {mileage}, {fuel}"
+
+        image_src = f"https://s.list.am/g/{rng.randint(100, 999)}/{rng.randint(90000000, 99999999)}.webp"
+        yield (str(start_id + i), image_src, p_text, l_text, at_text)
+
+
+def generate_listam(path, n, seed=0, start_id=20000000):
+    """Bulk-loads n synthetic rows into a listAM-shaped 'items' table. Returns the row count."""
+    conn = fast_load_connection(path)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS items (
+            id TEXT PRIMARY KEY,
+            image_src TEXT,
+            p_text TEXT,
+            l_text TEXT,
+            at_text TEXT
+        )
+    ''')
+    count = _bulk_insert(conn, "INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?)",
+                         listam_rows(n, seed, start_id))
+    conn.commit()
+    conn.close()
+    return count
+
+
+# ---------------------------------------------------------
+# auto.am
+# ---------------------------------------------------------
+
+def autoam_rows(n, seed=0, start_id=3000000):
+    """Yields (car_row, [tag_rows]) pairs shaped like scrap_pages / scrap_listings output."""
+    rng = random.Random(seed)
+    for i in range(n):
+        car_id = str(start_id + i)
+        make, model, year = pick_car(rng)
+        electric = model in ELECTRIC_MODELS
+        price = _usd_price(rng, year)
+        car = (car_id, make, model, price, '$', rng.random() < 0.75, year, f"$ {price:,.0f}")
+
+        tags = []
+        for attr, values in TAG_VALUES.items():
+            if attr in OPTIONAL_TAGS and rng.random() > OPTIONAL_TAGS[attr]:
+                continue
+            value = 'Էլեկտրական' if attr == 'Շարժիչը' and electric else rng.choice(values)
+            tags.append((car_id, attr, value))
+
+        km = max(10, int(rng.gauss(12000, 5000) * max(1, 2025 - year)))
+        tags.append((car_id, 'Վազքը', str(round(km, -3))))
+        if rng.random() < 0.22:
+            tags.append((car_id, 'Ձիաուժը', f"{rng.randint(90, 450)} hp"))
+            tags.append((car_id, 'Դռների քանակը', rng.choice(['4', '5', '2', '3'])))
+            tags.append((car_id, 'Անվահեծերը', f'{rng.choice([15, 16, 17, 18, 19, 20, 21])}"'))
+        if not electric and rng.random() < 0.23:
+            tags.append((car_id, 'Շարժիչի ծավալը', rng.choice(['1.5', '1.6', '2.0', '2.4', '2.5', '3.0', '3.5'])))
+            tags.append((car_id, 'Մխոցների քանակը', rng.choice(['4', '4', '6', '8'])))
+        if electric:
+            tags.append((car_id, 'Հեռահարությունը', f"{rng.randrange(250, 650, 5)} կմ"))
+            tags.append((car_id, 'Մարտկոցի տարողունակությունը կվտ', str(rng.choice([60, 74, 75, 82, 99.8, 100]))))
+            tags.append((car_id, 'էլ․ շարժիչների քանակը', rng.choice(['1', '2'])))
+        yield car, tags
+
+
+def generate_autoam(path, n, seed=0, start_id=3000000):
+    """Bulk-loads n synthetic cars and their tags into auto.am-shaped tables. Returns (cars, tags)."""
+    conn = fast_load_connection(path)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS cars (
+            id TEXT PRIMARY KEY,
+            brand TEXT,
+            model TEXT,
+            price REAL,
+            currency TEXT,
+            taxed BOOL,
+            year INT,
+            original_price_text TEXT,
+            scraped_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS tags (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            car_id TEXT,
+            attribute TEXT,
+            value TEXT,
+            FOREIGN KEY(car_id) REFERENCES cars(id),
+            UNIQUE(car_id, attribute)
+        )
+    ''')
+
+    tag_buffer = []
+
+    def cars():
+        for car, tags in autoam_rows(n, seed, start_id):
+            tag_buffer.extend(tags)
+            yield car
+            if len(tag_buffer) >= BATCH_SIZE:
+                conn.executemany("INSERT OR IGNORE INTO tags (car_id, attribute, value) VALUES (?, ?, ?)", tag_buffer)
+                stats['tags'] += len(tag_buffer)
+                tag_buffer.clear()
+
+    stats = {'tags': 0}
+    car_count = _bulk_insert(conn, '''
+        INSERT OR REPLACE INTO cars (id, brand, model, price, currency, taxed, year, original_price_text)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', cars())
+    if tag_buffer:
+        conn.executemany("INSERT OR IGNORE INTO tags (car_id, attribute, value) VALUES (?, ?, ?)", tag_buffer)
+        stats['tags'] += len(tag_buffer)
+    conn.commit()
+    conn.close()
+    return car_count, stats['tags']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic listAM / auto.am stores.")
+    parser.add_argument('store', choices=['listam', 'autoam'])
+    parser.add_argument('path', help="SQLite file to create or append to")
+    parser.add_argument('--rows', type=int, default=25_000, help="items (listam) or cars (autoam)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--start-id', type=int, help="first listing id (default: per-store range)")
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.path)), exist_ok=True)
+    start = time.perf_counter()
+    if args.store == 'listam':
+        count = generate_listam(args.path, args.rows, args.seed, args.start_id or 20000000)
+        summary = f"{count} items"
+    else:
+        cars, tags = generate_autoam(args.path, args.rows, args.seed, args.start_id or 3000000)
+        summary = f"{cars} cars, {tags} tags"
+    elapsed = time.perf_counter() - start
+    print(f"[*] Wrote {summary} to {args.path} in {elapsed:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1 @@
+"""Code shared by the autoAM and listAM scrapers and apps."""
@@ -0,0 +1,221 @@
+"""
+Adaptive (AIMD) concurrency for the scrapers.
+
+Instead of a fixed MAX_WORKERS the number of requests in flight starts small, grows by
+one per "round" of healthy responses (a round = as many successes as the current
+limit) and is cut multiplicatively when the site pushes back: 429/419/5xx, a
+Cloudflare interstitial, a timeout, or latency drifting far above its baseline.
+A Retry-After header pauses every worker until it expires.
+
+    controller = AIMDController(initial=4, max_limit=30)
+    with controller.slot() as slot:          # blocks while the limit is reached / paused
+        response = requests.get(url)
+        slot.done(response.status_code, response.headers, response.text)
+    if slot.throttled:
+        ...                                  # retry later
+
+Sequential scrapers (one browser) use AdaptiveDelay, the same idea applied to the
+pause between pages.
+"""
+import email.utils
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+# Statuses that mean "slow down" rather than "this page is broken"
+THROTTLE_STATUSES = {408, 419, 425, 429, 500, 502, 503, 504, 520, 521, 522, 524}
+
+# Markers of a Cloudflare challenge / interstitial page
+CHALLENGE_MARKERS = ("Just a moment", "cf-chl", "challenge-platform", "Attention Required")
+
+# Used when the site throttles without a Retry-After header
+DEFAULT_BACKOFF_S = 2.0
+MAX_BACKOFF_S = 120.0
+
+
+def parse_retry_after(value):
+    """Retry-After as seconds (it may be a number of seconds or an HTTP date). None if missing/invalid."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def looks_like_challenge(status=None, headers=None, text=None):
+    """True for a Cloudflare challenge page (served with 403/503 or as a normal 200 HTML page)."""
+    if headers and str(headers.get('cf-mitigated', '')).lower() == 'challenge':
+        return True
+    if not text:
+        return False
+    head = text[:4096]
+    return any(marker in head for marker in CHALLENGE_MARKERS)
+
+
+class AIMDController:
+    def __init__(self, initial=4, min_limit=1, max_limit=64, increase=1.0, decrease=0.5,
+                 latency_tolerance=3.0, on_change=None):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.on_change = on_change
+
+        self.limit = float(max(min_limit, min(initial, max_limit)))
+        self.in_flight = 0
+        self.successes = 0
+        self.throttles = 0
+
+        self._cond = threading.Condition()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._backoff = DEFAULT_BACKOFF_S
+        self._round_successes = 0
+        # Latency baseline: EWMA of the fastest responses, and EWMA of all responses
+        self._min_latency = None
+        self._latency = None
+
+    # --- slots ---
+
+    def acquire(self):
+        with self._cond:
+            while True:
+                wait = self._paused_until - time.monotonic()
+                if wait <= 0 and self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return
+                self._cond.wait(timeout=wait if wait > 0 else None)
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        slot = _Slot(self)
+        try:
+            yield slot
+        except Exception:
+            # Timeouts / connection resets are the loudest congestion signal there is
+            if not slot.finished:
+                slot.finished = True
+                slot.throttled = True
+                self.on_throttle(None)
+            raise
+        finally:
+            self.release()
+
+    # --- feedback ---
+
+    def record(self, status, latency, headers=None, text=None):
+        """Feeds one response back. Returns True if it was a throttle / challenge (worth retrying later)."""
+        if status in THROTTLE_STATUSES or looks_like_challenge(status, headers, text):
+            self.on_throttle(parse_retry_after(headers.get('Retry-After')) if headers else None)
+            return True
+        self.on_success(latency)
+        return False
+
+    def on_success(self, latency):
+        with self._cond:
+            self.successes += 1
+            self._backoff = DEFAULT_BACKOFF_S
+            if self._latency is None:
+                self._latency = self._min_latency = latency
+            self._latency = 0.9 * self._latency + 0.1 * latency
+            self._min_latency = min(latency, 0.99 * self._min_latency + 0.01 * self._latency)
+
+            if self._latency > self.latency_tolerance * self._min_latency:
+                # Queueing on the other side: shrink gently instead of waiting for errors
+                self._decrease(0.9)
+                return
+
+            self._round_successes += 1
+            if self._round_successes >= int(self.limit):
+                self._round_successes = 0
+                self._set_limit(self.limit + self.increase)
+                self._cond.notify_all()
+
+    def on_throttle(self, retry_after=None):
+        with self._cond:
+            self.throttles += 1
+            if retry_after is None:
+                retry_after = self._backoff * random.uniform(0.8, 1.2)
+                self._backoff = min(MAX_BACKOFF_S, self._backoff * 2)
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            self._decrease(self.decrease)
+
+    def _decrease(self, factor):
+        # Requests already in flight when the site pushed back would all report the same
+        # event, so cut at most once per (smoothed) round trip
+        now = time.monotonic()
+        if now - self._last_decrease < max(self._latency or 0.0, 0.5):
+            return
+        self._last_decrease = now
+        self._round_successes = 0
+        self._set_limit(self.limit * factor)
+
+    def _set_limit(self, limit):
+        limit = max(self.min_limit, min(self.max_limit, limit))
+        if int(limit) != int(self.limit) and self.on_change:
+            self.on_change(int(limit))
+        self.limit = limit
+
+    def stats(self):
+        with self._cond:
+            return {
+                'limit': int(self.limit),
+                'in_flight': self.in_flight,
+                'successes': self.successes,
+                'throttles': self.throttles,
+                'latency_ms': round(self._latency * 1000, 1) if self._latency is not None else None,
+                'paused_s': round(max(0.0, self._paused_until - time.monotonic()), 1),
+            }
+
+
+class _Slot:
+    def __init__(self, controller):
+        self.controller = controller
+        self.started = time.perf_counter()
+        self.finished = False
+        self.throttled = False
+
+    def done(self, status, headers=None, text=None):
+        self.finished = True
+        self.throttled = self.controller.record(status, time.perf_counter() - self.started, headers, text)
+        return self.throttled
+
+
+class AdaptiveDelay:
+    """AIMD on the pause between sequential page loads: shave a little off after each
+    clean page, double it after a challenge or soft block."""
+
+    def __init__(self, initial=2.0, min_delay=1.0, max_delay=60.0, step=0.1, factor=2.0, jitter=0.5):
+        self.delay = initial
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.step = step
+        self.factor = factor
+        self.jitter = jitter
+
+    def success(self):
+        self.delay = max(self.min_delay, self.delay - self.step)
+
+    def backoff(self, retry_after=None):
+        self.delay = min(self.max_delay, max(self.delay * self.factor, retry_after or 0.0))
+
+    def sleep(self, share=1.0):
+        """Sleeps `share` of the current delay, with +/- jitter so the pattern isn't regular."""
+        time.sleep(share * self.delay * random.uniform(1 - self.jitter, 1 + self.jitter))
@@ -0,0 +1,217 @@
+"""
+Cross-site duplicate detection between list.am items and auto.am cars.
+
+Listings are read from the canonical vehicles table (common/listings.py), where
+both sites' rows are already parsed and normalized. Each one is reduced to a record
+(blocking key "make|model token|year", USD price, km, image key). Only records in the
+same block are compared, so the work grows with block sizes instead of n^2. A new
+record is scored against the other site's records in its block (price and mileage
+closeness; an identical image file settles it outright) and joins the cluster of its
+best match above MATCH_THRESHOLD.
+
+The image term only works when both sides have an image: auto.am search results carry
+no image URL (vehicles.image is NULL for auto.am), so today cross-site matches rest on
+price and mileage alone.
+
+Results live next to the price history in market.db:
+
+    dedup_records     (source, source_id) -> normalized fields + block
+    listing_clusters  (source, source_id) -> cluster_id
+
+Every processed listing has a cluster (singletons included), so consumers can
+simply keep one row per cluster_id. The market rollups (common/rollups.py) count a
+cross-site cluster once; run() refreshes them for every listing it matched. Runs are
+incremental: only listings without a dedup_records row are normalized and matched, and
+the scrapers run it at the end of every crawl.
+
+    python common/dedup.py [--market-db market.db]
+"""
+import argparse
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from common import history, migrations, rollups  # noqa: E402
+
+# Same car under different names on the two sites (after normalization)
+MAKE_ALIASES = {'vazlada': 'lada', 'vaz': 'lada', 'mercedes': 'mercedesbenz', 'mercedesmaybach': 'mercedesbenz'}
+
+# Score weights; features missing on either side are left out of the average.
+# An identical image file (same photo on both sites) is a match on its own.
+WEIGHTS = {'price': 0.6, 'mileage': 0.4}
+# Relative difference at which a feature's similarity drops to 0
+PRICE_TOLERANCE = 0.15
+MILEAGE_TOLERANCE = 0.10
+MATCH_THRESHOLD = 0.8
+
+
+def connect(path=None):
+    return history.connect(path)
+
+
+# --- normalization ---
+
+def norm_token(text):
+    return re.sub(r'[^0-9a-z]+', '', (text or '').lower())
+
+
+def norm_make(make):
+    make = norm_token(make)
+    return MAKE_ALIASES.get(make, make)
+
+
+def model_token(model):
+    """First word of the model: 'E-Class' / 'E 350' -> 'e', 'Range Rover Sport' -> 'range'."""
+    words = re.findall(r'[0-9a-z]+', (model or '').lower())
+    return words[0] if words else ''
+
+
+def block_key(make, model, year):
+    make, token = norm_make(make), model_token(model)
+    if not make or not token or not year:
+        return None
+    return f"{make}|{token}|{int(year)}"
+
+
+def image_key(url):
+    """File name without extension/size path: 'https://s.list.am/g/573/94557573.webp' -> '94557573'."""
+    if not url or url == "N/A":
+        return None
+    name = url.rstrip('/').rsplit('/', 1)[-1].split('?')[0]
+    return name.rsplit('.', 1)[0] or None
+
+
+# --- loading new listings ---
+
+def new_records(conn):
+    """Records for the vehicles rows that have no dedup_records row yet."""
+    return [(source, source_id, block_key(make, model, year), price_usd, mileage_km, image_key(image))
+            for source, source_id, make, model, year, price_usd, mileage_km, image in conn.execute('''
+                SELECT v.source, v.source_id, v.make, v.model, v.year, v.price_usd, v.mileage_km, v.image
+                FROM vehicles v
+                WHERE NOT EXISTS (SELECT 1 FROM dedup_records r
+                                  WHERE r.source = v.source AND r.source_id = v.source_id)
+            ''')]
+
+
+# --- scoring ---
+
+def closeness(a, b, tolerance):
+    if a is None or b is None or a <= 0 or b <= 0:
+        return None
+    return max(0.0, 1.0 - abs(a - b) / max(a, b) / tolerance)
+
+
+def score(a, b):
+    """a, b: (price_usd, mileage_km, image_key). Weighted similarity in [0, 1], or None if incomparable."""
+    if a[2] and b[2] and a[2] == b[2]:
+        return 1.0
+    parts = {'price': closeness(a[0], b[0], PRICE_TOLERANCE), 'mileage': closeness(a[1], b[1], MILEAGE_TOLERANCE)}
+    if parts['price'] is None:
+        return None
+    available = {k: v for k, v in parts.items() if v is not None}
+    total = sum(WEIGHTS[k] for k in available)
+    return sum(WEIGHTS[k] * v for k, v in available.items()) / total
+
+
+# --- clustering ---
+
+def run(conn, verbose=True):
+    """Matches the vehicles not seen by a previous run. Returns match counts."""
+    new = new_records(conn)
+    if verbose:
+        print(f"[*] {len(new)} new listings to deduplicate")
+    if not new:
+        return {'new': 0, 'matched': 0, 'merged_clusters': 0}
+
+    conn.executemany("INSERT OR REPLACE INTO dedup_records VALUES (?, ?, ?, ?, ?, ?)", new)
+
+    # Existing (and new) records of every block touched by this run, grouped per block
+    blocks = {}
+    touched = sorted({r[2] for r in new if r[2]})
+    for start in range(0, len(touched), 500):
+        chunk = touched[start:start + 500]
+        for row in conn.execute(f'''
+                SELECT r.source, r.source_id, r.block, r.price_usd, r.mileage_km, r.image_key, c.cluster_id
+                FROM dedup_records r LEFT JOIN listing_clusters c USING (source, source_id)
+                WHERE r.block IN ({",".join("?" * len(chunk))})''', chunk):
+            blocks.setdefault(row[2], []).append(row)
+
+    next_cluster = (conn.execute("SELECT MAX(cluster_id) FROM listing_clusters").fetchone()[0] or 0) + 1
+    cluster_of = {}      # (source, id) -> cluster_id, for everything this run assigns or moves
+    scores = {}
+    matched = merged = 0
+
+    for block_rows in blocks.values():
+        for row in block_rows:
+            if row[6] is not None:
+                cluster_of[(row[0], row[1])] = row[6]
+
+    for source, source_id, block, price, mileage, image, *_ in new:
+        key = (source, source_id)
+        best, best_score = None, MATCH_THRESHOLD
+        for other in blocks.get(block, ()):
+            if other[0] == source:
+                continue  # cross-site only
+            s = score((price, mileage, image), other[3:6])
+            if s is not None and s >= best_score:
+                best, best_score = (other[0], other[1]), s
+
+        if best is None:
+            if key not in cluster_of:
+                cluster_of[key] = next_cluster
+                next_cluster += 1
+            continue
+
+        matched += 1
+        scores[key] = scores[best] = best_score
+        mine, theirs = cluster_of.get(key), cluster_of.get(best)
+        if theirs is None:
+            theirs = cluster_of[best] = next_cluster
+            next_cluster += 1
+        if mine is None or mine == theirs:
+            cluster_of[key] = theirs
+            continue
+        # Both already clustered: fold the larger id into the smaller one
+        keep, drop = min(mine, theirs), max(mine, theirs)
+        stored = [tuple(r) for r in conn.execute(
+            "SELECT source, source_id FROM listing_clusters WHERE cluster_id = ?", (drop,))]
+        for member in stored + list(cluster_of):
+            if cluster_of.get(member, drop) == drop:
+                cluster_of[member] = keep
+        merged += 1
+
+    conn.executemany('''
+        INSERT INTO listing_clusters (source, source_id, cluster_id, score) VALUES (?, ?, ?, ?)
+        ON CONFLICT(source, source_id) DO UPDATE SET cluster_id = excluded.cluster_id,
+            score = COALESCE(excluded.score, listing_clusters.score)
+    ''', [(s, i, c, scores.get((s, i))) for (s, i), c in cluster_of.items()])
+    conn.commit()
+    # Matched listings (and whatever they were merged with) are now counted once per car
+    rollups.refresh(conn, scores)
+    migrations.optimize(conn)
+
+    result = {'new': len(new), 'matched': matched, 'merged_clusters': merged}
+    if verbose:
+        print(f"[*] Dedup: {result}")
+    return result
+
+
+def clusters_for(conn, source):
+    """{source_id: cluster_id} for one source, for joining onto that source's rows."""
+    return dict(conn.execute("SELECT source_id, cluster_id FROM listing_clusters WHERE source = ?", (source,)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Match list.am and auto.am listings of the same car.")
+    parser.add_argument('--market-db', default=None, help="database with the vehicles table (default: market.db)")
+    args = parser.parse_args()
+
+    conn = connect(args.market_db)
+    run(conn)
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""
+Append-only price history for list.am items and auto.am cars.
+
+The scrapers' own tables are INSERT OR REPLACE snapshots, so they keep only the latest
+price. Here every listing gets one row in `listings` (first / last day seen, when it
+disappeared, its current price) and `price_history` gets a row only when the price or
+currency changes - a listing that sits at the same price for months costs one row.
+
+    conn = history.connect()
+    history.observe(conn, 'listam', [(item_id, price, currency), ...])   # per saved batch
+    history.finish_crawl(conn, 'listam', started_day)                   # after a full crawl
+
+Days are stored as proleptic ordinals (date.toordinal()) so day arithmetic is plain
+integer arithmetic in SQL.
+"""
+import os
+import sqlite3
+import sys
+from datetime import date
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from common import migrations  # noqa: E402
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+HISTORY_DB = os.getenv('MARKET_DB', os.path.join(ROOT, 'market.db'))
+
+SOURCES = ('listam', 'autoam')
+
+
+def today():
+    return date.today().toordinal()
+
+
+def to_iso(day):
+    return date.fromordinal(day).isoformat() if day is not None else None
+
+
+def connect(path=None):
+    """Connection to market.db with every table in it (price history, rollups, vehicles,
+    dedup, thumbnails) migrated to the current schema (common/migrations.py)."""
+    conn = sqlite3.connect(path or HISTORY_DB, timeout=30)
+    migrations.migrate(conn, migrations.MARKET)
+    return conn
+
+
+# --- writes ---
+
+def observe(conn, source, rows, day=None):
+    """
+    Records that the listings in `rows` ((source_id, price, currency) tuples) were seen
+    on `day`. New listings get their first history row; existing ones get a row only if
+    the price or currency changed. Listings marked removed come back as active.
+    """
+    day = day or today()
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS _seen (source_id TEXT PRIMARY KEY, price REAL, currency TEXT)")
+    conn.execute("DELETE FROM _seen")
+    conn.executemany("INSERT OR REPLACE INTO _seen VALUES (?, ?, ?)", [(str(i), p, c) for i, p, c in rows])
+
+    conn.execute('''
+        INSERT OR IGNORE INTO listings (source, source_id, first_seen, last_seen)
+        SELECT ?, source_id, ?, ? FROM _seen
+    ''', (source, day, day))
+    # New listings have a NULL price, so they fall into "changed" too
+    conn.execute('''
+        INSERT OR REPLACE INTO price_history (listing_key, day, price, currency)
+        SELECT l.listing_key, ?, s.price, s.currency
+        FROM _seen s JOIN listings l ON l.source = ? AND l.source_id = s.source_id
+        WHERE l.price IS NOT s.price OR l.currency IS NOT s.currency
+    ''', (day, source))
+    conn.execute('''
+        UPDATE listings SET price = s.price, currency = s.currency, last_seen = ?, removed_on = NULL
+        FROM _seen s WHERE listings.source = ? AND listings.source_id = s.source_id
+    ''', (day, source))
+    conn.execute('''
+        INSERT INTO crawls (source, day, seen) VALUES (?, ?, ?)
+        ON CONFLICT(source, day) DO UPDATE SET seen = seen + excluded.seen
+    ''', (source, day, len(rows)))
+    conn.commit()
+
+
+def finish_crawl(conn, source, started_day, day=None):
+    """
+    Call after a crawl that covered the whole site: active listings not seen since the
+    crawl started are marked removed (sold or taken down) as of `day`. A relisted item
+    becomes active again the next time observe() sees it.
+    Returns the number of newly removed listings.
+    """
+    day = day or today()
+    cursor = conn.execute('''
+        UPDATE listings SET removed_on = ?
+        WHERE source = ? AND removed_on IS NULL AND last_seen < ?
+    ''', (day, source, started_day))
+    conn.execute('''
+        INSERT INTO crawls (source, day, removed) VALUES (?, ?, ?)
+        ON CONFLICT(source, day) DO UPDATE SET removed = removed + excluded.removed
+    ''', (source, day, cursor.rowcount))
+    conn.commit()
+    return cursor.rowcount
+
+
+# --- queries ---
+
+def days_on_market(first_seen, last_seen):
+    """Days between the first and last crawl that saw the listing, both included."""
+    return last_seen - first_seen + 1
+
+
+def listing(conn, source, source_id):
+    """Current state of one listing with its days on market, or None."""
+    row = conn.execute('''
+        SELECT listing_key, first_seen, last_seen, removed_on, price, currency
+        FROM listings WHERE source = ? AND source_id = ?
+    ''', (source, str(source_id))).fetchone()
+    if not row:
+        return None
+    key, first_seen, last_seen, removed_on, price, currency = row
+    return {
+        'listing_key': key,
+        'source': source,
+        'source_id': str(source_id),
+        'first_seen': to_iso(first_seen),
+        'last_seen': to_iso(last_seen),
+        'removed_on': to_iso(removed_on),
+        'status': 'removed' if removed_on is not None else 'active',
+        'days_on_market': days_on_market(first_seen, last_seen),
+        'price': price,
+        'currency': currency,
+    }
+
+
+def price_trajectory(conn, listing_key):
+    rows = conn.execute('''
+        SELECT day, price, currency FROM price_history WHERE listing_key = ? ORDER BY day
+    ''', (listing_key,)).fetchall()
+    return [{'date': to_iso(day), 'price': price, 'currency': currency} for day, price, currency in rows]
+
+
+def removed_since(conn, since_day, source=None, limit=100):
+    """Listings that disappeared on or after `since_day` (likely sold), newest first."""
+    query = '''
+        SELECT source, source_id, first_seen, last_seen, removed_on, price, currency
+        FROM listings WHERE removed_on >= ?
+    '''
+    params = [since_day]
+    if source:
+        query += " AND source = ?"
+        params.append(source)
+    query += " ORDER BY removed_on DESC LIMIT ?"
+    params.append(limit)
+    return [{
+        'source': src, 'source_id': sid, 'removed_on': to_iso(removed_on),
+        'days_on_market': days_on_market(first_seen, last_seen), 'last_price': price, 'currency': currency,
+    } for src, sid, first_seen, last_seen, removed_on, price, currency in conn.execute(query, params)]
+
+
+def price_changes_since(conn, since_day, source=None, limit=100):
+    """Listings whose price changed on or after `since_day`, with the previous and new price."""
+    query = '''
+        SELECT l.source, l.source_id, h.day, h.price, h.currency,
+               (SELECT p.price FROM price_history p
+                WHERE p.listing_key = h.listing_key AND p.day < h.day ORDER BY p.day DESC LIMIT 1) AS previous
+        FROM price_history h JOIN listings l ON l.listing_key = h.listing_key
+        WHERE h.day >= ? AND h.day > l.first_seen
+    '''
+    params = [since_day]
+    if source:
+        query += " AND l.source = ?"
+        params.append(source)
+    query += " ORDER BY h.day DESC LIMIT ?"
+    params.append(limit)
+    return [{
+        'source': src, 'source_id': sid, 'date': to_iso(day),
+        'price': price, 'previous_price': previous, 'currency': currency,
+    } for src, sid, day, price, currency, previous in conn.execute(query, params)]
@@ -0,0 +1,326 @@
+"""
+Canonical vehicle listings for both marketplaces, in market.db.
+
+The scrapers keep their raw tables (list.am display strings, auto.am cars + Armenian
+EAV tags) for resuming and re-processing, and write every batch through ingest() as
+well. Parsing, unit conversion and translation happen once here, so `vehicles` has
+typed columns (make, year, mileage_km, price_usd, fuel, ...) with English names and a
+`source` column, and readers (the listAM API, combine.py, training, the web app) only
+select columns.
+
+    conn = listings.connect()
+    listings.ingest(conn, listings.from_listam_batch(items))
+    listings.ingest(conn, [listings.from_autoam_car(car) for car in cars])
+    listings.ingest(conn, [listings.from_autoam_tags(car_id, tags)])   # detail page, later
+
+ingest() upserts only the columns a row carries, then records prices in the price
+history, updates the market rollups for the listings it touched and bumps the data
+version that the API's response cache is keyed on.
+
+price_usd is converted with parsing.USD_RATES until live rates are saved with
+save_rates() (the listAM API does after fetching them); from then on ingest() uses the
+saved rates, and save_rates() reprices the listings already stored.
+
+    python common/listings.py        # backfill from the scraper databases
+"""
+import argparse
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from common import dedup, history, migrations, parsing, rollups  # noqa: E402
+
+# Scraper databases the backfill reads
+LISTAM_DB = os.path.join(history.ROOT, 'listAM', 'database.db')
+AUTOAM_DB = os.path.join(history.ROOT, 'autoAM', 'scrapping', 'database.db')
+
+LISTAM_URL = "https://www.list.am/en/item/{}"
+AUTOAM_URL = "https://auto.am/offer/{}"
+
+FUELS = ('Gasoline', 'Diesel', 'Hybrid', 'Electric', 'LPG', 'Other')
+AUTOAM_FUELS = {'Բենզին': 'Gasoline', 'Դիզել': 'Diesel', 'Հիբրիդ': 'Hybrid', 'Էլեկտրական': 'Electric',
+                'Գազ': 'LPG', 'Բենզին և գազ': 'LPG'}
+
+# Display names for makes spelled differently on the two sites (keyed by dedup.norm_make)
+CANONICAL_MAKES = {'lada': 'VAZ (Lada)', 'mercedesbenz': 'Mercedes-Benz', 'rollsroyce': 'Rolls-Royce',
+                   'mini': 'MINI', 'landrover': 'Land Rover'}
+
+# auto.am detail attributes -> (column, type). Category values stay as the site writes them.
+AUTOAM_ATTRIBUTES = {
+    'Անվահեծերը': ('wheel_size', float),
+    'Գույնը': ('color', str),
+    'Դռների քանակը': ('door_count', int),
+    'Թափքը': ('body_type', str),
+    'Հեռահարությունը': ('range_km', float),
+    'Ձիաուժը': ('horsepower', float),
+    'Ղեկը': ('steering', str),
+    'Մարտկոցի տարողունակությունը կվտ': ('battery_kwh', float),
+    'Մխոցների քանակը': ('cylinders', int),
+    'Մոդիֆիկացիան': ('trim', str),
+    'Շարժիչը': ('fuel', str),
+    'Շարժիչի ծավալը': ('engine_volume', float),
+    'Սրահի գույնը': ('interior_color', str),
+    'Վազքը': ('mileage_km', int),
+    'Վիճակը': ('condition', str),
+    'Փոխանցման տուփը': ('transmission', str),
+    'Քարշակը': ('drive_type', str),
+    'էլ․ շարժիչների քանակը': ('electric_motors', int),
+}
+
+KEY_COLUMNS = ('source', 'source_id')
+COLUMNS = KEY_COLUMNS + (
+    'url', 'image', 'make', 'model', 'year', 'trim', 'engine', 'engine_volume', 'fuel', 'mileage_km',
+    'price', 'currency', 'price_usd', 'taxed', 'location', 'color', 'interior_color', 'body_type', 'steering',
+    'transmission', 'drive_type', 'condition', 'horsepower', 'wheel_size', 'door_count', 'cylinders',
+    'range_km', 'battery_kwh', 'electric_motors',
+)
+
+
+def connect(path=None):
+    return rollups.connect(path)
+
+
+def data_version(conn):
+    """Counter that changes whenever the listing data changes (0 on a database not set up yet)."""
+    try:
+        row = conn.execute("SELECT version FROM data_version").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] if row else 0
+
+
+def bump_version(conn):
+    conn.execute("UPDATE data_version SET version = version + 1")
+    conn.commit()
+
+
+# --- normalization ---
+
+def canonical_make(make):
+    make = (make or '').strip()
+    return CANONICAL_MAKES.get(dedup.norm_make(make), make) or None
+
+
+def _int(value):
+    return int(value) if value is not None else None
+
+
+def from_listam(item, fields=None):
+    """(id, image_src, p_text, l_text, at_text) list.am items row -> vehicles row.
+    `fields` is the row's parsing.parse_listam() result when it was parsed in a batch."""
+    item_id, image_src, p_text, l_text, at_text = item
+    row = dict(fields or parsing.parse_listam(p_text, l_text, at_text))
+    row.update({
+        'source': 'listam',
+        'source_id': str(item_id),
+        'url': LISTAM_URL.format(item_id),
+        'image': image_src if image_src and image_src != "N/A" else None,
+        'make': canonical_make(row['make']),
+    })
+    return row
+
+
+def from_listam_batch(items):
+    """from_listam() over many items rows; each distinct display string is parsed once."""
+    parsed = parsing.parse_listam_batch([item[2:] for item in items])
+    return [from_listam(item, fields) for item, fields in zip(items, parsed)]
+
+
+def from_autoam_car(car):
+    """A car dict from scrap_pages.parse_search_page -> vehicles row. auto.am's data-price is in USD."""
+    price = parsing.to_number(car['price'])
+    return {
+        'source': 'autoam',
+        'source_id': str(car['id']),
+        'url': AUTOAM_URL.format(car['id']),
+        'make': canonical_make(car['brand']),
+        'model': (car['model'] or '').strip() or None,
+        'year': _int(parsing.to_number(car['year'])),
+        'price': price,
+        'currency': 'USD',
+        'price_usd': price,
+        'taxed': int(bool(car['taxed'])),
+    }
+
+
+def from_autoam_tags(car_id, tags):
+    """(attribute, value) pairs from an offer page -> vehicles row with the detail columns.
+    Attributes not in AUTOAM_ATTRIBUTES are dropped."""
+    row = {'source': 'autoam', 'source_id': str(car_id)}
+    for attribute, value in tags:
+        if attribute not in AUTOAM_ATTRIBUTES or value in (None, ''):
+            continue
+        column, kind = AUTOAM_ATTRIBUTES[attribute]
+        if column == 'fuel':
+            row[column] = AUTOAM_FUELS.get(value.strip(), 'Other')
+        elif kind is str:
+            row[column] = value.strip()
+        else:
+            number = parsing.to_number(value)
+            row[column] = kind(number) if number is not None else None
+    if row.get('engine_volume'):
+        row['engine'] = f"{row['engine_volume']}L"
+    return row
+
+
+# --- exchange rates ---
+
+def saved_rates(conn):
+    """{currency: units per USD} saved by save_rates(); empty until live rates were fetched."""
+    return dict(conn.execute("SELECT currency, per_usd FROM rates"))
+
+
+def save_rates(conn, rates):
+    """
+    Saves live rates ({currency: units per USD}, e.g. the listAM API's RATES) for the
+    currencies listings are priced in and reprices the stored listings to match.
+    Returns the number of listings whose price_usd changed.
+    """
+    known = [(c, float(rates[c])) for c in parsing.USD_RATES if c != 'USD' and rates.get(c)]
+    conn.executemany('''
+        INSERT INTO rates (currency, per_usd) VALUES (?, ?)
+        ON CONFLICT(currency) DO UPDATE SET per_usd = excluded.per_usd, updated_at = CURRENT_TIMESTAMP
+    ''', known)
+    conn.commit()
+    return reprice(conn)
+
+
+def reprice(conn):
+    """Recomputes price_usd at the saved rates where it differs and moves the live listings
+    among them in the rollups (removed ones stay out of the stats). Returns the number of
+    listings changed."""
+    changed, live = [], []
+    for currency, per_usd in saved_rates(conn).items():
+        for source, source_id, price, price_usd, removed_on in conn.execute('''
+                SELECT v.source, v.source_id, v.price, v.price_usd, l.removed_on FROM vehicles v
+                LEFT JOIN listings l ON l.source = v.source AND l.source_id = v.source_id
+                WHERE v.currency = ? AND v.price IS NOT NULL''', (currency,)):
+            new = round(price / per_usd, 2)
+            if new != price_usd:
+                changed.append((new, source, source_id))
+                if removed_on is None:
+                    live.append((source, source_id))
+    if not changed:
+        return 0
+    conn.executemany("UPDATE vehicles SET price_usd = ? WHERE source = ? AND source_id = ?", changed)
+    conn.commit()
+    if live:
+        rollups.refresh(conn, live)
+    bump_version(conn)
+    return len(changed)
+
+
+# --- ingest ---
+
+def ingest(conn, rows, day=None, record_history=True):
+    """
+    Upserts normalized rows (dicts from the from_* functions; every row needs source and
+    source_id, other columns are optional and left untouched when missing). Rows that
+    carry a price are recorded in the price history unless `record_history` is False,
+    and the rollups are brought up to date for every listing touched.
+    Returns the number of rows written.
+    """
+    if not rows:
+        return 0
+    rates = saved_rates(conn)
+    groups = {}
+    for row in rows:
+        if rates and row.get('currency') in rates and row.get('price') is not None:
+            row['price_usd'] = round(row['price'] / rates[row['currency']], 2)
+        groups.setdefault(tuple(row), []).append(row)
+
+    for columns, group in groups.items():
+        unknown = set(columns) - set(COLUMNS)
+        if unknown or not set(KEY_COLUMNS) <= set(columns):
+            raise ValueError(f"bad vehicles columns: {sorted(unknown) or 'missing source/source_id'}")
+        updates = [f"{c} = excluded.{c}" for c in columns if c not in KEY_COLUMNS]
+        conflict = f"DO UPDATE SET {', '.join(updates)}, updated_at = CURRENT_TIMESTAMP" if updates else "DO NOTHING"
+        conn.executemany(f'''
+            INSERT INTO vehicles ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})
+            ON CONFLICT(source, source_id) {conflict}
+        ''', [tuple(row[c] for c in columns) for row in group])
+    conn.commit()
+
+    if record_history:
+        for source in history.SOURCES:
+            priced = [(r['source_id'], r['price'], r.get('currency'))
+                      for r in rows if r['source'] == source and 'price' in r]
+            if priced:
+                history.observe(conn, source, priced, day)
+
+    rollups.refresh(conn, {(r['source'], r['source_id']) for r in rows})
+    bump_version(conn)
+    return len(rows)
+
+
+# --- backfill ---
+
+SYNC_BATCH_SIZE = 10_000
+
+
+def _batches(cursor, size=SYNC_BATCH_SIZE):
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield rows
+
+
+def sync(conn, listam_db=LISTAM_DB, autoam_db=AUTOAM_DB, verbose=True):
+    """
+    (Re)ingests everything in the scraper databases, e.g. on first run or after a
+    normalization change. The price history is left alone: a backfill is not a crawl.
+    """
+    counts = {}
+    if listam_db and os.path.exists(listam_db):
+        src = sqlite3.connect(listam_db)
+        cursor = src.execute("SELECT id, image_src, p_text, l_text, at_text FROM items")
+        counts['listam'] = sum(ingest(conn, from_listam_batch(batch), record_history=False)
+                               for batch in _batches(cursor))
+        src.close()
+    if autoam_db and os.path.exists(autoam_db):
+        src = sqlite3.connect(autoam_db)
+        columns = ('id', 'brand', 'model', 'price', 'currency', 'taxed', 'year')
+        cursor = src.execute(f"SELECT {', '.join(columns)} FROM cars")
+        counts['autoam'] = sum(ingest(conn, [from_autoam_car(dict(zip(columns, car))) for car in batch],
+                                      record_history=False) for batch in _batches(cursor))
+        if src.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tags'").fetchone():
+            # Ordered by car, so a car's tags never straddle two batches
+            cursor = src.execute("SELECT car_id, attribute, value FROM tags ORDER BY car_id")
+            pending = []
+            for batch in _batches(cursor):
+                pending.extend(batch)
+                last = pending[-1][0]
+                done = [t for t in pending if t[0] != last]
+                pending = [t for t in pending if t[0] == last]
+                _ingest_tags(conn, done)
+            _ingest_tags(conn, pending)
+        src.close()
+    migrations.optimize(conn, analyze=True)
+    if verbose:
+        print(f"[*] Ingested {counts}")
+    return counts
+
+
+def _ingest_tags(conn, tags):
+    by_car = {}
+    for car_id, attribute, value in tags:
+        by_car.setdefault(car_id, []).append((attribute, value))
+    ingest(conn, [from_autoam_tags(car_id, car_tags) for car_id, car_tags in by_car.items()], record_history=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill the canonical vehicles table from the scraper databases.")
+    parser.add_argument('--listam', default=LISTAM_DB)
+    parser.add_argument('--autoam', default=AUTOAM_DB)
+    parser.add_argument('--market-db', default=None, help="output database (default: market.db)")
+    args = parser.parse_args()
+
+    conn = connect(args.market_db)
+    sync(conn, args.listam, args.autoam)
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,398 @@
+"""
+Versioned schemas for every database in the project.
+
+Each database has an ordered list of migrations; a migration's version is its position
+in the list (1-based) and the database's current version is kept in PRAGMA user_version,
+so opening a connection costs two pragma reads once it is up to date:
+
+    MARKET   market.db                       price history, rollups, vehicles, dedup, thumbnails
+    LISTAM   listAM/database.db              list.am items + page queue (listAM/scrap.py)
+    AUTOAM   autoAM/scrapping/database.db    auto.am cars + tags (scrap_pages.py / scrap_listings.py)
+
+    conn = sqlite3.connect(path, timeout=30)
+    migrations.migrate(conn, migrations.MARKET)
+
+Migrations run online: databases are switched to WAL, so readers (the API, a running
+scraper) keep reading the old schema while a migration's write transaction is open, and
+each migration commits together with its version bump. Two processes starting at once
+both take the write lock in turn; the second finds the work done and skips it.
+
+Migration 1 is the schema as it was before versioning, written with IF NOT EXISTS so
+existing databases adopt it as is - provided their tables have every baseline column.
+A table from an older layout is refused with an error rather than silently adopted,
+since later migrations and queries assume the baseline. Only ever append: a shipped migration has run
+against databases that will not run it again.
+
+After a bulk load (a backfill, a full crawl, a dedup run) call optimize(conn, analyze=True)
+so the query planner has statistics for the new data; optimize(conn) is the cheap
+end-of-run variant that only re-analyzes tables that changed a lot.
+
+Connections migrate themselves (history.connect(), the scrapers' init_db()); to do it
+ahead of a deploy, or to see where each database is:
+
+    python common/migrations.py [--status] [--analyze]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+
+MARKET = [
+    ("baseline: price history, rollups, vehicles, dedup, thumbnails", '''
+        CREATE TABLE IF NOT EXISTS listings (
+            listing_key INTEGER PRIMARY KEY,
+            source TEXT NOT NULL,
+            source_id TEXT NOT NULL,
+            first_seen INTEGER NOT NULL,
+            last_seen INTEGER NOT NULL,
+            removed_on INTEGER,
+            price REAL,
+            currency TEXT,
+            UNIQUE(source, source_id)
+        );
+        -- (listing_key, day) is the clustering key, so a trajectory is one range scan
+        CREATE TABLE IF NOT EXISTS price_history (
+            listing_key INTEGER NOT NULL,
+            day INTEGER NOT NULL,
+            price REAL,
+            currency TEXT,
+            PRIMARY KEY (listing_key, day)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_price_history_day ON price_history(day);
+        CREATE INDEX IF NOT EXISTS idx_listings_removed ON listings(removed_on) WHERE removed_on IS NOT NULL;
+        CREATE TABLE IF NOT EXISTS crawls (
+            source TEXT NOT NULL,
+            day INTEGER NOT NULL,
+            seen INTEGER NOT NULL DEFAULT 0,
+            removed INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (source, day)
+        );
+
+        -- level: bit i set when DIMENSIONS[i] is kept (not ALL), so one level is one key range
+        CREATE TABLE IF NOT EXISTS rollup_cells (
+            level INTEGER NOT NULL,
+            make TEXT NOT NULL,
+            model TEXT NOT NULL,
+            year NOT NULL,
+            fuel TEXT NOT NULL,
+            n INTEGER NOT NULL,
+            price_n INTEGER NOT NULL,
+            price_sum REAL NOT NULL,
+            km_n INTEGER NOT NULL,
+            km_sum REAL NOT NULL,
+            price_sketch TEXT NOT NULL,
+            km_sketch TEXT NOT NULL,
+            PRIMARY KEY (level, make, model, year, fuel)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS rollup_members (
+            source TEXT NOT NULL,
+            source_id TEXT NOT NULL,
+            make TEXT NOT NULL,
+            model TEXT NOT NULL,
+            year INTEGER NOT NULL,
+            fuel TEXT NOT NULL,
+            price_usd REAL,
+            km REAL,
+            PRIMARY KEY (source, source_id)
+        ) WITHOUT ROWID;
+
+        CREATE TABLE IF NOT EXISTS vehicles (
+            vehicle_id INTEGER PRIMARY KEY,
+            source TEXT NOT NULL,
+            source_id TEXT NOT NULL,
+            url TEXT,
+            image TEXT,
+            make TEXT,
+            model TEXT,
+            year INTEGER,
+            trim TEXT,
+            engine TEXT,
+            engine_volume REAL,
+            fuel TEXT,
+            mileage_km INTEGER,
+            price REAL,
+            currency TEXT,
+            price_usd REAL,
+            taxed INTEGER,
+            location TEXT,
+            color TEXT,
+            interior_color TEXT,
+            body_type TEXT,
+            steering TEXT,
+            transmission TEXT,
+            drive_type TEXT,
+            condition TEXT,
+            horsepower REAL,
+            wheel_size REAL,
+            door_count INTEGER,
+            cylinders INTEGER,
+            range_km REAL,
+            battery_kwh REAL,
+            electric_motors INTEGER,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(source, source_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_vehicles_make_model ON vehicles(make, model, year);
+        CREATE INDEX IF NOT EXISTS idx_vehicles_price_usd ON vehicles(price_usd);
+        -- Bumped after every write to vehicles, so readers can tell when their caches are stale
+        CREATE TABLE IF NOT EXISTS data_version (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            version INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO data_version VALUES (0, 0);
+
+        CREATE TABLE IF NOT EXISTS dedup_records (
+            source TEXT NOT NULL,
+            source_id TEXT NOT NULL,
+            block TEXT,
+            price_usd REAL,
+            mileage_km REAL,
+            image_key TEXT,
+            PRIMARY KEY (source, source_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_dedup_records_block ON dedup_records(block);
+        CREATE TABLE IF NOT EXISTS listing_clusters (
+            source TEXT NOT NULL,
+            source_id TEXT NOT NULL,
+            cluster_id INTEGER NOT NULL,
+            score REAL,
+            PRIMARY KEY (source, source_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_listing_clusters_cluster ON listing_clusters(cluster_id);
+
+        CREATE TABLE IF NOT EXISTS images (
+            url TEXT PRIMARY KEY,
+            hash TEXT,
+            width INTEGER,
+            height INTEGER,
+            bytes INTEGER,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            fetched_at INTEGER,
+            last_used INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS idx_images_hash ON images(hash) WHERE hash IS NOT NULL;
+        CREATE INDEX IF NOT EXISTS idx_images_last_used ON images(last_used) WHERE hash IS NOT NULL;
+    '''),
+    ("covering indexes for the history, thumbnail and image queries", '''
+        -- history.price_changes_since(): the day range plus every column it reads
+        DROP INDEX IF EXISTS idx_price_history_day;
+        CREATE INDEX idx_price_history_day ON price_history(day, listing_key, price, currency);
+        -- thumbnails.evict() groups by hash and reads bytes / last_used
+        DROP INDEX IF EXISTS idx_images_hash;
+        CREATE INDEX idx_images_hash ON images(hash, bytes, last_used) WHERE hash IS NOT NULL;
+        -- thumbnails.pending()
+        CREATE INDEX idx_images_pending ON images(status, attempts, url) WHERE status = 'pending';
+        -- thumbnails.py main(): every image URL to enqueue
+        CREATE INDEX idx_vehicles_image ON vehicles(image) WHERE image IS NOT NULL;
+    '''),
+    ("exchange rates that vehicles.price_usd is computed with", '''
+        -- Live rates saved by listings.save_rates(); until then ingest uses parsing.USD_RATES
+        CREATE TABLE rates (
+            currency TEXT PRIMARY KEY,
+            per_usd REAL NOT NULL,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+        );
+        -- listings.reprice(): every priced listing in one currency
+        CREATE INDEX idx_vehicles_currency ON vehicles(currency, price, price_usd) WHERE price IS NOT NULL;
+    '''),
+]
+
+LISTAM = [
+    ("baseline: items and the page queue", '''
+        CREATE TABLE IF NOT EXISTS items (
+            id TEXT PRIMARY KEY,
+            image_src TEXT,
+            p_text TEXT,
+            l_text TEXT,
+            at_text TEXT
+        );
+        -- Persistent work queue: a crawl can be stopped and resumed, and several workers share it
+        CREATE TABLE IF NOT EXISTS page_queue (
+            page INTEGER PRIMARY KEY,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            items INTEGER,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    '''),
+    ("covering index for claiming pages", '''
+        -- scrap.claim_page(): next pending page, fewest attempts first, without a sort
+        CREATE INDEX idx_page_queue_claim ON page_queue(status, attempts, page);
+    '''),
+]
+
+AUTOAM = [
+    ("baseline: cars and their detail tags", '''
+        CREATE TABLE IF NOT EXISTS cars (
+            id TEXT PRIMARY KEY,
+            brand TEXT,
+            model TEXT,
+            price REAL,
+            currency TEXT,
+            taxed BOOL,
+            year INT,
+            original_price_text TEXT,
+            scraped_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        -- (car_id, attribute) is unique, so a re-scraped car replaces its tags
+        CREATE TABLE IF NOT EXISTS tags (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            car_id TEXT,
+            attribute TEXT,
+            value TEXT,
+            FOREIGN KEY(car_id) REFERENCES cars(id),
+            UNIQUE(car_id, attribute)
+        );
+    '''),
+    ("covering index on tags led by attribute", '''
+        -- One attribute across all cars (mileage for dedup, a column for training) is a range scan
+        CREATE INDEX idx_tags_attribute ON tags(attribute, value, car_id);
+    '''),
+]
+
+
+def version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn, migrations, verbose=True):
+    """
+    Brings the database behind `conn` up to the last of `migrations` and switches it to
+    WAL. Returns the version it is at. Each migration is one transaction (statements and
+    version bump), so a failure leaves the database at the previous version.
+    """
+    _use_wal(conn)
+    target = len(migrations)
+    if version(conn) >= target:
+        return version(conn)
+
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None  # explicit transactions below
+    applied = []
+    try:
+        for number, (description, step) in enumerate(migrations, start=1):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Re-read under the write lock: another process may have got here first
+                if version(conn) >= number:
+                    conn.execute("COMMIT")
+                    continue
+                if callable(step):
+                    step(conn)
+                else:
+                    if number == 1:
+                        _check_adopted(conn, step)
+                    for statement in _statements(step):
+                        conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {number}")
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            applied.append(number)
+            if verbose:
+                print(f"[*] {_name(conn)}: migration {number} ({description})")
+    finally:
+        conn.isolation_level = isolation_level
+
+    if applied:
+        # New indexes have no statistics until they are analyzed
+        optimize(conn, analyze=True)
+    return version(conn)
+
+
+def optimize(conn, analyze=False):
+    """
+    Refreshes the query planner's statistics. With `analyze` (after a bulk load) every
+    table and index is rescanned; otherwise PRAGMA optimize re-analyzes only the tables
+    that changed a lot since the last time. A database never analyzed gets ANALYZE.
+    """
+    analyzed = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone()
+    conn.execute("ANALYZE" if analyze or not analyzed else "PRAGMA optimize")
+    conn.commit()
+
+
+def _use_wal(conn):
+    # journal_mode is stored in the file, so this only does something the first time
+    if conn.execute("PRAGMA journal_mode").fetchone()[0] in ('wal', 'memory'):
+        return
+    try:
+        conn.execute("PRAGMA journal_mode = WAL")
+    except sqlite3.OperationalError as e:
+        # Another connection is writing; the switch is retried on the next connect
+        print(f"[!] {_name(conn)}: not switched to WAL yet ({e})")
+
+
+def _check_adopted(conn, baseline):
+    """Raises when a table that already exists lacks columns the baseline script creates."""
+    expected = sqlite3.connect(':memory:')
+    for statement in _statements(baseline):
+        expected.execute(statement)
+    mismatched = []
+    for (table,) in expected.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall():
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if not existing:
+            continue  # created by the baseline
+        missing = {row[1] for row in expected.execute(f"PRAGMA table_info({table})")} - existing
+        if missing:
+            mismatched.append(f"{table} lacks {', '.join(sorted(missing))}")
+    expected.close()
+    if mismatched:
+        raise sqlite3.DatabaseError(f"{_name(conn)} predates the baseline schema ({'; '.join(mismatched)}); "
+                                    "migrate or rebuild it by hand")
+
+
+def _statements(script):
+    """Splits a migration script into statements (sqlite3 runs one per execute())."""
+    statement = ''
+    # Grow up to each ';' until it ends a statement (and isn't inside a string or trigger)
+    for part in script.split(';'):
+        statement += part
+        if not sqlite3.complete_statement(statement + ';'):
+            statement += ';'
+            continue
+        if _code(statement):
+            yield statement.strip() + ';'
+        statement = ''
+    if _code(statement):
+        raise ValueError(f"Incomplete statement in migration: {statement.strip()}")
+
+
+def _code(sql):
+    return '\n'.join(line for line in sql.splitlines() if not line.strip().startswith('--')).strip()
+
+
+def _name(conn):
+    path = conn.execute("PRAGMA database_list").fetchone()[2]
+    return path or ':memory:'
+
+
+def main():
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    from common import history, listings  # both import this module
+
+    parser = argparse.ArgumentParser(description="Migrate every database to the current schema.")
+    parser.add_argument('--market-db', default=history.HISTORY_DB)
+    parser.add_argument('--listam', default=listings.LISTAM_DB)
+    parser.add_argument('--autoam', default=listings.AUTOAM_DB)
+    parser.add_argument('--status', action='store_true', help="only print each database's version")
+    parser.add_argument('--analyze', action='store_true', help="also refresh planner statistics (ANALYZE)")
+    args = parser.parse_args()
+
+    for path, steps in ((args.market_db, MARKET), (args.listam, LISTAM), (args.autoam, AUTOAM)):
+        if not os.path.exists(path):
+            print(f"[-] {path}: not created yet")
+            continue
+        conn = sqlite3.connect(path, timeout=30)
+        if not args.status:
+            migrate(conn, steps)
+            if args.analyze:
+                optimize(conn, analyze=True)
+        mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        print(f"[*] {path}: version {version(conn)}/{len(steps)}, journal {mode}")
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
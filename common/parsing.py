@@ -0,0 +1,199 @@
+"""
+Parsers for the list.am display strings and auto.am's free-text numbers.
+
+Every field is pulled out by one precompiled regex per string, so a title, a price
+or a details line is scanned once:
+
+    l_text   '2007 Land Rover Range Rover Sport, 4.2L, all wheel drive, gas'
+             -> year 2007, make 'Land Rover', model 'Range Rover Sport', engine '4.2L'
+    p_text   '$12,500' / '9,840,000 ֏' / '€ 8 900' -> (12500.0, 'USD'), ...
+    at_text  'Kentron, 2019 y., 97,300 miles, Gasoline'
+             -> location 'Kentron', mileage 156589 km, fuel 'Gasoline'
+
+parse_listam() does all three for an items row; parse_listam_batch() does the same for
+a whole table and parses each distinct string once (titles and prices repeat a lot),
+which is what backfills should use.
+
+    python benchmarks/check_parsing.py    # invariants over the scraped rows + throughput
+"""
+import re
+
+# Fallback USD rates for list.am prices (same defaults as listAM/app.py)
+USD_RATES = {"USD": 1.0, "EUR": 0.93, "AMD": 405.0, "RUB": 91.5}
+
+KM_PER_MILE = 1.60934
+
+# Makes that are more than one word in list.am titles ("2007 Land Rover Range Rover, ...")
+MULTI_WORD_MAKES = ('Land Rover', 'VAZ (Lada)', 'Rolls Royce', 'Alfa Romeo', 'Aston Martin',
+                    'Great Wall', 'Mercedes-Maybach')
+
+# Canonical fuel per word in a list.am details line ('Factory installed LPG/CNG' is the gas option)
+LISTAM_FUELS = {'Gasoline': 'Gasoline', 'Diesel': 'Diesel', 'Hybrid': 'Hybrid', 'Electric': 'Electric',
+                'LPG': 'LPG', 'CNG': 'LPG'}
+
+CURRENCY_SYMBOLS = {'$': 'USD', '€': 'EUR', '֏': 'AMD', '₽': 'RUB',
+                    'USD': 'USD', 'EUR': 'EUR', 'AMD': 'AMD', 'RUB': 'RUB'}
+
+# "<year> <make> <model>[, <spec>, ...]"; the make alternation tries the multi-word makes first
+TITLE_RE = re.compile(r'''
+    ^\s*(?:(?P<year>\d{4})\s+)?
+    (?P<make>{makes}|[^\s,]+)
+    \s*(?P<model>[^,]*?)\s*
+    (?:,\s*(?P<spec>.*?)\s*)?$
+'''.replace('{makes}', '|'.join(re.escape(m) for m in sorted(MULTI_WORD_MAKES, key=len, reverse=True))),
+    re.VERBOSE)
+# First spec part naming the engine: a displacement, or 'electric' / 'hybrid' when there is none
+ENGINE_RE = re.compile(r'(?:^|,\s*)(?P<engine>(?P<volume>\d+(?:\.\d+)?)\s*L|electric|hybrid)\s*(?:,|$)',
+                       re.IGNORECASE)
+# Amount with thousands separators (',' or spaces) and a currency symbol or code on either side
+PRICE_RE = re.compile(r'''
+    (?P<before>[$€֏₽]|USD|EUR|AMD|RUB)?\s*
+    (?P<amount>\d{1,3}(?:[,\s]\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?)
+    \s*(?P<after>[$€֏₽]|USD|EUR|AMD|RUB)?
+''', re.VERBOSE)
+# "<location>, <year> y., <n> km|miles, <fuel>"; every part but the location is optional
+DETAILS_RE = re.compile(r'''
+    ^\s*(?P<location>[^,]*?)\s*
+    (?:,\s*(?P<year>\d{4})\s*y\.)?
+    (?:,\s*(?P<mileage>\d[\d,]*)\s*(?P<unit>km|miles|mi)\b)?
+    (?:,\s*(?P<fuel>[^,]*?))?\s*$
+''', re.VERBOSE | re.IGNORECASE)
+MILEAGE_RE = re.compile(r'(?P<mileage>\d[\d,]*)\s*(?P<unit>km|miles|mi)\b', re.IGNORECASE)
+FUEL_RE = re.compile('|'.join(LISTAM_FUELS))
+# Same thousands separators as prices: '45,000' / '45 000' -> 45000
+NUMBER_RE = re.compile(r'\d{1,3}(?:[,\s]\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?')
+
+
+# --- single strings ---
+
+def parse_title(l_text):
+    """l_text -> (year, make, model, engine); engine is the '2.0L' / 'electric' spec part."""
+    match = TITLE_RE.match(l_text or '')
+    if not match:
+        return None, None, None, None
+    year = int(match['year']) if match['year'] else None
+    engine = None
+    if match['spec']:
+        spec = ENGINE_RE.search(match['spec'])
+        engine = spec['engine'] if spec else None
+    return year, match['make'], match['model'] or None, engine
+
+
+def engine_volume(engine):
+    """'4.2L' -> 4.2"""
+    match = ENGINE_RE.search(engine or '')
+    return float(match['volume']) if match and match['volume'] else None
+
+
+def parse_price(p_text):
+    """'9,840,000 ֏' -> (9840000.0, 'AMD'); (None, None) when there is no price.
+    A bare number is taken as USD, which is what list.am shows by default."""
+    if not p_text or 'N/A' in p_text:
+        return None, None
+    match = PRICE_RE.search(p_text)
+    if not match:
+        return None, None
+    amount = float(re.sub(r'[,\s]', '', match['amount']))
+    currency = CURRENCY_SYMBOLS[match['before'] or match['after'] or 'USD']
+    return amount, currency
+
+
+def to_usd(price, currency):
+    if price is None or currency not in USD_RATES:
+        return None
+    return round(price / USD_RATES[currency], 2)
+
+
+def _km(mileage, unit):
+    value = float(mileage.replace(',', ''))
+    return value * KM_PER_MILE if unit.lower().startswith('mi') else value
+
+
+def parse_mileage(text):
+    """'97,300 miles' (anywhere in the text) -> kilometres, or None."""
+    match = MILEAGE_RE.search(text or '')
+    return _km(match['mileage'], match['unit']) if match else None
+
+
+def canonical_fuel(text):
+    match = FUEL_RE.search(text or '')
+    return LISTAM_FUELS[match.group()] if match else 'Other'
+
+
+def parse_details(at_text):
+    """at_text -> (location, year, mileage_km, fuel)."""
+    match = DETAILS_RE.match(at_text or '')
+    if not match:
+        # Unexpected layout: fall back to searching for each field on its own
+        return None, None, parse_mileage(at_text), canonical_fuel(at_text)
+    mileage = _km(match['mileage'], match['unit']) if match['mileage'] else None
+    year = int(match['year']) if match['year'] else None
+    return match['location'] or None, year, mileage, canonical_fuel(match['fuel'])
+
+
+def to_number(value):
+    """First number in a free-text value ('190 hp', '2.5', '45,000'), or None."""
+    match = NUMBER_RE.search(str(value or ''))
+    return float(re.sub(r'[,\s]', '', match.group())) if match else None
+
+
+# --- whole rows ---
+
+FIELDS = ('year', 'make', 'model', 'engine', 'engine_volume', 'price', 'currency', 'price_usd',
+          'mileage_km', 'fuel', 'location')
+
+
+def parse_listam(p_text, l_text, at_text):
+    """One list.am item's display strings -> dict of FIELDS."""
+    year, make, model, engine = parse_title(l_text)
+    price, currency = parse_price(p_text)
+    location, listed_year, mileage, fuel = parse_details(at_text)
+    return {
+        'year': year or listed_year,
+        'make': make,
+        'model': model,
+        'engine': engine,
+        'engine_volume': engine_volume(engine),
+        'price': price,
+        'currency': currency,
+        'price_usd': to_usd(price, currency),
+        'mileage_km': int(mileage) if mileage is not None else None,
+        'fuel': fuel,
+        'location': location,
+    }
+
+
+def parse_listam_batch(rows):
+    """
+    parse_listam() over many (p_text, l_text, at_text) rows, returning a list of FIELDS
+    dicts in the same order. Each distinct title, price and details string is parsed once.
+    """
+    titles, prices, details = {}, {}, {}
+    results = []
+    for p_text, l_text, at_text in rows:
+        title = titles.get(l_text)
+        if title is None:
+            year, make, model, engine = parse_title(l_text)
+            titles[l_text] = title = (year, make, model, engine, engine_volume(engine))
+        price = prices.get(p_text)
+        if price is None:
+            amount, currency = parse_price(p_text)
+            prices[p_text] = price = (amount, currency, to_usd(amount, currency))
+        detail = details.get(at_text)
+        if detail is None:
+            details[at_text] = detail = parse_details(at_text)
+        location, listed_year, mileage, fuel = detail
+        results.append({
+            'year': title[0] or listed_year,
+            'make': title[1],
+            'model': title[2],
+            'engine': title[3],
+            'engine_volume': title[4],
+            'price': price[0],
+            'currency': price[1],
+            'price_usd': price[2],
+            'mileage_km': int(mileage) if mileage is not None else None,
+            'fuel': fuel,
+            'location': location,
+        })
+    return results
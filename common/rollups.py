@@ -0,0 +1,322 @@
+"""
+Pre-aggregated market statistics (count, sums and quantile sketches of price and km)
+per make / model / year / fuel cell, kept in market.db.
+
+Every grouping of the four dimensions is pre-aggregated (a cell per make, per make and
+model, per fuel, ... with ALL in the rolled-up dimensions, 16 levels in total), so a
+drill-down (all makes, one make's models, one model's years, ...) is one range read of
+already finished rows and never touches the raw listings. Sketches are DDSketch-style
+log histograms: they support removal and keep quantiles within SKETCH_ACCURACY
+relative error.
+
+    conn = rollups.connect()
+    rollups.apply(conn, rollups.rows_for(conn, keys))   # on ingest (listings.ingest does this)
+    rollups.stats(conn, make='Toyota')                  # per-model rows
+
+Each listing's last contribution is remembered in rollup_members, so re-ingesting a
+listing with a new price moves it instead of counting it twice. Only live listings are
+counted, and a car listed on both sites (a cross-site cluster, see common/dedup.py) is
+counted once, as its auto.am listing while that is live; refresh() keeps both rules
+as listings are ingested, removed and matched.
+"""
+import argparse
+import json
+import math
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from common import history, migrations  # noqa: E402
+
+# Relative accuracy of the quantile sketches (1% -> buckets grow by ~2% each)
+SKETCH_ACCURACY = 0.01
+_GAMMA = (1 + SKETCH_ACCURACY) / (1 - SKETCH_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+
+DIMENSIONS = ('make', 'model', 'year', 'fuel')
+# Value of a rolled-up dimension in rollup_cells
+ALL = '*'
+# Default drill-down order: with only a make given, rows are per model, and so on
+DRILL_DOWN = ('make', 'model', 'year')
+DEFAULT_QUANTILES = (0.25, 0.5, 0.75)
+
+
+def connect(path=None):
+    return history.connect(path)
+
+
+# --- sketch ---
+
+class Sketch:
+    """Log-bucketed histogram of positive values; bucket i covers (gamma^(i-1), gamma^i]."""
+
+    def __init__(self, buckets=None):
+        self.buckets = buckets or {}
+
+    @classmethod
+    def loads(cls, text):
+        return cls({int(k): v for k, v in json.loads(text).items()})
+
+    def dumps(self):
+        return json.dumps(self.buckets, separators=(',', ':'))
+
+    def add(self, value, count=1):
+        if value is None or value <= 0:
+            return
+        index = math.ceil(math.log(value) / _LOG_GAMMA)
+        total = self.buckets.get(index, 0) + count
+        if total > 0:
+            self.buckets[index] = total
+        else:
+            self.buckets.pop(index, None)
+
+    def quantile(self, q):
+        total = sum(self.buckets.values())
+        if not total:
+            return None
+        rank = q * (total - 1)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                # Bucket midpoint, within SKETCH_ACCURACY of any value in the bucket
+                return 2 * _GAMMA ** index / (_GAMMA + 1)
+        return None
+
+
+# --- reading the vehicles table ---
+
+def rows_for(conn, keys=None):
+    """apply() rows for the given (source, source_id) keys (all when None), from the
+    canonical vehicles table in the same database (common/listings.py). Left out: listings
+    the price history marked removed, and listings whose cross-site cluster has a live
+    listing from a source sorting first ('autoam' < 'listam'), which stands for the car."""
+    query = '''
+        SELECT v.source, v.source_id, COALESCE(v.make, ''), COALESCE(v.model, ''), COALESCE(v.year, 0),
+               COALESCE(v.fuel, 'Other'), v.price_usd, v.mileage_km
+        FROM vehicles v
+        LEFT JOIN listings l ON l.source = v.source AND l.source_id = v.source_id
+        WHERE l.removed_on IS NULL
+          AND NOT EXISTS (
+              SELECT 1 FROM listing_clusters c
+              JOIN listing_clusters o ON o.cluster_id = c.cluster_id AND o.source < c.source
+              LEFT JOIN listings lo ON lo.source = o.source AND lo.source_id = o.source_id
+              WHERE c.source = v.source AND c.source_id = v.source_id AND lo.removed_on IS NULL)
+    '''
+    if keys is None:
+        return conn.execute(query).fetchall()
+    query += " AND v.source = ? AND v.source_id = ?"
+    return [row for key in keys for row in conn.execute(query, key)]
+
+
+# --- updates ---
+
+class _Cell:
+    def __init__(self, row=None):
+        if row is None:
+            self.n = self.price_n = self.km_n = 0
+            self.price_sum = self.km_sum = 0.0
+            self.price_sketch, self.km_sketch = Sketch(), Sketch()
+        else:
+            self.n, self.price_n, self.price_sum, self.km_n, self.km_sum = row[:5]
+            self.price_sketch, self.km_sketch = Sketch.loads(row[5]), Sketch.loads(row[6])
+
+    def add(self, price, km, sign):
+        self.n += sign
+        if price is not None and price > 0:
+            self.price_n += sign
+            self.price_sum += sign * price
+            self.price_sketch.add(price, sign)
+        if km is not None and km > 0:
+            self.km_n += sign
+            self.km_sum += sign * km
+            self.km_sketch.add(km, sign)
+
+
+LEVELS = range(1 << len(DIMENSIONS))
+
+
+def _level(dimensions):
+    return sum(1 << DIMENSIONS.index(d) for d in dimensions)
+
+
+def _cell_keys(values):
+    """The cell key of (make, model, year, fuel) at every level."""
+    for level in LEVELS:
+        yield (level, *(v if level & (1 << i) else ALL for i, v in enumerate(values)))
+
+
+def _update(conn, adds, removes):
+    """adds / removes: lists of (make, model, year, fuel, price, km)."""
+    cells = {}
+    for row, sign in [(r, -1) for r in removes] + [(r, 1) for r in adds]:
+        for key in _cell_keys(row[:4]):
+            if key not in cells:
+                stored = conn.execute('''
+                    SELECT n, price_n, price_sum, km_n, km_sum, price_sketch, km_sketch FROM rollup_cells
+                    WHERE level = ? AND make = ? AND model = ? AND year = ? AND fuel = ?
+                ''', key).fetchone()
+                cells[key] = _Cell(stored)
+            cells[key].add(row[4], row[5], sign)
+
+    empty = [key for key, cell in cells.items() if cell.n <= 0]
+    conn.executemany("DELETE FROM rollup_cells WHERE level = ? AND make = ? AND model = ? AND year = ? AND fuel = ?", empty)
+    conn.executemany("INSERT OR REPLACE INTO rollup_cells VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", [
+        (*key, c.n, c.price_n, c.price_sum, c.km_n, c.km_sum, c.price_sketch.dumps(), c.km_sketch.dumps())
+        for key, c in cells.items() if c.n > 0])
+
+
+def apply(conn, rows):
+    """
+    Adds or updates listings: rows are (source, source_id, make, model, year, fuel, price_usd, km).
+    A listing already counted with the same values is skipped; with different values it is moved.
+    Returns the number of listings that changed.
+    """
+    adds, removes, members = [], [], []
+    for row in rows:
+        old = conn.execute('''
+            SELECT make, model, year, fuel, price_usd, km FROM rollup_members WHERE source = ? AND source_id = ?
+        ''', row[:2]).fetchone()
+        new = tuple(row[2:])
+        if old is not None and tuple(old) == new:
+            continue
+        if old is not None:
+            removes.append(tuple(old))
+        adds.append(new)
+        members.append(tuple(row))
+
+    _update(conn, adds, removes)
+    conn.executemany("INSERT OR REPLACE INTO rollup_members VALUES (?, ?, ?, ?, ?, ?, ?, ?)", members)
+    conn.commit()
+    return len(members)
+
+
+def refresh(conn, keys):
+    """
+    Brings the given (source, source_id) listings and their cross-site duplicates in line
+    with rows_for(): counted, moved, or taken out when removed or represented by a duplicate.
+    Returns the number of listings that changed.
+    """
+    keys = {(source, str(source_id)) for source, source_id in keys}
+    for source, source_id in list(keys):
+        keys.update(tuple(row) for row in conn.execute('''
+            SELECT o.source, o.source_id FROM listing_clusters c
+            JOIN listing_clusters o ON o.cluster_id = c.cluster_id AND o.source != c.source
+            WHERE c.source = ? AND c.source_id = ?
+        ''', (source, source_id)))
+    rows = rows_for(conn, keys)
+    changed = apply(conn, rows)
+    gone = keys - {(row[0], row[1]) for row in rows}
+    for source in history.SOURCES:
+        changed += remove(conn, source, [source_id for src, source_id in gone if src == source])
+    return changed
+
+
+def remove(conn, source, source_ids):
+    """Takes sold / removed listings out of the aggregates."""
+    removes, keys = [], []
+    for source_id in source_ids:
+        old = conn.execute('''
+            SELECT make, model, year, fuel, price_usd, km FROM rollup_members WHERE source = ? AND source_id = ?
+        ''', (source, str(source_id))).fetchone()
+        if old is not None:
+            removes.append(tuple(old))
+            keys.append((source, str(source_id)))
+    _update(conn, [], removes)
+    conn.executemany("DELETE FROM rollup_members WHERE source = ? AND source_id = ?", keys)
+    conn.commit()
+    return len(keys)
+
+
+def drop_removed(conn, source):
+    """After history.finish_crawl(): removes the listings it marked removed (same market.db).
+    Their duplicates on the other site, if still live, are counted in their place."""
+    ids = [row[0] for row in conn.execute('''
+        SELECT m.source_id FROM rollup_members m
+        JOIN listings l ON l.source = m.source AND l.source_id = m.source_id
+        WHERE m.source = ? AND l.removed_on IS NOT NULL
+    ''', (source,))]
+    removed = remove(conn, source, ids)
+    refresh(conn, [(source, source_id) for source_id in ids])
+    return removed
+
+
+# --- queries ---
+
+def stats(conn, make=None, model=None, year=None, fuel=None, group_by=None, quantiles=DEFAULT_QUANTILES):
+    """
+    Aggregates for the listings matching the given filters, one row per value of
+    `group_by` (default: the next level of make -> model -> year; a single row when
+    already at a year).
+    """
+    filters = {'make': make, 'model': model, 'year': year, 'fuel': fuel}
+    if group_by is None:
+        group_by = next((d for d in DRILL_DOWN if filters[d] is None), None)
+    if group_by is not None and group_by not in DIMENSIONS:
+        raise ValueError(f"group_by must be one of {DIMENSIONS}")
+
+    kept = [d for d in DIMENSIONS if filters[d] is not None or d == group_by]
+    query = '''
+        SELECT make, model, year, fuel, n, price_n, price_sum, km_n, km_sum, price_sketch, km_sketch
+        FROM rollup_cells WHERE level = ?
+    '''
+    params = [_level(kept)]
+    for d in DIMENSIONS:
+        if filters[d] is not None:
+            query += f" AND {d} = ?"
+            params.append(filters[d])
+
+    results = []
+    for row in conn.execute(query, params):
+        key = row[DIMENSIONS.index(group_by)] if group_by else None
+        cell = _Cell(row[4:])
+        results.append({
+            'group': group_by,
+            'value': key,
+            'count': cell.n,
+            'avg_price_usd': round(cell.price_sum / cell.price_n, 2) if cell.price_n else None,
+            'price_usd_quantiles': {str(q): _round(cell.price_sketch.quantile(q)) for q in quantiles},
+            'avg_km': round(cell.km_sum / cell.km_n, 1) if cell.km_n else None,
+            'km_quantiles': {str(q): _round(cell.km_sketch.quantile(q)) for q in quantiles},
+        })
+    results.sort(key=lambda r: -r['count'])
+    return results
+
+
+def _round(value):
+    return round(value, 2) if value is not None else None
+
+
+# --- backfill ---
+
+def sync(conn, verbose=True):
+    """Brings the rollups in line with the live listings in the vehicles table (first run,
+    or after missed ingests); removed or duplicate listings still counted are taken out."""
+    rows = rows_for(conn)
+    changed = apply(conn, rows)
+    present = {(r[0], r[1]) for r in rows}
+    removed = 0
+    for source in history.SOURCES:
+        known = {r[0] for r in conn.execute("SELECT source_id FROM rollup_members WHERE source = ?", (source,))}
+        removed += remove(conn, source, known - {sid for src, sid in present if src == source})
+    migrations.optimize(conn, analyze=True)
+    if verbose:
+        print(f"[*] Rollups: {changed} listings added/updated, {removed} removed")
+    return changed, removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild / catch up the market rollups from the vehicles table.")
+    parser.add_argument('--market-db', default=None, help="database (default: market.db)")
+    args = parser.parse_args()
+
+    conn = connect(args.market_db)
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'vehicles'").fetchone():
+        print("[!] No vehicles table yet: run common/listings.py first.")
+    else:
+        sync(conn)
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+"""
+Throughput telemetry for the scrapers.
+
+    telemetry = ScrapeTelemetry('autoam-pages')
+    with telemetry:                                # starts the periodic summary (and status page)
+        with telemetry.timer('request'):
+            response = requests.get(...)
+        telemetry.record_status(response.status_code)
+        with telemetry.timer('parse'):
+            ...
+
+Every SCRAPE_SUMMARY_SECONDS a one-line JSON summary is printed: requests/s (overall
+and over the last interval), status-code mix, per-stage latency percentiles and
+counters. The percentiles cover each stage's last LATENCY_WINDOW samples; count and
+total_s cover the whole run. Set SCRAPE_STATUS_PORT to also serve the same data on a
+local status page (http://127.0.0.1:<port>/ and /status.json).
+"""
+import json
+import os
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SUMMARY_SECONDS = float(os.getenv('SCRAPE_SUMMARY_SECONDS', '10'))
+STATUS_PORT = int(os.getenv('SCRAPE_STATUS_PORT', '0')) or None
+
+# Percentiles are computed over a sliding window of each stage's most recent samples
+# (not a uniform sample of the whole run), so they track the current latency
+LATENCY_WINDOW = 4096
+
+# Status codes worth calling out in the summary
+ALERT_STATUSES = {
+    419: "CSRF token expired - refresh CSRF_TOKEN / USER_SESSION_COOKIE",
+    403: "forbidden - possible block",
+    429: "throttled by the site",
+    503: "service unavailable / challenge page",
+}
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class ScrapeTelemetry:
+    def __init__(self, name, summary_seconds=SUMMARY_SECONDS, status_port=STATUS_PORT):
+        self.name = name
+        self.summary_seconds = summary_seconds
+        self.status_port = status_port
+
+        self._lock = threading.Lock()
+        self._started = time.time()
+        self._counters = Counter()
+        self._gauges = {}
+        self._statuses = Counter()
+        self._samples = {}
+        self._stage_totals = Counter()
+        self._stage_counts = Counter()
+
+        self._last_summary_at = self._started
+        self._last_summary_requests = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._server = None
+
+    # --- recording ---
+
+    def inc(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    def set_gauge(self, name, value):
+        """Current value of something that goes up and down (e.g. the concurrency limit)."""
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = deque(maxlen=LATENCY_WINDOW)
+            samples.append(seconds)
+            self._stage_totals[stage] += seconds
+            self._stage_counts[stage] += 1
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def record_status(self, status):
+        """Counts one finished request by status code (or a label like 'error' / 'challenge')."""
+        with self._lock:
+            self._statuses[str(status)] += 1
+            self._counters['requests'] += 1
+
+    # --- reporting ---
+
+    def snapshot(self):
+        now = time.time()
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            statuses = dict(self._statuses)
+            stages = {}
+            for stage, samples in self._samples.items():
+                ordered = sorted(samples)
+                stages[stage] = {
+                    'count': self._stage_counts[stage],
+                    'total_s': round(self._stage_totals[stage], 3),
+                    'p50_ms': round(percentile(ordered, 0.50) * 1000, 1),
+                    'p95_ms': round(percentile(ordered, 0.95) * 1000, 1),
+                    'p99_ms': round(percentile(ordered, 0.99) * 1000, 1),
+                }
+
+        elapsed = max(now - self._started, 1e-9)
+        requests_total = counters.get('requests', 0)
+        alerts = [f"{code}: {message} ({statuses[str(code)]}x)"
+                  for code, message in ALERT_STATUSES.items() if statuses.get(str(code))]
+        return {
+            'scraper': self.name,
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'uptime_s': round(elapsed, 1),
+            'requests': requests_total,
+            'rps': round(requests_total / elapsed, 2),
+            'statuses': statuses,
+            'counters': counters,
+            'gauges': gauges,
+            'stages': stages,
+            'alerts': alerts,
+        }
+
+    def summary(self):
+        """Snapshot plus the request rate since the previous summary."""
+        snap = self.snapshot()
+        now = time.time()
+        window = max(now - self._last_summary_at, 1e-9)
+        snap['rps_window'] = round((snap['requests'] - self._last_summary_requests) / window, 2)
+        self._last_summary_at = now
+        self._last_summary_requests = snap['requests']
+        return snap
+
+    def print_summary(self):
+        print(json.dumps(self.summary(), ensure_ascii=False), flush=True)
+
+    # --- lifecycle ---
+
+    def start(self):
+        if self.summary_seconds > 0:
+            self._thread = threading.Thread(target=self._summary_loop, name=f"{self.name}-telemetry", daemon=True)
+            self._thread.start()
+        if self.status_port:
+            self._server = ThreadingHTTPServer(('127.0.0.1', self.status_port), _status_handler(self))
+            threading.Thread(target=self._server.serve_forever, daemon=True).start()
+            print(f"[*] Status page on http://127.0.0.1:{self.status_port}/")
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=1)
+        if self._server:
+            self._server.shutdown()
+        self.print_summary()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _summary_loop(self):
+        while not self._stop.wait(self.summary_seconds):
+            self.print_summary()
+
+
+_STATUS_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="UTF-8"><title>{name}</title><meta http-equiv="refresh" content="2">
+<style>body{{font-family:monospace;margin:2em}} td{{padding:2px 12px}} .alert{{color:#b00}}</style></head>
+<body><h2>{name}</h2><p>uptime {uptime_s}s &middot; {requests} requests &middot; {rps} req/s</p>
+{alerts}<h3>Status codes</h3><table>{statuses}</table>
+<h3>Stages</h3><table><tr><td>stage</td><td>count</td><td>p50 ms</td><td>p95 ms</td><td>p99 ms</td></tr>{stages}</table>
+<h3>Counters</h3><table>{counters}</table>
+<h3>Gauges</h3><table>{gauges}</table></body></html>"""
+
+
+def _status_handler(telemetry):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            snap = telemetry.snapshot()
+            if self.path.startswith('/status.json'):
+                body, content_type = json.dumps(snap, ensure_ascii=False), 'application/json'
+            else:
+                body = _STATUS_PAGE.format(
+                    name=snap['scraper'], uptime_s=snap['uptime_s'], requests=snap['requests'], rps=snap['rps'],
+                    alerts=''.join(f'<p class="alert">{a}</p>' for a in snap['alerts']),
+                    statuses=''.join(f"<tr><td>{k}</td><td>{v}</td></tr>" for k, v in sorted(snap['statuses'].items())),
+                    stages=''.join(f"<tr><td>{k}</td><td>{v['count']}</td><td>{v['p50_ms']}</td><td>{v['p95_ms']}</td>"
+                                   f"<td>{v['p99_ms']}</td></tr>" for k, v in sorted(snap['stages'].items())),
+                    counters=''.join(f"<tr><td>{k}</td><td>{v}</td></tr>" for k, v in sorted(snap['counters'].items())),
+                    gauges=''.join(f"<tr><td>{k}</td><td>{v}</td></tr>" for k, v in sorted(snap['gauges'].items())),
+                )
+                content_type = 'text/html; charset=utf-8'
+            data = body.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass  # keep the scraper output clean
+
+    return Handler
@@ -1,222 +1,349 @@
+import os
 import sqlite3
-import re
-from flask import Flask, render_template, jsonify, request
-import requests
+import sys
+import threading
+from flask import Flask, Response, render_template, jsonify, request, send_from_directory, abort, stream_with_context
+
+import export
+import instrumentation
+import thumbnails
+from instrumentation import stage
+from response_cache import ResponseCache
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from common import history, listings, rollups
 
 app = Flask(__name__)
-DB_NAME = 'database.db'
+instrumentation.init_app(app)
+# market.db: the canonical vehicles table both scrapers ingest into (common/listings.py)
+DB_NAME = history.HISTORY_DB
 
-# --- 1. Custom SQLite Functions ---
+# --- 1. Exchange Rates ---
+# Prices are converted to USD at ingest (price_usd, which the price filters use). Live
+# rates are saved to market.db, which reprices the stored listings and later ingests.
 
 RATES = {"USD": 1.0, "EUR": 0.93, "AMD": 405.0, "RUB": 91.5}
+RATES_SOURCE = "default"  # "live" once update_rates() got an answer
+# Set LISTAM_LIVE_RATES=0 to stay offline (benchmarks, tests behind a firewall)
+LIVE_RATES = os.getenv('LISTAM_LIVE_RATES', '1') != '0'
 
 def update_rates():
-    global RATES
+    global RATES, RATES_SOURCE
+    import requests  # only this needs it, and it costs ~0.1 s of every worker boot
     try:
         # Free API for USD base rates
         url = "https://api.exchangerate-api.com/v4/latest/USD"
-        response = requests.get(url)
+        response = requests.get(url, timeout=10)
         data = response.json()
         
         RATES = data['rates']
+        RATES_SOURCE = "live"
         
         print("Live currency rates updated $, Դ, €, ₽:",RATES['USD'], RATES['AMD'],  RATES['EUR'], RATES['RUB'])
     except Exception as e:
         print(f"Could not fetch live rates, using defaults. Error: {e}")
+        return
+    conn = listings.connect(DB_NAME)
+    try:
+        print(f"Repriced {listings.save_rates(conn, RATES)} listings at the live rates")
+    finally:
+        conn.close()
 
-update_rates()
+# --- 2. Startup ---
+# Nothing slow happens at import. The first request (normally the readiness probe) starts
+# a background warm-up: schema setup, the first page and filter tree into the response
+# cache, then the live rates. /api/ready answers 503 until the data side is done.
 
+WARM = threading.Event()
+WARM_UP_ERROR = None
+_warm_up_lock = threading.Lock()
+_warm_up_thread = None
 
-def get_price_in_usd(p_text):
-    """
-    Parses price text and converts it to USD for sorting/filtering.
-    Returns 0 if N/A.
-    """
-    if not p_text or "N/A" in p_text: return 0
-    
-    clean = p_text.replace(',', '')
-    match = re.search(r'(\d+)', clean)
-    if not match: return 0
-    
-    val = float(match.group(1))
-    
-    # Convert to USD
-    if '֏' in clean or 'AMD' in clean:
-        return val / RATES["AMD"]
-    elif '€' in clean or 'EUR' in clean:
-        return val / RATES["EUR"]
-    elif '₽' in clean or 'RUB' in clean:
-        return val / RATES["RUB"]
-    
-    # Default is USD
-    return val
-
-def get_km_from_text(at_text):
-    if not at_text: return 0
-    match = re.search(r'([\d,]+)\s*(km|miles|mi)', at_text, re.IGNORECASE)
-    if not match: return 0
-    raw_num = float(match.group(1).replace(',', ''))
-    unit = match.group(2).lower()
-    if 'mi' in unit: return int(raw_num * 1.60934)
-    return int(raw_num)
-
-def check_fuel_match(at_text, desired_fuels_str):
-    if not desired_fuels_str: return True
-    if not at_text: return False
-    desired_list = desired_fuels_str.split(',')
-    text_lower = at_text.lower()
-    for fuel in desired_list:
-        if fuel.lower() in text_lower: return True
-    return False
-
-# --- 2. Standard Parsers (For Display) ---
-def parse_price(p_text):
-    # Same as before
-    if not p_text or "N/A" in p_text: return 0, "USD"
-    clean = p_text.replace(',', '')
-    match = re.search(r'(\d+)', clean)
-    if not match: return 0, "USD"
-    val = float(match.group(1))
-    cur = "USD"
-    if '֏' in clean or 'AMD' in clean: cur = "AMD"
-    elif '€' in clean or 'EUR' in clean: cur = "EUR"
-    elif '₽' in clean or 'RUB' in clean: cur = "RUB"
-    return val, cur
-
-def parse_l_text(l_text):
-    # Same as before
+def warm_up():
+    global WARM_UP_ERROR, _warm_up_thread
     try:
-        parts = l_text.split(',')
-        main = parts[0].strip()
-        spec = parts[1].strip() if len(parts) > 1 else ""
-        tokens = main.split(' ')
-        year = int(tokens[0]) if tokens[0].isdigit() else 0
-        make = tokens[1]
-        model = " ".join(tokens[2:])
-        return year, make, model, spec
-    except:
-        return 0, "Other", l_text, ""
-
-def parse_at_text(at_text):
-    # Same as before
-    km = get_km_from_text(at_text)
-    fuel = "Other"
-    if "Gasoline" in at_text: fuel = "Gasoline"
-    elif "Diesel" in at_text: fuel = "Diesel"
-    elif "Hybrid" in at_text: fuel = "Hybrid"
-    elif "Electric" in at_text: fuel = "Electric"
-    elif "LPG" in at_text: fuel = "LPG"
-    elif "CNG" in at_text: fuel = "CNG"
-    location = at_text.split(',')[0].strip()
-    return location, f"{km:,} km", fuel
+        get_db().close()  # creates / updates the market.db tables once
+        client = app.test_client()
+        for url in ('/api/vehicles', '/api/filter-options'):
+            client.get(url)
+        WARM_UP_ERROR = None
+        WARM.set()
+    except Exception as e:
+        WARM_UP_ERROR = str(e)
+        _warm_up_thread = None  # the next request tries again
+        print(f"[startup] Warm-up failed: {e}")
+        return
+    if LIVE_RATES:
+        update_rates()
+
+@app.before_request
+def _start_warm_up():
+    global _warm_up_thread
+    if _warm_up_thread is None:
+        with _warm_up_lock:
+            if _warm_up_thread is None:
+                _warm_up_thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+                _warm_up_thread.start()
+
+@app.route('/api/ready')
+def get_ready():
+    """Readiness probe: 200 once the warm-up finished, 503 while it runs or after it failed."""
+    body = {"ready": WARM.is_set(), "rates": RATES_SOURCE}
+    if WARM_UP_ERROR:
+        body["error"] = WARM_UP_ERROR
+    return jsonify(body), 200 if WARM.is_set() else 503
 
 # --- 3. Database & Routes ---
 
 def get_db():
-    conn = sqlite3.connect(DB_NAME)
+    conn = thumbnails.connect(DB_NAME)
     conn.row_factory = sqlite3.Row
-    conn.create_function("GET_KM", 1, get_km_from_text)
-    conn.create_function("CHECK_FUEL", 2, check_fuel_match)
-    conn.create_function("GET_PRICE_USD", 1, get_price_in_usd) # NEW FUNCTION
     return conn
 
+# data_version() runs on every cached request, so each serving thread keeps one plain
+# connection open for it (no schema setup, no connect per request). Outside a transaction
+# every read sees the latest committed version.
+_version_conn = threading.local()
+
+def data_version():
+    if getattr(_version_conn, 'path', None) != DB_NAME:
+        if getattr(_version_conn, 'conn', None) is not None:
+            _version_conn.conn.close()
+        _version_conn.conn, _version_conn.path = sqlite3.connect(DB_NAME), DB_NAME
+    return listings.data_version(_version_conn.conn)
+
+# Listing responses, dropped whenever a scraper writes (see response_cache.py)
+cache = ResponseCache(data_version)
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
 @app.route('/api/filter-options')
+@cache.cached()
 def get_filter_options():
     conn = get_db()
     cursor = conn.cursor()
-    cursor.execute("SELECT l_text FROM items") 
-    rows = cursor.fetchall()
+    with stage("db"):
+        rows = instrumentation.execute(cursor, """
+            SELECT COALESCE(make, 'Other') AS make, COALESCE(model, '') AS model, COUNT(*) AS n
+            FROM vehicles GROUP BY 1, 2
+        """)
     conn.close()
 
-    data_tree = {} 
-    for row in rows:
-        _, make, model, _ = parse_l_text(row['l_text'])
-        if make not in data_tree: data_tree[make] = {"count": 0, "models": {}}
-        data_tree[make]["count"] += 1
-        if model not in data_tree[make]["models"]: data_tree[make]["models"][model] = 0
-        data_tree[make]["models"][model] += 1
-
-    response = []
-    for make_name, make_data in sorted(data_tree.items()):
-        models_list = []
-        for mod_name, mod_count in sorted(make_data["models"].items()):
-            models_list.append({"name": mod_name, "count": mod_count})
-        response.append({"name": make_name, "count": make_data["count"], "models": models_list})
+    with stage("post"):
+        data_tree = {} 
+        for row in rows:
+            make, model = row['make'], row['model']
+            if make not in data_tree: data_tree[make] = {"count": 0, "models": {}}
+            data_tree[make]["count"] += row['n']
+            data_tree[make]["models"][model] = row['n']
+
+        response = []
+        for make_name, make_data in sorted(data_tree.items()):
+            models_list = []
+            for mod_name, mod_count in sorted(make_data["models"].items()):
+                models_list.append({"name": mod_name, "count": mod_count})
+            response.append({"name": make_name, "count": make_data["count"], "models": models_list})
     return jsonify(response)
 
-@app.route('/api/vehicles')
-def get_vehicles():
-    page = int(request.args.get('page', 1))
-    limit = 24
-    offset = (page - 1) * limit
-    
+def vehicle_filters(args):
+    """SQL conditions (to append after WHERE 1=1) and their params for the listing filters
+    shared by /api/vehicles and /api/export."""
     # Text Filters
-    req_make = request.args.get('make', '')
-    req_model = request.args.get('model', '')
-    req_fuel = request.args.get('fuel', '')
+    req_source = args.get('source', '')
+    req_make = args.get('make', '')
+    req_model = args.get('model', '')
+    req_fuel = args.get('fuel', '')
     
     # Numeric Filters
-    min_km = request.args.get('min_km', '')
-    max_km = request.args.get('max_km', '')
-    min_price_usd = request.args.get('min_price_usd', '') # Expects USD input
-    max_price_usd = request.args.get('max_price_usd', '') # Expects USD input
-
-    conn = get_db()
-    cursor = conn.cursor()
+    min_km = args.get('min_km', '')
+    max_km = args.get('max_km', '')
+    min_price_usd = args.get('min_price_usd', '') # Expects USD input
+    max_price_usd = args.get('max_price_usd', '') # Expects USD input
 
-    query = "SELECT * FROM items WHERE 1=1"
+    query = ""
     params = []
 
-    if req_make:
-        query += " AND l_text LIKE ?"
-        params.append(f"%{req_make}%")
+    if req_source:
+        query += " AND source = ?"
+        params.append(req_source)
+    # Exact matches on the canonical columns. /api/filter-options and the cards show a
+    # missing make (and fuel) as 'Other', so that value selects the NULL rows too.
+    if req_make == 'Other':
+        query += " AND make IS NULL"
+    elif req_make:
+        query += " AND make = ?"
+        params.append(req_make)
     if req_model:
-        query += " AND l_text LIKE ?"
-        params.append(f"%{req_model}%")
+        query += " AND model = ?"
+        params.append(req_model)
     if req_fuel:
-        query += " AND CHECK_FUEL(at_text, ?) = 1"
-        params.append(req_fuel)
+        fuels = req_fuel.split(',')
+        query += f" AND (fuel IN ({','.join('?' * len(fuels))})"
+        query += " OR fuel IS NULL)" if 'Other' in fuels else ")"
+        params.extend(fuels)
     if min_km:
-        query += " AND GET_KM(at_text) >= ?"
+        query += " AND mileage_km >= ?"
         params.append(int(min_km))
     if max_km:
-        query += " AND GET_KM(at_text) <= ?"
+        query += " AND mileage_km <= ?"
         params.append(int(max_km))
-        
-    # Price Filter (Using the new USD Converter)
     if min_price_usd:
-        query += " AND GET_PRICE_USD(p_text) >= ?"
+        query += " AND price_usd >= ?"
         params.append(float(min_price_usd))
     if max_price_usd:
-        query += " AND GET_PRICE_USD(p_text) <= ?"
+        query += " AND price_usd <= ?"
         params.append(float(max_price_usd))
+    return query, params
+
+@app.route('/api/vehicles')
+@cache.cached(defaults={'page': '1'}, lists=('fuel',))
+def get_vehicles():
+    try:
+        page = int(request.args.get('page', 1))
+        where, params = vehicle_filters(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    limit = 24
+    offset = (page - 1) * limit
+    
+    conn = get_db()
+    cursor = conn.cursor()
+
+    # Cached thumbnail (thumbnails.py) when there is one, so the grid doesn't hotlink list.am
+    query = f"""
+        SELECT v.*, i.hash AS thumb FROM vehicles v
+        LEFT JOIN images i ON i.url = v.image AND i.hash IS NOT NULL
+        WHERE 1=1 {where}
+    """
 
     query += f" LIMIT {limit} OFFSET {offset}"
     
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
+    with stage("db"):
+        rows = instrumentation.execute(cursor, query, params)
     conn.close()
 
-    results = []
-    for row in rows:
-        vid, img, p_txt, l_txt, at_txt = row[0], row[1], row[2], row[3], row[4]
-        price_val, price_cur = parse_price(p_txt)
-        year, make, model, engine = parse_l_text(l_txt)
-        loc, mil, fuel = parse_at_text(at_txt)
-        
-        results.append({
-            "id": vid, "image": img,
-            "price_raw": price_val, "currency_original": price_cur,
-            "year": year, "make": make, "model": model, "engine": engine,
-            "location": loc, "mileage": mil, "fuel": fuel
-        })
+    with stage("post"):
+        results = []
+        for row in rows:
+            results.append({
+                "id": row['source_id'], "source": row['source'], "url": row['url'],
+                "image": f"/thumbs/{row['thumb']}.webp" if row['thumb'] else row['image'] or "N/A", "image_src": row['image'],
+                "price_raw": row['price'] or 0, "currency_original": row['currency'] or "USD",
+                "year": row['year'] or 0, "make": row['make'] or "Other", "model": row['model'] or "",
+                "engine": row['engine'] or "", "location": row['location'] or "",
+                "mileage": f"{row['mileage_km'] or 0:,} km", "fuel": row['fuel'] or "Other"
+            })
 
     return jsonify(results)
 
+@app.route('/api/export.<fmt>')
+def export_vehicles(fmt):
+    """Every vehicle matching the /api/vehicles filters, streamed (see export.py)."""
+    if fmt not in export.FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(export.FORMATS)}"}), 404
+    try:
+        where, params = vehicle_filters(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    mimetype, extension = export.FORMATS[fmt]
+    response = Response(stream_with_context(export.stream(DB_NAME, where, params, fmt)), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="vehicles.{extension}"'
+    return response
+
+@app.route('/api/cache-stats')
+def get_cache_stats():
+    return jsonify(cache.stats())
+
+# Served thumbnails are recorded in memory and written to images.last_used in batches
+touches = thumbnails.Touches()
+
+@app.route('/thumbs/<digest>.webp')
+def get_thumbnail(digest):
+    """Content-addressed, so the browser and any proxy may keep it forever."""
+    if len(digest) != 64 or not all(c in '0123456789abcdef' for c in digest):
+        abort(404)
+    path = thumbnails.thumb_path(digest)
+    if not os.path.exists(path):
+        abort(404)
+    touches.add(digest, DB_NAME)
+    response = send_from_directory(os.path.dirname(path), os.path.basename(path),
+                                   mimetype='image/webp', max_age=365 * 24 * 3600)
+    response.headers['Cache-Control'] += ', immutable'
+    return response
+
+# --- 4. Price History (see common/history.py) ---
+
+def history_window(args):
+    """`days` and `limit` (capped at 1000) of the /api/history listings."""
+    try:
+        return int(args.get('days', 7)), min(int(args.get('limit', 100)), 1000)
+    except ValueError:
+        raise ValueError("days and limit must be integers")
+
+@app.route('/api/history/<source>/<source_id>')
+def get_listing_history(source, source_id):
+    """Status, days on market and price trajectory of one listing."""
+    if source not in history.SOURCES:
+        return jsonify({"error": f"unknown source {source}"}), 404
+    conn = history.connect(DB_NAME)
+    with stage("db"):
+        info = history.listing(conn, source, source_id)
+        if info:
+            info["prices"] = history.price_trajectory(conn, info["listing_key"])
+    conn.close()
+    if not info:
+        return jsonify({"error": "listing not found"}), 404
+    return jsonify(info)
+
+@app.route('/api/history/removed')
+def get_removed_listings():
+    """Listings that disappeared in the last `days` days (likely sold)."""
+    try:
+        days, limit = history_window(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    conn = history.connect(DB_NAME)
+    with stage("db"):
+        rows = history.removed_since(conn, history.today() - days, request.args.get('source'), limit)
+    conn.close()
+    return jsonify(rows)
+
+@app.route('/api/history/price-changes')
+def get_price_changes():
+    """Price changes in the last `days` days, newest first."""
+    try:
+        days, limit = history_window(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    conn = history.connect(DB_NAME)
+    with stage("db"):
+        rows = history.price_changes_since(conn, history.today() - days, request.args.get('source'), limit)
+    conn.close()
+    return jsonify(rows)
+
+# --- 5. Market Statistics (see common/rollups.py) ---
+
+@app.route('/api/stats')
+def get_market_stats():
+    """Count, average and quartiles of price (USD) and km per make, or per model of `make`,
+    per year of `model`; `group_by` overrides the level. Served from the rollup tables."""
+    year = request.args.get('year')
+    group_by = request.args.get('group_by')
+    if group_by and group_by not in rollups.DIMENSIONS:
+        return jsonify({"error": f"group_by must be one of {', '.join(rollups.DIMENSIONS)}"}), 400
+    try:
+        year = int(year) if year else None
+    except ValueError:
+        return jsonify({"error": "year must be an integer"}), 400
+    conn = rollups.connect(DB_NAME)
+    with stage("db"):
+        rows = rollups.stats(conn, request.args.get('make'), request.args.get('model'),
+                             year, request.args.get('fuel'), group_by)
+    conn.close()
+    return jsonify(rows)
+
 @app.route('/api/rates')
 def get_rates():
     return jsonify(RATES)
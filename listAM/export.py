@@ -0,0 +1,115 @@
+"""
+Streaming exports of the vehicles table (NDJSON, CSV or Arrow IPC) for /api/export.
+
+Rows are read in chunks of EXPORT_CHUNK_ROWS by keyset pagination on vehicle_id: each
+chunk is its own short query resuming after the last id sent, so a long export never
+holds a read lock the scrapers would wait on, and memory stays at one chunk whatever
+the size of the result.
+
+    for chunk in export.stream(DB_NAME, where, params, 'csv'):
+        ...   # bytes, ready to send
+"""
+import csv
+import io
+import json
+import sqlite3
+
+EXPORT_CHUNK_ROWS = 5_000
+
+# format -> (mimetype, file extension)
+FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+}
+
+
+def columns(conn):
+    """(name, declared type) of every vehicles column, in table order."""
+    return [(row[1], row[2].upper()) for row in conn.execute("PRAGMA table_info(vehicles)")]
+
+
+def chunks(db_path, where='', params=(), chunk_rows=EXPORT_CHUNK_ROWS):
+    """Yields lists of rows matching `where` (SQL after WHERE 1=1), in vehicle_id order."""
+    last_id = 0
+    while True:
+        conn = sqlite3.connect(db_path, timeout=30)
+        try:
+            rows = conn.execute(f'''
+                SELECT * FROM vehicles WHERE vehicle_id > ? {where}
+                ORDER BY vehicle_id LIMIT {int(chunk_rows)}
+            ''', (last_id, *params)).fetchall()
+        finally:
+            conn.close()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < chunk_rows:
+            return
+        last_id = rows[-1][0]
+
+
+def stream(db_path, where='', params=(), fmt='ndjson', chunk_rows=EXPORT_CHUNK_ROWS):
+    """Encoded export, one bytes object per chunk."""
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        cols = columns(conn)
+    finally:
+        conn.close()
+    encode = {'ndjson': _ndjson, 'csv': _csv, 'arrow': _arrow}[fmt]
+    yield from encode(cols, chunks(db_path, where, params, chunk_rows))
+
+
+def _ndjson(cols, row_chunks):
+    names = [name for name, _ in cols]
+    for rows in row_chunks:
+        yield ''.join(json.dumps(dict(zip(names, row)), ensure_ascii=False) + '\n' for row in rows).encode()
+
+
+def _csv(cols, row_chunks):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow([name for name, _ in cols])
+    for rows in row_chunks:
+        writer.writerows(rows)
+        yield out.getvalue().encode()
+        out.seek(0)
+        out.truncate()
+    if out.tell():
+        yield out.getvalue().encode()  # header only: nothing matched
+
+
+class _Sink:
+    """File-like object the Arrow stream writer writes into; drained after every batch."""
+
+    def __init__(self):
+        self.parts = []
+        self.closed = False
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data, self.parts = b''.join(self.parts), []
+        return data
+
+
+def _arrow(cols, row_chunks):
+    import pyarrow as pa  # only needed for this format
+
+    types = {'INTEGER': pa.int64(), 'REAL': pa.float64()}
+    schema = pa.schema([(name, types.get(decl, pa.string())) for name, decl in cols])
+    sink = _Sink()
+    writer = pa.ipc.new_stream(sink, schema)
+    for rows in row_chunks:
+        arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)]
+        writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+        yield sink.drain()
+    writer.close()
+    tail = sink.drain()  # end-of-stream marker (and the schema when nothing matched)
+    if tail:
+        yield tail
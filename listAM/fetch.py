@@ -0,0 +1,158 @@
+"""
+Fetch strategy for list.am pages: plain HTTP first, the browser only when needed.
+
+The category grid is static HTML, so a pooled requests session carrying the cookies
+and User-Agent of a real browser session (Cloudflare ties cf_clearance to both) gets
+the same page in one round trip. When the response is a challenge, the browser
+loads the page instead and its fresh cookies are copied back into the session.
+
+    fetcher = PageFetcher(HttpFetcher(), open_browser=lambda: BrowserSession(...))
+    html, via = fetcher.fetch(url)                      # via: 'http' or 'browser'
+    html, via = fetcher.fetch(url, force_browser=True)  # e.g. HTTP page had no listings
+"""
+import json
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from common.concurrency import THROTTLE_STATUSES, looks_like_challenge
+
+COOKIE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cookies.json')
+HTTP_TIMEOUT = 15
+HTTP_POOL_SIZE = 8
+
+# Used until a browser session has been harvested
+DEFAULT_USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                      '(KHTML, like Gecko) Chrome/144.0.0.0 Safari/537.36')
+
+# After this many HTTP attempts in a row that needed the browser, skip HTTP for
+# HTTP_COOLDOWN_PAGES pages before probing it again
+HTTP_MAX_FALLBACKS = 3
+HTTP_COOLDOWN_PAGES = 20
+
+_cookie_file_lock = threading.Lock()
+
+
+class HttpFetcher:
+    """requests.Session with a connection pool and the browser's cookies / User-Agent."""
+
+    def __init__(self, cookie_path=COOKIE_PATH, pool_size=HTTP_POOL_SIZE):
+        self.cookie_path = cookie_path
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'User-Agent': DEFAULT_USER_AGENT,
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+            'Accept-Language': 'en-US,en;q=0.9',
+        })
+        self.load_cookies()
+
+    def get(self, url):
+        return self.session.get(url, timeout=HTTP_TIMEOUT)
+
+    def use_browser_session(self, cookies, user_agent, save=True):
+        """cookies: the list of dicts returned by driver.get_cookies()."""
+        for c in cookies:
+            self.session.cookies.set(c['name'], c['value'], domain=c.get('domain'), path=c.get('path', '/'))
+        if user_agent:
+            self.session.headers['User-Agent'] = user_agent
+        if save:
+            self.save_cookies(cookies, user_agent)
+
+    def load_cookies(self):
+        if not self.cookie_path or not os.path.exists(self.cookie_path):
+            return
+        try:
+            with open(self.cookie_path, encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.use_browser_session(saved.get('cookies', []), saved.get('user_agent'), save=False)
+
+    def save_cookies(self, cookies, user_agent):
+        if not self.cookie_path:
+            return
+        tmp = f"{self.cookie_path}.{threading.get_ident()}.tmp"
+        with _cookie_file_lock:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'user_agent': user_agent, 'cookies': cookies}, f)
+            os.replace(tmp, self.cookie_path)
+
+
+def needs_browser(response):
+    """True if an HTTP response is a challenge / block rather than the real page."""
+    if response.status_code in THROTTLE_STATUSES or response.status_code == 403:
+        return True
+    return looks_like_challenge(response.status_code, response.headers, response.text)
+
+
+class PageFetcher:
+    """
+    Tries `http` (an HttpFetcher, or None for browser-only) and falls back to the browser
+    returned by `open_browser()`, which must provide load(url) -> html, harvest() ->
+    (cookies, user_agent) and quit(). The browser is only started on the first fallback.
+    """
+
+    def __init__(self, http, open_browser, telemetry=None):
+        self.http = http
+        self._open_browser = open_browser
+        self.browser = None
+        self.telemetry = telemetry
+        self._fallbacks_in_a_row = 0
+        self._skip_http = 0
+
+    def fetch(self, url, force_browser=False):
+        if self.http and not force_browser:
+            if self._skip_http > 0:
+                self._skip_http -= 1
+            else:
+                html = self._fetch_http(url)
+                if html is not None:
+                    self._fallbacks_in_a_row = 0
+                    return html, 'http'
+                self._fallbacks_in_a_row += 1
+                if self._fallbacks_in_a_row >= HTTP_MAX_FALLBACKS:
+                    # Fresh cookies didn't help (IP / fingerprint level block): stay in the browser a while
+                    self._skip_http = HTTP_COOLDOWN_PAGES
+                    self._fallbacks_in_a_row = 0
+                    self._inc('http_cooldowns')
+        return self._fetch_browser(url), 'browser'
+
+    def _fetch_http(self, url):
+        try:
+            if self.telemetry:
+                with self.telemetry.timer('http'):
+                    response = self.http.get(url)
+            else:
+                response = self.http.get(url)
+        except requests.RequestException:
+            self._inc('http_errors')
+            return None
+        self._inc(f"http_{response.status_code}")
+        if needs_browser(response):
+            self._inc('http_challenges')
+            return None
+        return response.text
+
+    def _fetch_browser(self, url):
+        if self.browser is None:
+            self.browser = self._open_browser()
+        html = self.browser.load(url)
+        self._inc('browser_pages')
+        if self.http:
+            cookies, user_agent = self.browser.harvest()
+            self.http.use_browser_session(cookies, user_agent)
+        return html
+
+    def close(self):
+        if self.browser is not None:
+            self.browser.quit()
+            self.browser = None
+
+    def _inc(self, name):
+        if self.telemetry:
+            self.telemetry.inc(name)
@@ -0,0 +1,183 @@
+"""
+Request instrumentation for the listAM API.
+
+- per-stage timers (`with stage('db'): ...`) reported in a Server-Timing header
+- EXPLAIN QUERY PLAN captured for queries slower than SLOW_QUERY_MS, the latest
+  SLOW_QUERY_LOG_SIZE served as JSON at /debug/slow-queries
+- aggregates served at /metrics in Prometheus text format
+
+Everything is in-process and per worker; no extra dependencies.
+"""
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from flask import Response, g, has_request_context, jsonify, request
+
+# Queries slower than this are logged with their query plan
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '200'))
+SLOW_QUERY_LOG_SIZE = 50
+
+# Histogram buckets in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.total += seconds
+        self.count += 1
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+
+
+class Metrics:
+    """Thread-safe counters and histograms keyed by (name, labels)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.slow_queries = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+
+    def inc(self, name, labels=(), value=1):
+        key = (name, tuple(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, seconds):
+        key = (name, tuple(labels))
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = Histogram()
+            hist.observe(seconds)
+
+    def log_slow_query(self, entry):
+        with self._lock:
+            self.slow_queries.append(entry)
+
+    def slow_query_log(self):
+        """The logged slow queries, newest first."""
+        with self._lock:
+            return list(reversed(self.slow_queries))
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((k, (list(h.counts), h.total, h.count)) for k, h in self.histograms.items())
+
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{_labels(labels)} {value}")
+
+        for (name, labels), (counts, total, count) in histograms:
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            cumulative = 0
+            for bound, c in zip(BUCKETS, counts):
+                cumulative += c
+                lines.append(f"{name}_bucket{_labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{_labels(labels)} {total:.6f}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+metrics = Metrics()
+
+
+# --- per-request state ---
+
+def _route():
+    return request.url_rule.rule if request.url_rule else "unmatched"
+
+
+@contextmanager
+def stage(name):
+    """Times a block of the current request (e.g. 'db', 'post') and records it per route."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        if has_request_context():
+            g.timings[name] = g.timings.get(name, 0.0) + elapsed
+            metrics.observe("listam_stage_duration_seconds", (("route", _route()), ("stage", name)), elapsed)
+
+
+def execute(cursor, query, params=()):
+    """cursor.execute + fetchall, logging the query plan when it is slower than SLOW_QUERY_MS."""
+    start = time.perf_counter()
+    cursor.execute(query, params)
+    rows = cursor.fetchall()
+    elapsed = time.perf_counter() - start
+
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        plan = [row[-1] for row in cursor.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()]
+        entry = {
+            'route': _route() if has_request_context() else None,
+            'ms': round(elapsed * 1000, 1),
+            'rows': len(rows),
+            'query': query,
+            'params': list(params),
+            'plan': plan,
+        }
+        metrics.log_slow_query(entry)
+        metrics.inc("listam_slow_queries_total", (("route", entry['route']),))
+        print(f"[slow query] {entry['ms']} ms, {len(rows)} rows: {query} {list(params)}")
+        for step in plan:
+            print(f"    plan: {step}")
+    return rows
+
+
+# --- Flask wiring ---
+
+def init_app(app):
+    @app.before_request
+    def _start_timer():
+        g.request_start = time.perf_counter()
+        g.timings = {}
+
+    @app.after_request
+    def _record(response):
+        if 'request_start' not in g:
+            return response
+        total = time.perf_counter() - g.request_start
+        route = _route()
+        metrics.observe("listam_request_duration_seconds", (("route", route),), total)
+        metrics.inc("listam_requests_total", (("route", route), ("status", response.status_code)))
+
+        timing = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in g.timings.items()]
+        timing.append(f"total;dur={total * 1000:.1f}")
+        response.headers['Server-Timing'] = ", ".join(timing)
+        return response
+
+    @app.route('/metrics')
+    def prometheus_metrics():
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+    @app.route('/debug/slow-queries')
+    def slow_queries():
+        """The last SLOW_QUERY_LOG_SIZE slow queries with their plans (this worker only)."""
+        return jsonify({"threshold_ms": SLOW_QUERY_MS, "queries": metrics.slow_query_log()})
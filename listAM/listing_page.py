@@ -0,0 +1,54 @@
+"""
+Parsing of a list.am category page (the `div.gl` grid of listings).
+
+Kept free of the browser so it can be run on saved HTML:
+
+    with open('page.html') as f:
+        items = parse_listing_page(f.read())   # [(id, image_src, p_text, l_text, at_text), ...]
+"""
+from bs4 import BeautifulSoup
+
+
+def parse_listing_page(html):
+    """Returns the listings on a category page as items-table rows. An empty list means
+    the grid was missing (end of results, or more often a soft block / challenge page)."""
+    soup = BeautifulSoup(html, 'html.parser')
+    containers = soup.find_all('div', class_='gl')
+
+    extracted_items = []
+    for container in containers:
+        for link in container.find_all('a'):
+            item = parse_link(link)
+            if item:
+                extracted_items.append(item)
+    return extracted_items
+
+
+def parse_link(link):
+    href = link.get('href')
+    if not href:
+        return None
+    try:
+        item_id = href.split('/item/')[1].split('?')[0]
+    except IndexError:
+        return None
+
+    img_tag = link.find('img')
+    img_src = "N/A"
+    if img_tag:
+        raw_src = img_tag.get('data-original') or img_tag.get('src')
+        if raw_src and raw_src.startswith('//'):
+            img_src = 'https:' + raw_src
+        elif raw_src:
+            img_src = raw_src
+
+    p_text = _div_text(link, 'p')
+    l_text = _div_text(link, 'l')
+    at_text = _div_text(link, 'at')
+    return (item_id, img_src, p_text, l_text, at_text)
+
+
+def _div_text(link, class_name):
+    div = link.find('div', class_=class_name)
+    return div.get_text(strip=True) if div else "N/A"
+
@@ -0,0 +1,208 @@
+"""
+Response cache for the listAM API.
+
+Most traffic is the same few filter combinations (a popular make, a price band, page 1),
+so finished JSON bodies are kept per canonicalized query string:
+
+- in process: an LRU of up to CACHE_SIZE bodies, each valid for CACHE_TTL seconds
+- optionally on disk (LISTAM_CACHE_DIR), shared by every worker on the machine
+
+Entries are tied to market.db's data version (common/listings.py), which the scrapers
+bump after every write, so a crawl batch invalidates the whole cache at once instead of
+waiting for the TTL.
+
+    cache = ResponseCache(version=lambda: listings.data_version(conn))
+
+    @app.route('/api/vehicles')
+    @cache.cached(defaults={'page': '1'}, lists=('fuel',))
+    def get_vehicles(): ...
+
+Hits and misses are counted in cache.stats() and in /metrics.
+"""
+import functools
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Response, make_response, request
+
+from instrumentation import metrics
+
+CACHE_SIZE = int(os.getenv('LISTAM_CACHE_SIZE', 1024))
+CACHE_TTL = float(os.getenv('LISTAM_CACHE_TTL', 300))
+# Shared tier for multi-worker deployments; off unless set
+CACHE_DIR = os.getenv('LISTAM_CACHE_DIR') or None
+# Remove expired and stale files from CACHE_DIR after this many writes
+PRUNE_EVERY = 500
+
+
+def canonical_key(path, args, defaults=None, lists=()):
+    """
+    The cache key of a request: `path` plus its query args with empty values and values
+    equal to `defaults` dropped and the rest sorted, so '?make=Kia&page=1' and
+    '?page=&make=Kia' share an entry. Comma-separated `lists` params are sorted too.
+    """
+    defaults = defaults or {}
+    items = []
+    for name in sorted(set(args)):
+        value = ','.join(v.strip() for v in args.getlist(name) if v.strip())
+        if name in lists:
+            value = ','.join(sorted({v.strip() for v in value.split(',') if v.strip()}))
+        if value and value != defaults.get(name):
+            items.append(f"{name}={value}")
+    return f"{path}?{'&'.join(items)}"
+
+
+class ResponseCache:
+    """LRU + TTL cache of response bodies, invalidated when `version()` changes."""
+
+    def __init__(self, version, maxsize=CACHE_SIZE, ttl=CACHE_TTL, cache_dir=CACHE_DIR):
+        self.version = version
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.cache_dir = cache_dir
+        self.entries = OrderedDict()  # key -> (expires, body)
+        self.current = None  # data version the entries belong to
+        self.counts = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'invalidations': 0}
+        self._lock = threading.Lock()
+        self._writes = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    # --- lookups ---
+
+    def get(self, key, version=None):
+        """(body, 'memory' | 'disk') for a fresh entry, else (None, None)."""
+        version = self.version() if version is None else version
+        now = time.monotonic()
+        with self._lock:
+            if version != self.current:
+                if self.current is not None:
+                    self.counts['invalidations'] += 1
+                self.entries.clear()
+                self.current = version
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > now:
+                self.entries.move_to_end(key)
+                self.counts['hits'] += 1
+                return entry[1], 'memory'
+            self.entries.pop(key, None)
+
+        body = self._read_disk(version, key)
+        with self._lock:
+            if body is None:
+                self.counts['misses'] += 1
+                return None, None
+            self.counts['disk_hits'] += 1
+            self._remember(version, key, body, now)
+        return body, 'disk'
+
+    def put(self, key, body, version=None):
+        version = self.version() if version is None else version
+        with self._lock:
+            self._remember(version, key, body, time.monotonic())
+        self._write_disk(version, key, body)
+
+    def _remember(self, version, key, body, now):
+        if version != self.current:
+            return  # data changed while the response was being built
+        self.entries[key] = (now + self.ttl, body)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self.counts)
+            counts['entries'] = len(self.entries)
+            counts['version'] = self.current
+        lookups = counts['hits'] + counts['disk_hits'] + counts['misses']
+        counts['hit_ratio'] = round((counts['hits'] + counts['disk_hits']) / lookups, 4) if lookups else None
+        counts['disk'] = self.cache_dir
+        return counts
+
+    # --- shared disk tier ---
+
+    def _path(self, version, key):
+        # The version prefix lets prune() drop stale files without reading them
+        return os.path.join(self.cache_dir, f"{version}-{hashlib.sha256(key.encode()).hexdigest()}.json")
+
+    def _read_disk(self, version, key):
+        if not self.cache_dir:
+            return None
+        path = self._path(version, key)
+        try:
+            if os.path.getmtime(path) + self.ttl < time.time():
+                return None
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write_disk(self, version, key, body):
+        if not self.cache_dir:
+            return
+        path = self._path(version, key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(body)
+            os.replace(tmp, path)  # atomic, so other workers never read half a body
+        except OSError:
+            return
+        with self._lock:
+            self._writes += 1
+            run_prune = self._writes % PRUNE_EVERY == 0
+        if run_prune:
+            self.prune(version)
+
+    def prune(self, version=None):
+        """Deletes disk entries that are expired or belong to another data version."""
+        if not self.cache_dir:
+            return 0
+        version = self.version() if version is None else version
+        deleted = 0
+        cutoff = time.time() - self.ttl
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            try:
+                if not name.startswith(f"{version}-") or os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    deleted += 1
+            except OSError:
+                pass  # another worker got there first
+        return deleted
+
+    # --- Flask wiring ---
+
+    def cached(self, defaults=None, lists=()):
+        """Decorator for a JSON view; only 200 responses are stored."""
+        def decorate(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                route = request.url_rule.rule if request.url_rule else request.path
+                key = canonical_key(request.path, request.args, defaults, lists)
+                version = self.version()
+                body, tier = self.get(key, version)
+                if body is not None:
+                    metrics.inc("listam_cache_requests_total", (("route", route), ("result", f"{tier}_hit")))
+                    response = Response(body, mimetype='application/json')
+                    response.headers['X-Cache'] = f"HIT ({tier})"
+                    return response
+
+                metrics.inc("listam_cache_requests_total", (("route", route), ("result", "miss")))
+                response = make_response(view(*args, **kwargs))
+                if response.status_code == 200:
+                    # Stored under the version read before the query, so a write racing
+                    # with it leaves an entry the next lookup already treats as stale
+                    self.put(key, response.get_data(), version)
+                response.headers['X-Cache'] = "MISS"
+                return response
+            return wrapper
+        return decorate
@@ -1,121 +1,394 @@
+import argparse
+import os
+import queue
 import sqlite3
+import sys
+import threading
 import time
-import random
-import undetected_chromedriver as uc
-from bs4 import BeautifulSoup
+from datetime import date
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from common import dedup, history, listings, migrations, rollups
+from common.concurrency import AdaptiveDelay
+from common.telemetry import ScrapeTelemetry
+from fetch import HttpFetcher, PageFetcher
+from thumbnails import Downloader
+from listing_page import parse_listing_page
 
 #CONFIGURATION
 BASE_URL = "https://www.list.am/en/category/23"
 TOTAL_PAGES = 250
 DB_NAME = 'database.db'
 
+# Sharded mode: each worker has its own HTTP session and, when it needs one, its own
+# browser with its own profile directory
+DEFAULT_WORKERS = 1
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles')
+# Seconds between worker start-ups, so the browsers don't all hit the site at once
+WORKER_STAGGER = 10
+
+# A soft-blocked page goes back to the queue until it has been tried this many times
+MAX_PAGE_ATTEMPTS = 5
+# A worker whose browser keeps failing gives up after this many errors in a row
+MAX_CONSECUTIVE_ERRORS = 3
+
+# The writer commits when it has this many items, or after WRITE_FLUSH_SECONDS
+WRITE_BATCH_SIZE = 500
+WRITE_FLUSH_SECONDS = 5
+
+# Pause per page (split across the two scrolls); shrinks while pages load cleanly,
+# doubles on a Cloudflare challenge or soft block. One per worker.
+INITIAL_PAGE_DELAY = 4.5
+# Same for pages fetched over plain HTTP (see fetch.py), which need no scrolling
+INITIAL_HTTP_DELAY = 1.5
+
+# Threads downloading listing images into the local thumbnail cache (see thumbnails.py)
+THUMB_WORKERS = 4
+
+# Fetch latency (http / browser) and page outcomes (ok / soft_block / error), see common/telemetry.py
+telemetry = ScrapeTelemetry('listam')
+# Any of these during the run means some listings may not have reached market.db, so
+# unseen listings are not marked removed
+INCOMPLETE_COUNTERS = ('db_errors', 'ingest_errors')
+
 #DATABASE SETUP
+def connect():
+    return sqlite3.connect(DB_NAME, timeout=30)
+
 def init_db():
-    conn = sqlite3.connect(DB_NAME)
+    """Creates / migrates the items and page_queue tables (common/migrations.py)."""
+    conn = connect()
+    migrations.migrate(conn, migrations.LISTAM)
+    conn.close()
+
+def save_items(items, pages_done=(), market_conn=None):
+    """Writes a batch of items and marks their pages done, in one transaction.
+    With `market_conn` (market.db), the committed items are then ingested into the canonical
+    vehicles table, which records the prices and updates the rollups (common/listings.py).
+    Failures are counted and printed, never raised, so the writer thread keeps going; items
+    that didn't reach vehicles are picked up by the next backfill (python common/listings.py)."""
+    if not items and not pages_done: return
+    with telemetry.timer('db'):
+        conn = connect()
+        cursor = conn.cursor()
+        try:
+            cursor.executemany('''
+                INSERT OR REPLACE INTO items (id, image_src, p_text, l_text, at_text)
+                VALUES (?, ?, ?, ?, ?)
+            ''', items)
+            cursor.executemany('''
+                UPDATE page_queue SET status = 'done', items = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE page = ?
+            ''', [(count, page) for page, count in pages_done])
+            conn.commit()
+            telemetry.inc('items_saved', len(items))
+        except Exception as e:
+            telemetry.inc('db_errors')
+            print(f"DB Error: {e}")
+            return
+        finally:
+            conn.close()
+    if market_conn is not None and items:
+        with telemetry.timer('ingest'):
+            try:
+                listings.ingest(market_conn, listings.from_listam_batch(items))
+            except Exception as e:
+                market_conn.rollback()
+                telemetry.inc('ingest_errors')
+                print(f"Ingest Error ({len(items)} items kept in {DB_NAME}): {e}")
+
+#PAGE QUEUE
+def init_queue(total_pages, reset=False):
+    conn = connect()
     cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS items (
-            id TEXT PRIMARY KEY,
-            image_src TEXT,
-            p_text TEXT,
-            l_text TEXT,
-            at_text TEXT
-        )
-    ''')
+    cursor.executemany("INSERT OR IGNORE INTO page_queue (page) VALUES (?)",
+                       [(page,) for page in range(1, total_pages + 1)])
+    if reset:
+        cursor.execute("UPDATE page_queue SET status = 'pending', attempts = 0, items = NULL, updated_at = CURRENT_TIMESTAMP")
+    else:
+        # Pages claimed by a run that was killed, or that ran out of attempts last time
+        cursor.execute("UPDATE page_queue SET status = 'pending', attempts = 0 WHERE status IN ('in_progress', 'failed')")
     conn.commit()
     conn.close()
 
-def save_items(items):
-    if not items: return
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+def claim_page():
+    """Atomically takes the next pending page (fewest attempts first). None when the queue is empty."""
+    conn = connect()
+    conn.isolation_level = None
     try:
-        cursor.executemany('''
-            INSERT OR REPLACE INTO items (id, image_src, p_text, l_text, at_text)
-            VALUES (?, ?, ?, ?, ?)
-        ''', items)
-        conn.commit()
-    except Exception as e:
-        print(f"DB Error: {e}")
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute('''
+            SELECT page, attempts FROM page_queue WHERE status = 'pending'
+            ORDER BY attempts, page LIMIT 1
+        ''').fetchone()
+        if row:
+            conn.execute('''
+                UPDATE page_queue SET status = 'in_progress', attempts = attempts + 1, updated_at = CURRENT_TIMESTAMP
+                WHERE page = ?
+            ''', (row[0],))
+        conn.execute("COMMIT")
+        return (row[0], row[1] + 1) if row else None
+    finally:
+        conn.close()
+
+def release_page(page, attempts):
+    """Puts a soft-blocked / failed page back in the queue, or gives up on it."""
+    status = 'pending' if attempts < MAX_PAGE_ATTEMPTS else 'failed'
+    conn = connect()
+    conn.execute("UPDATE page_queue SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE page = ?", (status, page))
+    conn.commit()
     conn.close()
+    return status
+
+def queue_started_day():
+    """Day the current crawl started (its oldest page update), as a date ordinal.
+    updated_at is SQLite's UTC CURRENT_TIMESTAMP, converted to the local day that
+    history.today() counts in."""
+    conn = connect()
+    started = conn.execute("SELECT date(MIN(updated_at), 'localtime') FROM page_queue").fetchone()[0]
+    conn.close()
+    return date.fromisoformat(started).toordinal() if started else history.today()
+
+def queue_end_page():
+    """First page that came back shorter than a full page, i.e. where the category ends.
+    None when every saved page was full: the crawl stopped at the page limit, not at the
+    end. (An empty page can't mark the end: it is retried as a soft block.)"""
+    conn = connect()
+    end = conn.execute('''
+        SELECT MIN(page) FROM page_queue
+        WHERE status = 'done' AND items < (SELECT MAX(items) FROM page_queue WHERE status = 'done')
+    ''').fetchone()[0]
+    conn.close()
+    return end
+
+def queue_counts(up_to=None):
+    """{status: pages}, counting only pages up to `up_to` when given."""
+    conn = connect()
+    if up_to is None:
+        rows = conn.execute("SELECT status, COUNT(*) FROM page_queue GROUP BY status").fetchall()
+    else:
+        rows = conn.execute("SELECT status, COUNT(*) FROM page_queue WHERE page <= ? GROUP BY status", (up_to,)).fetchall()
+    conn.close()
+    return dict(rows)
+
+#WRITER
+class BatchWriter(threading.Thread):
+    """Single writer: workers hand over parsed pages and never touch the items table themselves."""
+
+    def __init__(self, thumbs=None):
+        super().__init__(name='listam-writer', daemon=True)
+        self.pages = queue.Queue()
+        self.thumbs = thumbs
+
+    def put(self, page, items):
+        self.pages.put((page, items))
+
+    def close(self):
+        self.pages.put(None)
+        self.join()
+
+    def run(self):
+        market_conn = listings.connect()
+        items, pages_done = [], []
+        deadline = time.monotonic() + WRITE_FLUSH_SECONDS
+        while True:
+            try:
+                entry = self.pages.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                entry = ()
+            if entry:
+                page, page_items = entry
+                items.extend(page_items)
+                pages_done.append((page, len(page_items)))
+            if entry is None or len(items) >= WRITE_BATCH_SIZE or time.monotonic() >= deadline:
+                save_items(items, pages_done, market_conn)
+                if self.thumbs is not None:
+                    self.thumbs.submit([item[1] for item in items if item[1] != "N/A"])
+                items, pages_done = [], []
+                deadline = time.monotonic() + WRITE_FLUSH_SECONDS
+            if entry is None:
+                # End of the run: match the new items against auto.am, so the market stats
+                # count each car once (common/dedup.py), and planner statistics for what
+                # was loaded (common/migrations.py)
+                dedup.run(market_conn)
+                migrations.optimize(market_conn)
+                market_conn.close()
+                conn = connect()
+                migrations.optimize(conn)
+                conn.close()
+                return
+
+#BROWSER WORKERS
+# Starting several uc.Chrome instances at once races on the patched chromedriver binary
+_browser_start_lock = threading.Lock()
+
+def start_browser(worker_id):
+    import undetected_chromedriver as uc
 
-def main():
-    init_db()
-    
-    #SETUP UNDETECTED CHROME
     options = uc.ChromeOptions()
-    
-    print("Starting Browser...")
-    driver = uc.Chrome(options=options, version_main=144, use_subprocess=True)
-    
+    profile = os.path.join(PROFILE_DIR, f"worker-{worker_id}")
+    os.makedirs(profile, exist_ok=True)
+    with _browser_start_lock:
+        return uc.Chrome(options=options, user_data_dir=profile, version_main=144, use_subprocess=True)
+
+class BrowserSession:
+    """One worker's uc.Chrome, driven like a person would (see fetch.PageFetcher)."""
+
+    def __init__(self, worker_id, delay, tag):
+        print(f"{tag} Starting Browser...")
+        self.driver = start_browser(worker_id)
+        self.delay = delay
+        self.tag = tag
+
+    def load(self, url):
+        with telemetry.timer('browser'):
+            self.driver.get(url)
+
+        #Check for Cloudflare/CAPTCHA
+        title = self.driver.title
+        if "Just a moment" in title or "Security" in title:
+            telemetry.inc('challenges')
+            self.delay.backoff()
+            print(f"{self.tag} Cloudflare detected. Waiting 15s for auto-redirect (page delay now {self.delay.delay:.1f}s)")
+            time.sleep(15)
+
+        #Human-like Scroll
+        self.driver.execute_script("window.scrollTo(0, 500);")
+        self.delay.sleep(0.5)
+        self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight/2);")
+        self.delay.sleep(0.5)
+        return self.driver.page_source
+
+    def harvest(self):
+        """Cookies and User-Agent for the HTTP session (cf_clearance only works with the same UA)."""
+        return self.driver.get_cookies(), self.driver.execute_script("return navigator.userAgent")
+
+    def quit(self):
+        print(f"{self.tag} Closing Driver...")
+        self.driver.quit()
+
+def worker(worker_id, writer, use_http=True):
+    tag = f"[w{worker_id}]"
+    time.sleep(worker_id * WORKER_STAGGER)
+    browser_delay = AdaptiveDelay(initial=INITIAL_PAGE_DELAY, min_delay=2.0, max_delay=90.0, step=0.1)
+    http_delay = AdaptiveDelay(initial=INITIAL_HTTP_DELAY, min_delay=0.5, max_delay=60.0, step=0.05)
+    fetcher = PageFetcher(HttpFetcher() if use_http else None,
+                          open_browser=lambda: BrowserSession(worker_id, browser_delay, tag),
+                          telemetry=telemetry)
+    errors = 0
+
     try:
-        for page_num in range(1, TOTAL_PAGES + 1):
-            
+        while True:
+            claimed = claim_page()
+            if claimed is None:
+                break
+            page_num, attempts = claimed
             url = BASE_URL if page_num == 1 else f"{BASE_URL}/{page_num}"
-            
-            print(f"Navigating to Page {page_num}...")
-            driver.get(url)
-            
-            #Check for Cloudflare/CAPTCHA
-            title = driver.title
-            if "Just a moment" in title or "Security" in title:
-                print("Cloudflare detected. Waiting 15s for auto-redirect")
-                time.sleep(15)
-            
-            #Human-like Scroll
-            driver.execute_script("window.scrollTo(0, 500);")
-            time.sleep(random.uniform(1.5, 3.0))
-            driver.execute_script("window.scrollTo(0, document.body.scrollHeight/2);")
-            time.sleep(random.uniform(1.5, 3.0))
-            
-            #Parse
-            soup = BeautifulSoup(driver.page_source, 'html.parser')
-            containers = soup.find_all('div', class_='gl')
-            
-            if not containers:
-                print(f"Page {page_num}: No items found (Possible soft block). Waiting 10s...")
-                time.sleep(10)
+            print(f"{tag} Fetching Page {page_num} (attempt {attempts})...")
+
+            try:
+                html, via = fetcher.fetch(url)
+                with telemetry.timer('parse'):
+                    extracted_items = parse_listing_page(html)
+                if not extracted_items and via == 'http':
+                    # A 200 without the grid can still be a block page the browser gets past
+                    html, via = fetcher.fetch(url, force_browser=True)
+                    with telemetry.timer('parse'):
+                        extracted_items = parse_listing_page(html)
+            except Exception as e:
+                errors += 1
+                telemetry.record_status('error')
+                print(f"{tag} Error on page {page_num}: {e}")
+                release_page(page_num, attempts)
+                if errors >= MAX_CONSECUTIVE_ERRORS:
+                    print(f"{tag} {errors} errors in a row, stopping this worker.")
+                    break
+                continue
+            errors = 0
+            delay = http_delay if via == 'http' else browser_delay
+            telemetry.inc(f'via_{via}')
+
+            if not extracted_items:
+                telemetry.record_status('soft_block')
+                status = release_page(page_num, attempts)
+                delay.backoff(10)
+                print(f"{tag} Page {page_num}: No items found (Possible soft block, page {status}). "
+                      f"Waiting {delay.delay:.0f}s...")
+                time.sleep(delay.delay)
                 continue
 
-            #Extract
-            extracted_items = []
-            all_links = []
-            for container in containers:
-                all_links.extend(container.find_all('a'))
-                
-            for link in all_links:
-                href = link.get('href')
-                if not href: continue
-                try:
-                    item_id = href.split('/item/')[1].split('?')[0]
-                except IndexError:
-                    continue
-
-                img_tag = link.find('img')
-                img_src = "N/A"
-                if img_tag:
-                    raw_src = img_tag.get('data-original') or img_tag.get('src')
-                    if raw_src and raw_src.startswith('//'):
-                        img_src = 'https:' + raw_src
-                    elif raw_src:
-                        img_src = raw_src
-
-                p_text = link.find('div', class_='p').get_text(strip=True) if link.find('div', class_='p') else "N/A"
-                l_text = link.find('div', class_='l').get_text(strip=True) if link.find('div', class_='l') else "N/A"
-                at_text = link.find('div', class_='at').get_text(strip=True) if link.find('div', class_='at') else "N/A"
-
-                extracted_items.append((item_id, img_src, p_text, l_text, at_text))
-            
+            telemetry.record_status('ok')
+            delay.success()
+            telemetry.set_gauge(f'http_delay_s_w{worker_id}', round(http_delay.delay, 2))
+            telemetry.set_gauge(f'browser_delay_s_w{worker_id}', round(browser_delay.delay, 2))
+
             #Save
-            save_items(extracted_items)
-            print(f"--> Page {page_num}: Saved {len(extracted_items)} items.")
+            writer.put(page_num, extracted_items)
+            print(f"{tag} --> Page {page_num} ({via}): {len(extracted_items)} items queued for saving.")
+            if via == 'http':
+                # The browser path already paused while scrolling
+                http_delay.sleep()
+
+    finally:
+        fetcher.close()
 
+def main():
+    parser = argparse.ArgumentParser(description="Scrape the list.am car category into the items table.")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="browsers to run in parallel")
+    parser.add_argument('--pages', type=int, default=TOTAL_PAGES)
+    parser.add_argument('--reset', action='store_true', help="re-queue every page, including finished ones")
+    parser.add_argument('--browser-only', action='store_true', help="skip the plain HTTP fast path")
+    parser.add_argument('--no-thumbnails', action='store_true', help="don't download listing images")
+    args = parser.parse_args()
+
+    init_db()
+    init_queue(args.pages, reset=args.reset)
+    print(f"Page queue: {queue_counts()}")
+
+    telemetry.start()
+    thumbs = None if args.no_thumbnails else Downloader(THUMB_WORKERS, telemetry=telemetry).start()
+    writer = BatchWriter(thumbs)
+    writer.start()
+    # Daemon threads so Ctrl+C doesn't wait for the browsers; their pages stay
+    # 'in_progress' and are re-queued on the next run
+    threads = [threading.Thread(target=worker, args=(i, writer, not args.browser_only), name=f"listam-w{i}", daemon=True)
+               for i in range(args.workers)]
+    try:
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    except KeyboardInterrupt:
+        print("Interrupted, flushing what was scraped so far...")
     except Exception as e:
         print(f"Critical Error: {e}")
-        
     finally:
-        print("Closing Driver...")
-        driver.quit()
+        writer.close()
+        if thumbs is not None:
+            thumbs.close()
+        telemetry.stop()
+        counts = queue_counts()
+        print(f"Page queue: {counts}")
+
+    # Only a crawl that saved every page up to the end of the category and ingested
+    # everything tells us that the listings it did not see are gone
+    counters = telemetry.snapshot()['counters']
+    incomplete = {name: counters[name] for name in INCOMPLETE_COUNTERS if counters.get(name)}
+    end = queue_end_page()
+    if end is None:
+        print(f"[!] No short page in the queue, so the category may go on past page {args.pages} "
+              "(raise --pages / TOTAL_PAGES). Not marking unseen listings as removed.")
+    elif set(queue_counts(end)) != {'done'}:
+        print(f"[!] Pages before the last one ({end}) are missing, not marking unseen listings as removed.")
+    elif incomplete:
+        print(f"[!] Crawl incomplete {incomplete}, not marking unseen listings as removed.")
+    else:
+        # Every page made it, so anything not seen since the crawl started is gone
+        conn = rollups.connect()
+        removed = history.finish_crawl(conn, 'listam', queue_started_day())
+        rollups.drop_removed(conn, 'listam')
+        conn.close()
+        print(f"Price history: {removed} listings marked removed.")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
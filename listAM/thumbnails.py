@@ -0,0 +1,303 @@
+"""
+Local thumbnail cache for listing images.
+
+After a crawl the listing grid shouldn't depend on list.am's CDN (slow, and image URLs
+expire), so a background Downloader fetches each new image once, shrinks it to a
+WebP thumbnail and stores it under THUMB_DIR named by the SHA-256 of its bytes. The
+`images` table in market.db maps source URL -> thumbnail hash plus metadata, and the
+app serves /thumbs/<hash>.webp with an immutable, year-long Cache-Control.
+
+    downloader = Downloader()
+    downloader.start()
+    downloader.submit(['https://s.list.am/g/573/94557573.webp', ...])
+    downloader.close()                    # waits for the queue to drain
+
+The cache is capped at MAX_CACHE_BYTES: when it grows past the cap the least recently
+served thumbnails are deleted until it is back under EVICT_TO of the cap.
+
+    python listAM/thumbnails.py           # fetch everything in `vehicles` not cached yet
+"""
+import argparse
+import hashlib
+import io
+import os
+import queue
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from common import listings  # noqa: E402
+
+THUMB_DIR = os.getenv('LISTAM_THUMB_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'thumbs'))
+# Cards are 200px high and about 400px wide; 2x for high-DPI screens would double the disk use
+THUMB_SIZE = (480, 360)
+WEBP_QUALITY = 75
+MAX_CACHE_BYTES = int(os.getenv('LISTAM_THUMB_CACHE_MB', 1024)) * 2 ** 20
+EVICT_TO = 0.9
+# Run eviction after this many new thumbnails
+EVICT_EVERY = 200
+
+DOWNLOAD_WORKERS = 4
+DOWNLOAD_TIMEOUT = 15
+# An image that failed this many times (expired URL, not an image) is not retried
+MAX_ATTEMPTS = 3
+# last_used is only rewritten when it is older than this, so serving stays read-mostly
+TOUCH_SECONDS = 3600
+# Served hashes are buffered in memory and written to last_used at most this often
+TOUCH_FLUSH_SECONDS = 60
+
+
+def connect(path=None):
+    return listings.connect(path)
+
+
+def thumb_path(digest, thumb_dir=THUMB_DIR):
+    return os.path.join(thumb_dir, digest[:2], f"{digest}.webp")
+
+
+# --- making thumbnails ---
+
+def make_thumbnail(data, size=THUMB_SIZE, quality=WEBP_QUALITY):
+    """Image bytes -> (webp bytes, original width, original height). Raises on non-images."""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        width, height = image.size
+        image.draft('RGB', (size[0] * 2, size[1] * 2))  # JPEG: decode at a reduced scale
+        image = image.convert('RGB')
+        image.thumbnail(size)
+        out = io.BytesIO()
+        image.save(out, 'WEBP', quality=quality, method=4)
+    return out.getvalue(), width, height
+
+
+def store(data, thumb_dir=THUMB_DIR):
+    """Writes thumbnail bytes under their content hash (atomically). Returns the hash."""
+    digest = hashlib.sha256(data).hexdigest()
+    path = thumb_path(digest, thumb_dir)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    return digest
+
+
+# --- metadata ---
+
+def enqueue(conn, urls):
+    conn.executemany("INSERT OR IGNORE INTO images (url) VALUES (?)", [(u,) for u in urls])
+    conn.commit()
+
+
+def pending(conn, limit=None):
+    query = "SELECT url FROM images WHERE status = 'pending' AND attempts < ?"
+    params = [MAX_ATTEMPTS]
+    if limit:
+        query += " LIMIT ?"
+        params.append(limit)
+    return [row[0] for row in conn.execute(query, params)]
+
+
+def lookup(conn, urls):
+    """{url: hash} for the URLs that have a thumbnail."""
+    urls = [u for u in urls if u]
+    if not urls:
+        return {}
+    return dict(conn.execute(f'''
+        SELECT url, hash FROM images WHERE hash IS NOT NULL AND url IN ({','.join('?' * len(urls))})
+    ''', urls))
+
+
+def touch(conn, served):
+    """Writes {hash: unix time served} to last_used (skipping rows touched within TOUCH_SECONDS)."""
+    conn.executemany("UPDATE images SET last_used = ? WHERE hash = ? AND last_used < ?",
+                     [(now, digest, now - TOUCH_SECONDS) for digest, now in served.items()])
+    conn.commit()
+
+
+class Touches:
+    """
+    last_used bookkeeping for the serving path. A GET /thumbs only records the hash in
+    memory; the batch is written in one transaction once TOUCH_FLUSH_SECONDS have passed,
+    so serving an image normally costs no database connection at all. A crash loses at
+    most that much LRU history, which only makes eviction slightly less precise.
+    """
+
+    def __init__(self, flush_seconds=TOUCH_FLUSH_SECONDS):
+        self.flush_seconds = flush_seconds
+        self.served = {}
+        self.flushed_at = time.time()
+        self._lock = threading.Lock()
+
+    def add(self, digest, db_path=None, now=None):
+        now = int(now or time.time())
+        with self._lock:
+            self.served[digest] = now
+            if now - self.flushed_at < self.flush_seconds:
+                return
+            served, self.served, self.flushed_at = self.served, {}, now
+        self._write(served, db_path)
+
+    def flush(self, db_path=None):
+        with self._lock:
+            served, self.served, self.flushed_at = self.served, {}, time.time()
+        self._write(served, db_path)
+
+    def _write(self, served, db_path):
+        if not served:
+            return
+        conn = connect(db_path)
+        try:
+            touch(conn, served)
+        finally:
+            conn.close()
+
+
+def evict(conn, max_bytes=MAX_CACHE_BYTES, thumb_dir=THUMB_DIR):
+    """Deletes the least recently served thumbnails while the cache is over `max_bytes`.
+    Returns the number of files deleted."""
+    files = conn.execute('''
+        SELECT hash, MAX(bytes), MAX(last_used) FROM images WHERE hash IS NOT NULL GROUP BY hash
+    ''').fetchall()
+    total = sum(size or 0 for _, size, _ in files)
+    if total <= max_bytes:
+        return 0
+    deleted = 0
+    for digest, size, _ in sorted(files, key=lambda f: f[2] or 0):
+        if total <= max_bytes * EVICT_TO:
+            break
+        try:
+            os.remove(thumb_path(digest, thumb_dir))
+        except FileNotFoundError:
+            pass
+        # 'evicted' rows are not fetched again by the backfill; the app falls back to the source URL
+        conn.execute("UPDATE images SET hash = NULL, bytes = NULL, status = 'evicted' WHERE hash = ?", (digest,))
+        total -= size or 0
+        deleted += 1
+    conn.commit()
+    if deleted:
+        listings.bump_version(conn)  # cached API responses may point at the deleted files
+    return deleted
+
+
+# --- downloading ---
+
+class Downloader:
+    """Background threads that turn queued image URLs into cached thumbnails."""
+
+    def __init__(self, workers=DOWNLOAD_WORKERS, db_path=None, thumb_dir=THUMB_DIR,
+                 max_bytes=MAX_CACHE_BYTES, telemetry=None):
+        # Imported here: the web app only serves thumbnails and shouldn't pay for requests at boot
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.db_path = db_path
+        self.thumb_dir = thumb_dir
+        self.max_bytes = max_bytes
+        self.telemetry = telemetry
+        self.urls = queue.Queue()
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_connections=workers, pool_maxsize=workers))
+        self.threads = [threading.Thread(target=self._run, name=f"thumbs-{i}", daemon=True) for i in range(workers)]
+        self.stats = {'ok': 0, 'failed': 0}
+        self._stats_lock = threading.Lock()
+        self._queued = set()  # URLs handed to the threads this run, so a re-seen listing isn't fetched twice
+
+    def start(self):
+        for t in self.threads:
+            t.start()
+        return self
+
+    def submit(self, urls):
+        """Queues the URLs that aren't cached (or given up on) yet."""
+        conn = connect(self.db_path)
+        urls = [u for u in set(urls) if u]
+        enqueue(conn, urls)
+        known = dict(conn.execute(f'''
+            SELECT url, status FROM images WHERE url IN ({','.join('?' * len(urls))})
+        ''', urls)) if urls else {}
+        conn.close()
+        for url in urls:
+            if known.get(url) == 'pending' and url not in self._queued:
+                self._queued.add(url)
+                self.urls.put(url)
+
+    def close(self):
+        """Waits for the queued downloads, then stops the threads."""
+        if self.urls.qsize():
+            print(f"[thumbs] Waiting for {self.urls.qsize()} queued images...")
+        for _ in self.threads:
+            self.urls.put(None)
+        for t in self.threads:
+            t.join()
+        if self.stats['ok']:
+            conn = connect(self.db_path)
+            listings.bump_version(conn)  # so cached API responses pick up the new thumbnails
+            conn.close()
+        print(f"[thumbs] {self.stats['ok']} thumbnails stored, {self.stats['failed']} failed.")
+
+    def _run(self):
+        conn = connect(self.db_path)
+        while True:
+            url = self.urls.get()
+            if url is None:
+                conn.close()
+                return
+            ok = self._fetch(conn, url)
+            with self._stats_lock:
+                self.stats['ok' if ok else 'failed'] += 1
+                run_eviction = ok and self.stats['ok'] % EVICT_EVERY == 0
+            if self.telemetry:
+                self.telemetry.inc('thumbs_ok' if ok else 'thumbs_failed')
+            if run_eviction:
+                evict(conn, self.max_bytes, self.thumb_dir)
+
+    def _fetch(self, conn, url):
+        try:
+            response = self.session.get(url, timeout=DOWNLOAD_TIMEOUT)
+            response.raise_for_status()
+            data, width, height = make_thumbnail(response.content)
+        except Exception:
+            conn.execute('''
+                UPDATE images SET attempts = attempts + 1,
+                    status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE status END
+                WHERE url = ?
+            ''', (MAX_ATTEMPTS, url))
+            conn.commit()
+            return False
+        digest = store(data, self.thumb_dir)
+        now = int(time.time())
+        conn.execute('''
+            UPDATE images SET hash = ?, width = ?, height = ?, bytes = ?, status = 'ok',
+                attempts = attempts + 1, fetched_at = ?, last_used = ?
+            WHERE url = ?
+        ''', (digest, width, height, len(data), now, now, url))
+        conn.commit()
+        return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download and cache thumbnails for the images in `vehicles`.")
+    parser.add_argument('--workers', type=int, default=DOWNLOAD_WORKERS)
+    parser.add_argument('--limit', type=int, default=None, help="at most this many images")
+    args = parser.parse_args()
+
+    conn = connect()
+    enqueue(conn, [row[0] for row in conn.execute("SELECT image FROM vehicles WHERE image IS NOT NULL")])
+    urls = pending(conn, args.limit)
+    conn.close()
+    print(f"[thumbs] {len(urls)} images to fetch")
+
+    downloader = Downloader(args.workers).start()
+    downloader.submit(urls)
+    downloader.close()
+    conn = connect()
+    evict(conn)
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()